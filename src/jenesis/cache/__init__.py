@@ -0,0 +1,7 @@
+import os
+
+STATE_FOLDER = ".jenesis"
+
+
+def state_path(project_path: str, *parts: str) -> str:
+    return os.path.join(os.path.abspath(project_path), STATE_FOLDER, *parts)
@@ -0,0 +1,115 @@
+import os
+import shutil
+import uuid
+from typing import List, Tuple
+
+from jenesis.cache import state_path
+
+ARTIFACT_STORE_FOLDER = "artifacts"
+DEFAULT_MAX_STORE_SIZE = 1 << 30
+
+
+def _copy_atomic(source_path: str, dest_path: str):
+    # copy to a temporary file first so that a partial copy is never visible at the destination
+    temp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, dest_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class ArtifactStore:
+    """
+    Content addressed store of previously built artifacts. Each artifact is stored under its digest
+    so that builds which have been seen before (for example on another branch) can be restored without
+    being rebuilt. The least recently used artifacts are evicted once the store exceeds its size limit
+    """
+
+    def __init__(self, path: str, max_size: int = DEFAULT_MAX_STORE_SIZE):
+        self._path = path
+        self._max_size = max_size
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @classmethod
+    def for_project(cls, project_path: str, max_size: int = DEFAULT_MAX_STORE_SIZE) -> "ArtifactStore":
+        return cls(state_path(project_path, ARTIFACT_STORE_FOLDER), max_size)
+
+    def _entry_path(self, digest: str) -> str:
+        return os.path.join(self._path, f"{digest}.wasm")
+
+    def contains(self, digest: str) -> bool:
+        return os.path.isfile(self._entry_path(digest))
+
+    def add(self, source_path: str, digest: str):
+        """
+        Adds an artifact to the store
+
+        :param source_path: The path of the artifact
+        :param digest: The hex encoded digest of the artifact contents
+        :return:
+        """
+        entry_path = self._entry_path(digest)
+        try:
+            if os.path.isfile(entry_path):
+                os.utime(entry_path)
+            else:
+                os.makedirs(self._path, exist_ok=True)
+                _copy_atomic(source_path, entry_path)
+        except OSError:
+            # the store is only an optimisation, so failing to populate it is not an error
+            return
+
+        self._evict()
+
+    def restore(self, digest: str, dest_path: str) -> bool:
+        """
+        Copies a stored artifact to the specified path
+
+        :param digest: The hex encoded digest of the artifact contents
+        :param dest_path: The path to restore the artifact to
+        :return: True if the artifact was restored, otherwise False
+        """
+        entry_path = self._entry_path(digest)
+        if not os.path.isfile(entry_path):
+            return False
+
+        try:
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            _copy_atomic(entry_path, dest_path)
+            os.utime(entry_path)
+        except OSError:
+            return False
+
+        return True
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for filename in os.listdir(self._path):
+            if not filename.endswith(".wasm"):
+                continue
+            entry_path = os.path.join(self._path, filename)
+            try:
+                stat = os.stat(entry_path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        return sorted(entries)
+
+    def _evict(self):
+        entries = self._entries()
+        total_size = sum(size for _, size, _ in entries)
+
+        # the modification time of an entry is refreshed whenever it is used, so the oldest go first
+        for _, size, entry_path in entries:
+            if total_size <= self._max_size:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue
+            total_size -= size
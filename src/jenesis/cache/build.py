@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import struct
+from typing import Dict, Iterable, Optional
+
+from jenesis.cache import state_path
+from jenesis.cache.artifacts import ArtifactStore
+from jenesis.cache.digest import hash_file
+
+BUILD_MANIFEST_FILENAME = "build-manifest.json"
+BUILD_MANIFEST_VERSION = 1
+MAX_MANIFEST_ENTRIES = 512
+
+ArtifactDigests = Dict[str, str]
+
+
+def _update(hasher, value: str):
+    encoded_value = value.encode()
+    hasher.update(struct.pack(">Q", len(encoded_value)))
+    hasher.update(encoded_value)
+
+
+def compute_file_digest(path: str) -> str:
+    return hash_file(path).hex()
+
+
+def compute_build_key(root: str, input_files: Iterable[str], image: str, optimize: bool) -> str:
+    """
+    Computes the content hash of a build from all of its inputs
+
+    :param root: The path that all input paths are made relative to (normally the cargo root)
+    :param input_files: The paths of all the files that contribute to the build
+    :param image: The docker image used to perform the build
+    :param optimize: Whether the build is an optimized build
+    :return: The hex encoded build key
+    """
+    hasher = hashlib.sha256()
+    _update(hasher, image)
+    _update(hasher, str(bool(optimize)))
+
+    relative_paths = sorted(
+        {os.path.relpath(os.path.abspath(path), os.path.abspath(root)): path for path in input_files}.items()
+    )
+    for relative_path, path in relative_paths:
+        _update(hasher, relative_path.replace(os.sep, "/"))
+        _update(hasher, compute_file_digest(path))
+
+    return hasher.hexdigest()
+
+
+def compute_artifact_digests(paths: Iterable[str]) -> Optional[ArtifactDigests]:
+    digests = {}
+    for path in paths:
+        if not os.path.isfile(path):
+            return None
+        digests[os.path.basename(path)] = compute_file_digest(path)
+    return digests
+
+
+class BuildManifest:
+    """
+    Persistent record of the artifacts produced for each build key. This allows the
+    build tasks to determine if a build is required based on the contents of the build inputs
+    rather than on the file timestamps
+    """
+
+    def __init__(self, path: str, builds: Optional[Dict[str, ArtifactDigests]] = None,
+                 store: Optional[ArtifactStore] = None):
+        self._path = path
+        self._builds = builds or {}
+        self._store = store
+        self._dirty = False
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def store(self) -> Optional[ArtifactStore]:
+        return self._store
+
+    @classmethod
+    def load(cls, project_path: str, store: Optional[ArtifactStore] = None) -> "BuildManifest":
+        path = state_path(project_path, BUILD_MANIFEST_FILENAME)
+
+        builds = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as manifest_file:
+                    contents = json.load(manifest_file)
+                if contents.get("version") == BUILD_MANIFEST_VERSION:
+                    builds = dict(contents.get("builds", {}))
+            except (OSError, ValueError, AttributeError):
+                # a corrupt manifest simply means that everything will be rebuilt
+                builds = {}
+
+        return cls(path, builds, store)
+
+    def lookup(self, build_key: str) -> Optional[ArtifactDigests]:
+        return self._builds.get(build_key)
+
+    def is_up_to_date(self, build_key: str, artifact_paths: Iterable[str]) -> bool:
+        expected = self.lookup(build_key)
+        if expected is None:
+            return False
+
+        artifact_paths = list(artifact_paths)
+        if {os.path.basename(path) for path in artifact_paths} != set(expected.keys()):
+            return False
+
+        return compute_artifact_digests(artifact_paths) == expected
+
+    def restore(self, build_key: str, artifact_paths: Iterable[str]) -> bool:
+        """
+        Restores the artifacts of a previous build from the artifact store
+
+        :param build_key: The build key
+        :param artifact_paths: The paths that the artifacts of the build should be restored to
+        :return: True if all the artifacts were restored, otherwise False
+        """
+        expected = self.lookup(build_key)
+        if expected is None or self._store is None:
+            return False
+
+        artifact_paths = list(artifact_paths)
+        if {os.path.basename(path) for path in artifact_paths} != set(expected.keys()):
+            return False
+
+        for path in artifact_paths:
+            if not self._store.restore(expected[os.path.basename(path)], path):
+                return False
+
+        # the restored files are checked against the manifest so that a damaged store entry causes a rebuild
+        return self.is_up_to_date(build_key, artifact_paths)
+
+    def record_artifacts(self, build_key: str, artifact_paths: Iterable[str]):
+        """
+        Records the artifacts produced for a build key and adds them to the artifact store
+
+        :param build_key: The build key
+        :param artifact_paths: The paths of the artifacts produced by the build
+        :return:
+        """
+        artifact_paths = list(artifact_paths)
+        artifacts = compute_artifact_digests(artifact_paths)
+        if artifacts is None:
+            return
+
+        self.record(build_key, artifacts)
+
+        if self._store is not None:
+            for path in artifact_paths:
+                self._store.add(path, artifacts[os.path.basename(path)])
+
+    def record(self, build_key: str, artifacts: ArtifactDigests):
+        # reinsert the entry so that the most recently built entries are the last to be evicted
+        self._builds.pop(build_key, None)
+        self._builds[build_key] = dict(artifacts)
+
+        while len(self._builds) > MAX_MANIFEST_ENTRIES:
+            del self._builds[next(iter(self._builds))]
+
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+
+        temp_path = f"{self._path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump({"version": BUILD_MANIFEST_VERSION, "builds": self._builds}, manifest_file, indent=2)
+        os.replace(temp_path, self._path)
+
+        self._dirty = False
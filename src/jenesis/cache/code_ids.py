@@ -0,0 +1,235 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, Optional
+
+import grpc
+from cosmpy.aerial.client import LedgerClient
+from cosmpy.protos.cosmos.base.query.v1beta1.pagination_pb2 import PageRequest
+from cosmpy.protos.cosmwasm.wasm.v1.query_pb2 import QueryCodeRequest, QueryCodesRequest
+
+from jenesis.cache import state_path
+from jenesis.cache.state_db import STATE_BACKEND_SQLITE, connect_state_db, read_state_backend
+
+CODE_ID_INDEX_FOLDER = "code-ids"
+CODE_ID_INDEX_VERSION = 1
+
+
+def _code_id_key(code_id: int) -> bytes:
+    # the wasm module stores (and paginates) the codes by their big endian code id
+    return int(code_id).to_bytes(8, "big")
+
+
+def _is_not_found(ex: Exception) -> bool:
+    if isinstance(ex, grpc.RpcError) and hasattr(ex, "code") and ex.code() == grpc.StatusCode.NOT_FOUND:
+        return True
+
+    # pylint: disable=no-member
+    details = ex.details() if hasattr(ex, "details") else None
+    return "not found" in (details or "") or "not found" in str(ex)
+
+
+class CodeIdIndex:
+    """
+    Persistent index from the data hash of the codes stored on a chain to their code id. The index is
+    built by walking the codes on chain once and afterwards only the codes stored since the last sync
+    are fetched
+    """
+
+    def __init__(self, chain_id: str, path: Optional[str] = None, codes: Optional[Dict[str, int]] = None,
+                 last_code_id: int = 0):
+        self._chain_id = chain_id
+        self._path = path
+        self._codes = codes or {}
+        self._last_code_id = last_code_id
+        self._lock = threading.RLock()
+
+    @property
+    def chain_id(self) -> str:
+        return self._chain_id
+
+    @property
+    def last_code_id(self) -> int:
+        return self._last_code_id
+
+    @classmethod
+    def for_project(cls, project_path: str, chain_id: str) -> "CodeIdIndex":
+        """
+        Loads the code id index of a project for the specified chain from the state backend of the project
+
+        :param project_path: The path to the project
+        :param chain_id: The chain id
+        :return: The code id index
+        """
+        if read_state_backend(project_path) == STATE_BACKEND_SQLITE:
+            return DatabaseCodeIdIndex.load(project_path, chain_id)
+        return cls.load(project_path, chain_id)
+
+    @classmethod
+    def load(cls, project_path: str, chain_id: str) -> "CodeIdIndex":
+        filename = f"{chain_id.replace(os.sep, '_')}.json"
+        path = state_path(project_path, CODE_ID_INDEX_FOLDER, filename)
+
+        codes, last_code_id = {}, 0
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as index_file:
+                    contents = json.load(index_file)
+                if contents.get("version") == CODE_ID_INDEX_VERSION and contents.get("chain_id") == chain_id:
+                    codes = {str(digest): int(code_id) for digest, code_id in contents.get("codes", {}).items()}
+                    last_code_id = int(contents.get("last_code_id", 0))
+            except (OSError, ValueError, AttributeError, TypeError):
+                # a corrupt index is simply rebuilt from the chain
+                codes, last_code_id = {}, 0
+
+        return cls(chain_id, path, codes, last_code_id)
+
+    def lookup(self, digest: str) -> Optional[int]:
+        with self._lock:
+            return self._codes.get(digest)
+
+    def add(self, digest: str, code_id: int):
+        """
+        Records the code id of a code. This does not advance the sync position, so codes stored
+        before this one that have not been seen yet are still fetched by the next sync
+
+        :param digest: The hex encoded data hash of the code
+        :param code_id: The code id
+        :return:
+        """
+        with self._lock:
+            # the first code stored with a given hash is the one that is used
+            existing_code_id = self._codes.get(digest)
+            if existing_code_id is None or code_id < existing_code_id:
+                self._codes[digest] = int(code_id)
+
+    def sync(self, client: LedgerClient):
+        """
+        Fetches all the codes that have been stored on chain since the last sync
+
+        :param client: The ledger client for the chain
+        :return:
+        """
+        with self._lock:
+            try:
+                pagination = PageRequest(key=_code_id_key(self._last_code_id + 1))
+                while True:
+                    resp = client.wasm.Codes(QueryCodesRequest(pagination=pagination))
+                    for code_info in resp.code_infos:
+                        self.add(bytes(code_info.data_hash).hex(), int(code_info.code_id))
+                        self._last_code_id = max(self._last_code_id, int(code_info.code_id))
+
+                    if len(resp.pagination.next_key) == 0:
+                        break
+                    pagination = PageRequest(key=resp.pagination.next_key)
+            finally:
+                self.save()
+
+    def find(self, client: LedgerClient, digest: bytes) -> Optional[int]:
+        """
+        Finds the code id of the code with the specified data hash, only fetching the codes
+        that have been stored since the last lookup
+
+        :param client: The ledger client for the chain
+        :param digest: The data hash of the code
+        :return: The code id if the code has been stored on chain, otherwise None
+        """
+        with self._lock:
+            code_id = self.lookup(digest.hex())
+            if code_id is None:
+                self.sync(client)
+                return self.lookup(digest.hex())
+
+            if self._is_stored(client, code_id, digest):
+                return code_id
+
+            # the chain no longer matches the index (e.g. a local chain that has been reset)
+            self._codes, self._last_code_id = {}, 0
+            self.sync(client)
+            return self.lookup(digest.hex())
+
+    @staticmethod
+    def _is_stored(client: LedgerClient, code_id: int, digest: bytes) -> bool:
+        try:
+            resp = client.wasm.Code(QueryCodeRequest(code_id=code_id))
+        except (grpc.RpcError, RuntimeError) as ex:
+            # only a code that is definitely missing means the index is out of date, other errors (e.g. an
+            # unavailable node) are passed on rather than triggering a rebuild
+            if not _is_not_found(ex):
+                raise
+            return False
+        return bytes(resp.code_info.data_hash) == bytes(digest)
+
+    def save(self):
+        if self._path is None:
+            return
+
+        with self._lock:
+            contents = {
+                "version": CODE_ID_INDEX_VERSION,
+                "chain_id": self._chain_id,
+                "last_code_id": self._last_code_id,
+                "codes": self._codes,
+            }
+
+            try:
+                os.makedirs(os.path.dirname(self._path), exist_ok=True)
+                temp_path = f"{self._path}.{os.getpid()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as index_file:
+                    json.dump(contents, index_file, indent=2)
+                os.replace(temp_path, self._path)
+            except OSError:
+                # the index is still available in memory
+                pass
+
+
+class DatabaseCodeIdIndex(CodeIdIndex):
+    """
+    Code id index kept in the state database of a project that uses the sqlite state backend. Only the
+    codes that have changed since the last save are written
+    """
+
+    def __init__(self, chain_id: str, project_path: str, codes: Optional[Dict[str, int]] = None,
+                 last_code_id: int = 0):
+        super().__init__(chain_id, None, codes, last_code_id)
+        self._project_path = project_path
+        self._saved_codes = dict(self._codes)
+
+    @classmethod
+    def load(cls, project_path: str, chain_id: str) -> "DatabaseCodeIdIndex":
+        with closing(connect_state_db(project_path)) as connection:
+            codes = dict(connection.execute("SELECT digest, code_id FROM code_ids WHERE chain_id = ?", (chain_id,)))
+            row = connection.execute("SELECT last_code_id FROM code_id_sync WHERE chain_id = ?",
+                                     (chain_id,)).fetchone()
+
+        return cls(chain_id, project_path, codes, row[0] if row is not None else 0)
+
+    def save(self):
+        with self._lock:
+            changed = [
+                (self._chain_id, digest, code_id) for (digest, code_id) in self._codes.items()
+                if self._saved_codes.get(digest) != code_id
+            ]
+            removed = [(self._chain_id, digest) for digest in self._saved_codes if digest not in self._codes]
+
+            try:
+                with closing(connect_state_db(self._project_path)) as connection:
+                    with connection:
+                        connection.executemany("DELETE FROM code_ids WHERE chain_id = ? AND digest = ?", removed)
+                        connection.executemany(
+                            "INSERT INTO code_ids (chain_id, digest, code_id) VALUES (?, ?, ?) "
+                            "ON CONFLICT (chain_id, digest) DO UPDATE SET code_id = excluded.code_id",
+                            changed,
+                        )
+                        connection.execute(
+                            "INSERT INTO code_id_sync (chain_id, last_code_id) VALUES (?, ?) "
+                            "ON CONFLICT (chain_id) DO UPDATE SET last_code_id = excluded.last_code_id",
+                            (self._chain_id, self._last_code_id),
+                        )
+            except sqlite3.Error:
+                # the index is still available in memory
+                return
+
+            self._saved_codes = dict(self._codes)
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import mmap
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from jenesis.cache import state_path
+
+DIGEST_CACHE_FILENAME = "digests.json"
+DIGEST_CACHE_VERSION = 1
+MAX_DIGEST_CACHE_ENTRIES = 1024
+MMAP_THRESHOLD = 1 << 16
+READ_BLOCK_SIZE = 1 << 16
+
+FileKey = Tuple[int, int, int]
+
+
+def _file_key(path: str) -> FileKey:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def hash_file(path: str) -> bytes:
+    """
+    Computes the sha256 digest of a file, mapping large files into memory rather than reading them
+
+    :param path: The path to the file
+    :return: The raw digest
+    """
+    hasher = hashlib.sha256()
+    with open(path, "rb") as input_file:
+        if os.fstat(input_file.fileno()).st_size >= MMAP_THRESHOLD:
+            with mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+                hasher.update(contents)
+        else:
+            for block in iter(lambda: input_file.read(READ_BLOCK_SIZE), b""):
+                hasher.update(block)
+    return hasher.digest()
+
+
+class DigestCache:
+    """
+    Memoizes the digests of files keyed on their path, size, modification time and inode. When
+    a path is provided the cache can be saved so that the digests survive between invocations
+    """
+
+    def __init__(self, path: Optional[str] = None, entries: Optional[Dict[str, dict]] = None):
+        self._path = path
+        self._entries = entries or {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, project_path: str) -> "DigestCache":
+        path = state_path(project_path, DIGEST_CACHE_FILENAME)
+
+        entries = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as cache_file:
+                    contents = json.load(cache_file)
+                if contents.get("version") == DIGEST_CACHE_VERSION:
+                    entries = dict(contents.get("digests", {}))
+            except (OSError, ValueError, AttributeError):
+                # a corrupt cache simply means that the files are hashed again
+                entries = {}
+
+        return cls(path, entries)
+
+    def digest(self, path: str) -> bytes:
+        """
+        Gets the sha256 digest of a file, only hashing it if it has changed since it was last seen
+
+        :param path: The path to the file
+        :return: The raw digest
+        """
+        path = os.path.abspath(path)
+        key = list(_file_key(path))
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.get("key") == key:
+                return bytes.fromhex(entry["digest"])
+
+        digest = hash_file(path)
+
+        # only record the digest if the file was not modified while it was being hashed
+        if list(_file_key(path)) == key:
+            with self._lock:
+                self._entries.pop(path, None)
+                self._entries[path] = {"key": key, "digest": digest.hex()}
+                while len(self._entries) > MAX_DIGEST_CACHE_ENTRIES:
+                    del self._entries[next(iter(self._entries))]
+                self._dirty = True
+
+        return digest
+
+    def save(self):
+        """
+        Writes the cache to disk, provided any new digests have been recorded since it was loaded
+        """
+        with self._lock:
+            if self._path is None or not self._dirty:
+                return
+
+            try:
+                os.makedirs(os.path.dirname(self._path), exist_ok=True)
+                temp_path = f"{self._path}.{os.getpid()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as cache_file:
+                    json.dump({"version": DIGEST_CACHE_VERSION, "digests": self._entries}, cache_file, indent=2)
+                os.replace(temp_path, self._path)
+                self._dirty = False
+            except OSError:
+                # the digests are still cached in memory
+                pass
@@ -0,0 +1,90 @@
+import os
+import sqlite3
+
+import toml
+
+from jenesis.cache import state_path
+
+STATE_BACKEND_TOML = "toml"
+STATE_BACKEND_SQLITE = "sqlite"
+DEFAULT_STATE_BACKEND = STATE_BACKEND_TOML
+
+STATE_DB_FILENAME = "state.db"
+
+# the keys of the state_meta table
+STATE_META_LOCK_FILE_IMPORTED = "lock_file_imported"
+
+STATE_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deployments (
+    profile TEXT NOT NULL,
+    name TEXT NOT NULL,
+    checksum TEXT,
+    digest TEXT,
+    address TEXT,
+    code_id INTEGER,
+    PRIMARY KEY (profile, name)
+);
+
+CREATE TABLE IF NOT EXISTS deploy_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    profile TEXT NOT NULL,
+    deployment TEXT NOT NULL,
+    chain_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    tx_hash TEXT NOT NULL,
+    gas_wanted INTEGER,
+    gas_used INTEGER,
+    timestamp TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS deploy_history_deployment ON deploy_history (profile, deployment);
+
+CREATE TABLE IF NOT EXISTS code_ids (
+    chain_id TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    code_id INTEGER NOT NULL,
+    PRIMARY KEY (chain_id, digest)
+);
+
+CREATE TABLE IF NOT EXISTS code_id_sync (
+    chain_id TEXT PRIMARY KEY,
+    last_code_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS state_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def state_db_path(project_path: str) -> str:
+    return state_path(project_path, STATE_DB_FILENAME)
+
+
+def connect_state_db(project_path: str) -> sqlite3.Connection:
+    """
+    Opens the state database of a project, creating it if necessary
+
+    :param project_path: The path to the project
+    :return: The database connection
+    """
+    path = state_db_path(project_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # the database is shared by concurrent jenesis processes, so wait for the writes of the others
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(STATE_DB_SCHEMA)
+    return connection
+
+
+def read_state_backend(project_path: str) -> str:
+    project_file_path = os.path.join(project_path, "jenesis.toml")
+    if not os.path.isfile(project_file_path):
+        return DEFAULT_STATE_BACKEND
+
+    project = toml.load(project_file_path).get("project", {})
+    if not isinstance(project, dict):
+        return DEFAULT_STATE_BACKEND
+    return str(project.get("state_backend", DEFAULT_STATE_BACKEND))
@@ -13,6 +13,7 @@ from jenesis.cmd.run import add_run_command
 from jenesis.cmd.shell import add_shell_command
 from jenesis.cmd.keys import add_keys_command
 from jenesis.cmd.network import add_network_command
+from jenesis.cmd.state import add_state_command
 
 
 def _parse_commandline() -> Tuple[argparse.ArgumentParser, argparse.Namespace]:
@@ -30,6 +31,7 @@ def _parse_commandline() -> Tuple[argparse.ArgumentParser, argparse.Namespace]:
     add_attach_command(subparsers)
     add_update_command(subparsers)
     add_network_command(subparsers)
+    add_state_command(subparsers)
 
     return parser, parser.parse_args()
 
@@ -2,6 +2,7 @@ import argparse
 import os
 
 from jenesis.config import Config
+from jenesis.config.editor import edit_project
 
 
 def add_contract_command(parser):
@@ -44,9 +45,10 @@ def run_add_contract(args: argparse.Namespace):
 
     deployments = args.deployments or [args.name]
 
-    for (profile_name, profile) in cfg.profiles.items():
-        network_name = profile.network.name
-        for deployment in deployments:
-            Config.update_project(os.getcwd(), profile_name, network_name, selected_contract, deployment)
+    with edit_project(project_root) as editor:
+        for (profile_name, profile) in cfg.profiles.items():
+            network_name = profile.network.name
+            for deployment in deployments:
+                editor.set_deployment(profile_name, network_name, selected_contract, deployment)
 
     return True
@@ -3,6 +3,7 @@ import os
 
 from jenesis.contracts.detect import parse_contract
 from jenesis.config import Config
+from jenesis.config.editor import edit_project
 
 
 def run(args: argparse.Namespace):
@@ -26,10 +27,11 @@ def run(args: argparse.Namespace):
 
     selected_contract = parse_contract(project_root , args.contract)
 
-    for (profile_name, profile) in cfg.profiles.items():
-        network_name = profile.network.name
-        for deployment in args.deployments:
-            Config.update_project(os.getcwd(), profile_name, network_name, selected_contract, deployment)
+    with edit_project(project_root) as editor:
+        for (profile_name, profile) in cfg.profiles.items():
+            network_name = profile.network.name
+            for deployment in args.deployments:
+                editor.set_deployment(profile_name, network_name, selected_contract, deployment)
 
 
 def add_deployment_command(parser):
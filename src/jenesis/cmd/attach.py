@@ -2,6 +2,7 @@ import argparse
 import os
 
 from cosmpy.aerial.client import LedgerClient
+from jenesis.cache.code_ids import CodeIdIndex
 from jenesis.config import Config
 from jenesis.contracts.detect import parse_contract
 from jenesis.contracts.monkey import MonkeyContract
@@ -42,7 +43,8 @@ def run(args: argparse.Namespace):
     network = Network(**data["profile"][profile_name]["network"])
 
     with network_context(network, cfg.project_name, profile_name):
-        contract = MonkeyContract(contract_to_attach, client, args.address)
+        code_ids = CodeIdIndex.for_project(project_path, selected_profile.network.chain_id)
+        contract = MonkeyContract(contract_to_attach, client, args.address, code_ids=code_ids)
         code_id = contract.code_id
         digest = contract.digest.hex()
 
@@ -51,7 +53,7 @@ def run(args: argparse.Namespace):
     cfg.update_deployment(
         selected_profile.name, deployment.name, digest, code_id, args.address
     )
-    cfg.save(project_path)
+    cfg.save(project_path, profile_names=[selected_profile.name])
     return 0
 
 
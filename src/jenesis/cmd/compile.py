@@ -2,14 +2,22 @@ import hashlib
 import argparse
 import os
 import struct
+from typing import Any, Callable, List, Optional
 
 from blessings import Terminal
+from jenesis.cache.artifacts import ArtifactStore
+from jenesis.cache.build import BuildManifest
+from jenesis.contracts import Contract
 from jenesis.contracts.build import (
-    build_contracts, build_workspace, CONTRACT_BUILD_IMAGE, WORKSPACE_BUILD_IMAGE
+    build_contracts, build_workspace, get_build_size, get_shared_cache_volume, CONTRACT_BUILD_IMAGE,
+    WORKSPACE_BUILD_IMAGE,
 )
+from jenesis.contracts.plan import compute_deployment_order
 from jenesis.config import Config
+from jenesis.config.editor import edit_project
 from jenesis.contracts.detect import detect_contracts, is_workspace
-from jenesis.contracts.schema import generate_schemas, load_contract_schema
+from jenesis.contracts.schema import build_contracts_and_schemas, generate_schemas, load_contract_schema
+from jenesis.tasks.builder import BuilderPool, DEFAULT_BUILDER_IDLE_TIMEOUT
 from jenesis.tasks.image import image_exists, pull_image
 
 
@@ -29,6 +37,71 @@ def _compute_init_checksum(path, contract_name):
     return hasher.hexdigest()
 
 
+BUILD_ORDERS = ("default", "largest-first", "deployment")
+
+
+def _build_priority(order: str, project_path: str, contracts: List[Contract]) -> Optional[Callable[[Contract], Any]]:
+    if order == "largest-first":
+        sizes = {contract.name: get_build_size(contract) for contract in contracts}
+        return lambda contract: -sizes[contract.name]
+
+    if order == "deployment":
+        # build the contracts that other deployments depend on first (using the default profile)
+        cfg = Config.load(project_path)
+        deployments = cfg.profiles[cfg.get_default_profile()].deployments
+        contract_order = []
+        for deployment_name in compute_deployment_order(deployments):
+            contract_name = deployments[deployment_name].contract
+            if contract_name not in contract_order:
+                contract_order.append(contract_name)
+        return lambda contract: (
+            contract_order.index(contract.name) if contract.name in contract_order else len(contract_order)
+        )
+
+    return None
+
+
+def _build(args: argparse.Namespace, project_path: str, contracts: List[Contract], manifest: BuildManifest,
+           builders: Optional[BuilderPool], priority: Optional[Callable[[Contract], Any]]):
+    term = Terminal()
+
+    # in pipelined mode the schema of each contract is generated as soon as its build has finished
+    pipelined = args.pipeline and not is_workspace(project_path)
+
+    # workspaces already share a single target directory between all their contracts
+    shared_cache = None
+    if args.shared_cache and not is_workspace(project_path):
+        shared_cache = get_shared_cache_volume(project_path)
+
+    if is_workspace(project_path):
+        if not image_exists(WORKSPACE_BUILD_IMAGE):
+            print(term.green("\nPulling docker image..."))
+            pull_image(WORKSPACE_BUILD_IMAGE)
+        print(term.green("\nBuilding cargo workspace..."))
+        build_workspace(project_path, contracts, optimize=args.optimize, rebuild=args.rebuild, log=args.log,
+                        manifest=manifest, builders=builders)
+    else:
+        if not image_exists(CONTRACT_BUILD_IMAGE):
+            print(term.green("\nPulling docker image..."))
+            pull_image(CONTRACT_BUILD_IMAGE)
+        if pipelined:
+            print(term.green("\nBuilding contracts and schemas..."))
+            build_contracts_and_schemas(contracts, batch_size=args.batch_size, optimize=args.optimize,
+                                        rebuild=args.rebuild, log=args.log, manifest=manifest, builders=builders,
+                                        priority=priority, shared_cache=shared_cache, project_path=project_path)
+        else:
+            print(term.green("\nBuilding contracts..."))
+            build_contracts(contracts, batch_size=args.batch_size, optimize=args.optimize, rebuild=args.rebuild,
+                            log=args.log, manifest=manifest, builders=builders, priority=priority,
+                            shared_cache=shared_cache, project_path=project_path)
+
+    # generate the schemas
+    if not pipelined:
+        print(term.green("\nGenerating contract schemas..."))
+        generate_schemas(contracts, batch_size=args.batch_size, rebuild=args.rebuild, builders=builders,
+                         priority=priority, shared_cache=shared_cache, project_path=project_path)
+
+
 def run(args: argparse.Namespace):
 
     project_path = os.getcwd()
@@ -47,32 +120,22 @@ def run(args: argparse.Namespace):
 
     init_checksums = {contract.name: _compute_init_checksum(project_path, contract.variable_name) for contract in contracts}
 
-    if is_workspace(project_path):
-        if not image_exists(WORKSPACE_BUILD_IMAGE):
-            print(term.green("\nPulling docker image..."))
-            pull_image(WORKSPACE_BUILD_IMAGE)
-        print(term.green("\nBuilding cargo workspace..."))
-        build_workspace(project_path, contracts, optimize=args.optimize, rebuild=args.rebuild, log=args.log)
-    else:
-        if not image_exists(CONTRACT_BUILD_IMAGE):
-            print(term.green("\nPulling docker image..."))
-            pull_image(CONTRACT_BUILD_IMAGE)
-        print(term.green("\nBuilding contracts..."))
-        build_contracts(contracts, batch_size=args.batch_size, optimize=args.optimize,rebuild=args.rebuild, log=args.log)
+    manifest = BuildManifest.load(project_path, ArtifactStore.for_project(project_path))
+    builders = BuilderPool(args.warm_timeout) if args.warm else None
+    priority = _build_priority(args.order, project_path, contracts)
 
-    # generate the schemas
-    print(term.green("\nGenerating contract schemas..."))
-    generate_schemas(contracts, batch_size=args.batch_size, rebuild=args.rebuild)
+    _build(args, project_path, contracts, manifest, builders, priority)
 
     cfg = Config.load(os.getcwd())
-    for contract in contracts:
-        if _compute_init_checksum(project_path, contract.variable_name) != init_checksums[contract.name]:
-            # update project file
-            for (profile_name, profile) in cfg.profiles.items():
-                network_name = profile.network.name
-                for deployment in profile.deployments.values():
-                    if deployment.contract == contract.name:
-                        Config.update_project(project_path, profile_name, network_name, contract, deployment.name)
+    with edit_project(project_path) as editor:
+        for contract in contracts:
+            if _compute_init_checksum(project_path, contract.variable_name) != init_checksums[contract.name]:
+                # update project file
+                for (profile_name, profile) in cfg.profiles.items():
+                    network_name = profile.network.name
+                    for deployment in profile.deployments.values():
+                        if deployment.contract == contract.name:
+                            editor.set_deployment(profile_name, network_name, contract, deployment.name)
     return 0
 
 
@@ -83,7 +146,13 @@ def add_compile_command(parser):
         dest="batch_size",
         type=int,
         default=5,
-        help="The limit of the number of tasks to do in parallel (default = 5)",
+        help="The number of tasks to keep in flight in parallel (default = 5)",
+    )
+    compile_cmd.add_argument(
+        "--order",
+        choices=BUILD_ORDERS,
+        default="default",
+        help="The order in which queued contracts are built (default = default)",
     )
     compile_cmd.add_argument(
         "-o",
@@ -97,6 +166,34 @@ def add_compile_command(parser):
         action="store_true",
         help="Force rebuild",
     )
+    compile_cmd.add_argument(
+        "-w",
+        "--warm",
+        action="store_true",
+        help="Run builds inside long-lived builder containers that are reused between builds",
+    )
+    compile_cmd.add_argument(
+        "--warm-timeout",
+        type=int,
+        default=DEFAULT_BUILDER_IDLE_TIMEOUT,
+        help=f"The number of idle seconds before a warm builder is removed (default = {DEFAULT_BUILDER_IDLE_TIMEOUT})",
+    )
+    compile_cmd.add_argument(
+        "--shared-cache",
+        action="store_true",
+        help="Share the compiled dependencies between all the contracts of the project",
+    )
+    compile_cmd.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Generate the schema of each contract as soon as it has been built",
+    )
+    compile_cmd.add_argument(
+        "--no-pipeline",
+        dest="pipeline",
+        action="store_false",
+        help="Build all the contracts before generating any of the schemas (default)",
+    )
     compile_cmd.add_argument(
         "--log",
         action="store_true",
@@ -108,4 +205,4 @@ def add_compile_command(parser):
         action="store_false",
         help="Do not show build logs",
     )
-    compile_cmd.set_defaults(handler=run, log=True)
+    compile_cmd.set_defaults(handler=run, log=True, pipeline=False)
@@ -1,8 +1,11 @@
 import argparse
 import os
+from contextlib import ExitStack
+from typing import List, Optional
 
 from jenesis.config import Config
-from jenesis.contracts.deploy import deploy_contracts
+from jenesis.contracts.deploy import deploy_profiles, plan_deployment
+from jenesis.contracts.dry_run import dry_run_deployment
 from jenesis.network import network_context
 
 
@@ -16,20 +19,87 @@ def run(args: argparse.Namespace):
         return 1
 
     cfg = Config.load(project_path)
-    profile = cfg.get_profile(args.profile)
-    if profile is None:
+    profile_names = _select_profiles(cfg, args)
+    if profile_names is None:
         return 1
 
-    with network_context(profile.network, cfg.project_name, profile.name):
-        deploy_contracts(cfg, project_path, args.key, profile_name=args.profile)
+    if args.key is not None and args.keys is not None:
+        print("Please specify either a deployer key or a pool of keys, not both")
+        return 1
+
+    # the plan is computed from the project and lock files only, so the network is not needed
+    if args.plan:
+        for profile_name in profile_names:
+            plan_deployment(cfg, project_path, args.key, profile_name=profile_name, batch=args.batch,
+                            key_pool=args.keys)
+        return 0
+
+    with ExitStack() as stack:
+        # every network is only set up once, no matter how many profiles deploy to it
+        network_urls = set()
+        for profile_name in profile_names:
+            profile = cfg.profiles[profile_name]
+            if profile.network.url not in network_urls:
+                network_urls.add(profile.network.url)
+                stack.enter_context(network_context(profile.network, cfg.project_name, profile.name))
+
+        if args.dry_run:
+            for profile_name in profile_names:
+                dry_run_deployment(cfg, project_path, args.key, profile_name=profile_name)
+            return 0
+
+        deploy_profiles(cfg, project_path, args.key, profile_names, batch=args.batch, resume=args.resume,
+                        key_pool=args.keys)
 
     return 0
 
 
+def _select_profiles(cfg: Config, args: argparse.Namespace) -> Optional[List[str]]:
+    if args.all_profiles:
+        return list(cfg.profiles.keys())
+
+    if args.profiles is not None:
+        profile_names = [name.strip() for name in args.profiles.split(",") if name.strip()]
+    else:
+        profile_names = [args.profile or cfg.get_default_profile()]
+
+    for profile_name in profile_names:
+        if cfg.get_profile(profile_name) is None:
+            return None
+    return profile_names
+
+
 def add_deploy_command(parser):
     deploy_cmd = parser.add_parser("deploy")
-    deploy_cmd.add_argument(
+    profile_args = deploy_cmd.add_mutually_exclusive_group()
+    profile_args.add_argument(
         "-p", "--profile", default=None, help="The profile to deploy"
     )
+    profile_args.add_argument(
+        "--profiles", default=None, help="Comma separated profiles to deploy at the same time"
+    )
+    profile_args.add_argument(
+        "--all-profiles", action="store_true", help="Deploy all the profiles at the same time"
+    )
+    deploy_cmd.add_argument(
+        "-b", "--batch", action="store_true",
+        help="Store and instantiate the contracts that are ready together in a single transaction each",
+    )
+    deploy_cmd.add_argument(
+        "--plan", action="store_true",
+        help="Print the deployments that would be carried out (and the transactions needed) without deploying",
+    )
+    deploy_cmd.add_argument(
+        "--dry-run", action="store_true",
+        help="Validate and simulate the deployments, reporting their gas and fees without broadcasting anything",
+    )
+    deploy_cmd.add_argument(
+        "--resume", action="store_true",
+        help="Recover the results of an interrupted deployment from the chain before deploying",
+    )
+    deploy_cmd.add_argument(
+        "--keys", nargs="+", default=None, metavar="KEY",
+        help="Spread the new deployments across these funded keys, so the ones that are ready together land in the same block",
+    )
     deploy_cmd.add_argument("key", nargs="?", help="Deployer Key for all contracts")
     deploy_cmd.set_defaults(handler=run)
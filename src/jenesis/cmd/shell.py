@@ -1,4 +1,5 @@
 import argparse
+import atexit
 import os
 import sys
 
@@ -7,7 +8,10 @@ from cosmpy.aerial.faucet import FaucetApi
 from cosmpy.aerial.wallet import LocalWallet
 from cosmpy.crypto.keypairs import PrivateKey
 from ptpython import embed
+from jenesis.cache.code_ids import CodeIdIndex
+from jenesis.cache.digest import DigestCache
 from jenesis.config import Config, Profile
+from jenesis.config.lockfile import LockFileWriter
 from jenesis.contracts.detect import detect_contracts
 from jenesis.contracts.monkey import make_contract
 from jenesis.contracts.observer import DeploymentUpdater
@@ -38,7 +42,10 @@ def load_shell_globals(cfg: Config, selected_profile: Profile) -> dict:
     shell_globals = {}
     contract_instances = {}
 
-    contracts = {contract.variable_name: contract for contract in detect_contracts(PROJECT_PATH)}
+    # the digests of the binaries are written to the digest cache on exit
+    digests = DigestCache.load(PROJECT_PATH)
+    atexit.register(digests.save)
+    contracts = {contract.variable_name: contract for contract in detect_contracts(PROJECT_PATH, digests)}
 
     deployments = selected_profile.deployments
 
@@ -46,9 +53,14 @@ def load_shell_globals(cfg: Config, selected_profile: Profile) -> dict:
 
         # build the ledger client
         client = LedgerClient(selected_profile.network)
+        code_ids = CodeIdIndex.for_project(PROJECT_PATH, selected_profile.network.chain_id)
 
         print(f'Network: {selected_profile.network.name}')
 
+        # the updates from all the contracts are written together, with any pending ones written on exit
+        lock_file = LockFileWriter(cfg, PROJECT_PATH)
+        atexit.register(lock_file.flush)
+
         print('Detecting contracts...')
 
         for (deployment_name, deployment) in deployments.items():
@@ -65,12 +77,12 @@ def load_shell_globals(cfg: Config, selected_profile: Profile) -> dict:
                 address=deployment.address,
                 code_id=deployment.code_id,
                 observer=DeploymentUpdater(
-                    cfg,
-                    PROJECT_PATH,
+                    lock_file,
                     selected_profile.name,
                     deployment_name,
                 ),
                 init_args=deployment.init,
+                code_ids=code_ids,
             )
 
             contract_instances[deployment_name] = monkey
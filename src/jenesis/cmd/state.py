@@ -0,0 +1,58 @@
+import argparse
+import os
+
+from jenesis.cache.state_db import STATE_BACKEND_SQLITE
+from jenesis.config import Config
+
+
+def load_config():
+    if not os.path.exists("jenesis.toml"):
+        print("Please run command from project root")
+        return None
+
+    # the state commands only apply to the state database
+    cfg = Config.load(os.getcwd())
+    if cfg.state_backend != STATE_BACKEND_SQLITE:
+        print(f'The deployment state of this project is kept in jenesis.lock, set project.state_backend = '
+              f'"{STATE_BACKEND_SQLITE}" in jenesis.toml to keep it in the state database')
+        return None
+    return cfg
+
+
+def run_export(_: argparse.Namespace):
+    cfg = load_config()
+    if cfg is None:
+        return 1
+
+    lock_file_path = cfg.state_store(os.getcwd()).export()
+    print(f"Exported the deployment state to {lock_file_path}")
+    return 0
+
+
+def run_history(args: argparse.Namespace):
+    cfg = load_config()
+    if cfg is None:
+        return 1
+
+    records = cfg.state_store(os.getcwd()).history(args.profile, args.deployment)
+    if len(records) == 0:
+        print("No deploy transactions recorded")
+        return 0
+
+    for record in records:
+        print(f"{record.timestamp} {record.profile}.{record.deployment} {record.action} ({record.chain_id}) "
+              f"tx: {record.tx_hash} gas: {record.gas_used}/{record.gas_wanted}")
+    return 0
+
+
+def add_state_command(parser):
+    state_parser = parser.add_parser("state", help="Inspect the deployment state database")
+    subparsers = state_parser.add_subparsers()
+
+    export_cmd = subparsers.add_parser("export", help="Write the deployment state to jenesis.lock for review")
+    export_cmd.set_defaults(handler=run_export)
+
+    history_cmd = subparsers.add_parser("history", help="Show the transactions sent by past deployments")
+    history_cmd.add_argument("deployment", nargs="?", default=None, help="Only show this deployment")
+    history_cmd.add_argument("-p", "--profile", default=None, help="Only show this profile")
+    history_cmd.set_defaults(handler=run_history)
@@ -3,6 +3,7 @@ import os
 import toml
 
 from jenesis.config import Config
+from jenesis.config.editor import edit_project
 from jenesis.contracts.detect import detect_contracts
 
 
@@ -34,10 +35,11 @@ def run(args: argparse.Namespace):
         print('Nothing to update')
         return
                
-    for profile in profiles:
-        for contract in contracts_to_update:
-            network_name = cfg.profiles[profile].network.name
-            Config.update_project(os.getcwd(), profile, network_name, contract, contract.name)
+    with edit_project(project_path) as editor:
+        for profile in profiles:
+            for contract in contracts_to_update:
+                network_name = cfg.profiles[profile].network.name
+                editor.set_deployment(profile, network_name, contract, contract.name)
     
     print("Contracts up to date!")
 
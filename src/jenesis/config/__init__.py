@@ -6,15 +6,18 @@ import struct
 import subprocess
 from dataclasses import dataclass
 from tempfile import mkdtemp
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 import toml
 from cosmpy.crypto.address import Address
+from jenesis.cache.state_db import DEFAULT_STATE_BACKEND
 from jenesis.config.errors import ConfigurationError
+from jenesis.config.editor import edit_project, network_config
 from jenesis.config.extract import (extract_opt_dict, extract_opt_int,
                                     extract_opt_str, extract_req_dict,
                                     extract_req_str, extract_req_str_list,
                                     extract_opt_list)
+from jenesis.config.state import STATE_STORES, StateStore, create_state_store
 from jenesis.contracts import Contract
 from jenesis.contracts.detect import detect_contracts, parse_contract
 from jenesis.network import (Network, fetchai_localnode_config,
@@ -23,6 +26,10 @@ from jenesis.network import (Network, fetchai_localnode_config,
 
 TEMPLATE_GIT_URL = "https://github.com/fetchai/jenesis-templates.git"
 DEFAULT_KEYRING_BACKEND = "os"
+UPGRADE_INSTANTIATE = "instantiate"
+UPGRADE_MIGRATE = "migrate"
+DEFAULT_MAX_TX_BYTES = 1048576  # the default max_tx_bytes of the CometBFT mempool
+UPGRADE_MODES = (UPGRADE_INSTANTIATE, UPGRADE_MIGRATE)
 
 
 @dataclass
@@ -37,6 +44,12 @@ class Deployment:
     digest: Optional[str]  # lock: the contract of the deployed contract
     address: Optional[Address]  # lock: the address of the deployed contract
     code_id: Optional[int]  # lock: the code of the deployed contract
+    upgrade: Optional[str] = None  # config: how a changed contract is redeployed (instantiate or migrate)
+    migrate: Any = None  # config: migrate parameters for the contract
+
+    @property
+    def migrates(self) -> bool:
+        return self.upgrade == UPGRADE_MIGRATE
 
     def reset_metadata(self):
         self.checksum = None
@@ -91,6 +104,8 @@ class Profile:
     network: Network
     deployments: Dict[str, Deployment]
     default: bool = False
+    predictable_addresses: bool = False  # config: instantiate contracts at addresses computed before deployment
+    max_tx_bytes: int = DEFAULT_MAX_TX_BYTES  # config: the largest transaction the nodes of the network accept
 
     def to_lockfile(self) -> Any:
         return {
@@ -105,6 +120,7 @@ class Config:
     project_authors: List[str]
     profiles: Dict[str, Profile]
     keyring_backend: str = "os"
+    state_backend: str = DEFAULT_STATE_BACKEND  # where the deployment state is kept: "toml" or "sqlite"
 
     def update_deployment(
         self,
@@ -150,16 +166,13 @@ class Config:
     @classmethod
     def load(cls, path: str) -> "Config":
         project_file_path = os.path.join(path, "jenesis.toml")
-        lock_file_path = os.path.join(path, "jenesis.lock")
 
         if not os.path.isfile(project_file_path):
             raise ConfigurationError('Missing project file: "jenesis.toml"')
         project_contents = toml.load(project_file_path)
 
-        if os.path.isfile(lock_file_path):
-            lock_file_contents = toml.load(lock_file_path)
-        else:
-            lock_file_contents = {}
+        state_backend = extract_opt_str(project_contents, "project.state_backend") or DEFAULT_STATE_BACKEND
+        lock_file_contents = create_state_store(path, state_backend).load()
 
         return cls._loads(project_contents, lock_file_contents)
 
@@ -185,12 +198,18 @@ class Config:
         keyring_backend = extract_opt_str(
             project_contents, "project.keyring_backend"
         ) or DEFAULT_KEYRING_BACKEND
+        state_backend = extract_opt_str(
+            project_contents, "project.state_backend"
+        ) or DEFAULT_STATE_BACKEND
+        if state_backend not in STATE_STORES:
+            raise ConfigurationError(f"invalid state backend {state_backend}")
 
         return Config(
             project_name=extract_req_str(project_contents, "project.name"),
             project_authors=extract_req_str_list(project_contents, "project.authors"),
             profiles=profiles,
             keyring_backend=keyring_backend,
+            state_backend=state_backend,
         )
 
     @classmethod
@@ -225,11 +244,21 @@ class Config:
             if profile["default"]:
                 is_default = True
 
+        predictable_addresses = profile.get("predictable_addresses", False)
+        if not isinstance(predictable_addresses, bool):
+            raise ConfigurationError("invalid predictable_addresses setting, expected boolean")
+
+        max_tx_bytes = profile.get("max_tx_bytes", DEFAULT_MAX_TX_BYTES)
+        if isinstance(max_tx_bytes, bool) or not isinstance(max_tx_bytes, int) or max_tx_bytes <= 0:
+            raise ConfigurationError("invalid max_tx_bytes setting, expected positive integer")
+
         return Profile(
             name=str(name),
             network=network,
             deployments=deployments,
             default=is_default,
+            predictable_addresses=predictable_addresses,
+            max_tx_bytes=max_tx_bytes,
         )
 
     @classmethod
@@ -248,6 +277,12 @@ class Config:
         def opt_address(value: Optional[str]) -> Optional[Address]:
             return None if value is None else Address(value)
 
+        upgrade = extract_opt_str(contract_cfg, "upgrade")
+        if upgrade is not None and upgrade not in UPGRADE_MODES:
+            raise ConfigurationError(
+                f"invalid upgrade mode {upgrade} for {deployment_name}, expected one of {', '.join(UPGRADE_MODES)}"
+            )
+
         return Deployment(
             name=str(deployment_name),
             contract=extract_req_str(contract_cfg, "contract"),
@@ -259,18 +294,22 @@ class Config:
             address=opt_address(extract_opt_str(lock, "address")),
             code_id=extract_opt_int(lock, "code_id"),
             checksum=extract_opt_str(lock, "checksum"),
+            upgrade=upgrade,
+            migrate=extract_opt_dict(contract_cfg, "migrate"),
         )
 
-    def save(self, path: str):
-        contents = {
-            "profile": {
-                name: profile.to_lockfile() for name, profile in self.profiles.items()
-            }
-        }
+    def state_store(self, path: str) -> StateStore:
+        return create_state_store(path, self.state_backend)
 
-        lock_file_path = os.path.join(path, "jenesis.lock")
-        with open(lock_file_path, "w", encoding="utf-8") as lock_file:
-            toml.dump(contents, lock_file)
+    def save(self, path: str, profile_names: Optional[Iterable[str]] = None):
+        """
+        Saves the deployment state of the project to its state backend
+
+        :param path: The path to the project
+        :param profile_names: Only save these profiles, keeping the others as they are
+        :return:
+        """
+        self.state_store(path).save(self.profiles, profile_names)
 
     @staticmethod
     def create_project(path: str, profile: str, network_name: str):
@@ -290,17 +329,8 @@ class Config:
             "", None, None, None, None,
         ) for contract in contracts}
 
-        if network_name == "fetchai-testnet":
-            net_config = fetchai_testnet_config()
-        elif network_name == "fetchai-localnode":
-            net_config = fetchai_localnode_config()
-        elif network_name == "fetchai-mainnet":
-            net_config = fetchai_mainnet_config()
-        else:
-            raise ConfigurationError("Network name not recognized")
-
         network = {"name": network_name}
-        network.update(vars(net_config))
+        network.update(vars(network_config(network_name)))
 
         profiles = {
             profile: {
@@ -334,72 +364,19 @@ class Config:
 
     @staticmethod
     def update_project(path: str, profile: str, network_name: str, contract: Contract, deployment_name: str):
-
-        # take the project name directly from the base name of the project
-        project_root = os.path.abspath(path)
-
-        deployment = Deployment(deployment_name, contract.name,
-            network_name, "", {arg: "" for arg in contract.init_args()},
-            "", None, None, None, None)
-
-        data = toml.load("jenesis.toml")
-
-        data["profile"][profile]["contracts"][deployment_name] = vars(deployment)
-        project_configuration_file = os.path.join(project_root, "jenesis.toml")
-
-        with open(project_configuration_file, "w", encoding="utf-8") as toml_file:
-            toml.dump(data, toml_file)
+        # to make several changes to the project file, use a single session from edit_project instead
+        with edit_project(path) as editor:
+            editor.set_deployment(profile, network_name, contract, deployment_name)
 
     @staticmethod
     def update_key(path: str, profile: str, deployment_name: str, key: str):
-
-        # take the project name directly from the base name of the project
-        project_root = os.path.abspath(path)
-
-        input_file_name = "jenesis.toml"
-        path = os.path.join(os.getcwd(), input_file_name)
-        with open(path, encoding="utf-8") as toml_file:
-            data = toml.load(toml_file)
-
-        data["profile"][profile]["contracts"][deployment_name]["deployer_key"] = key
-        project_configuration_file = os.path.join(project_root, "jenesis.toml")
-
-        with open(project_configuration_file, "w", encoding="utf-8") as toml_file:
-            toml.dump(data, toml_file)
+        with edit_project(path) as editor:
+            editor.set_deployer_key(profile, deployment_name, key)
 
     @staticmethod
     def add_profile(profile: str, network_name: str):
-
-        data = toml.load("jenesis.toml")
-
-        if network_name == "fetchai-testnet":
-            net_config = fetchai_testnet_config()
-        elif network_name == "fetchai-localnode":
-            net_config = fetchai_localnode_config()
-        elif network_name == "fetchai-mainnet":
-            net_config = fetchai_mainnet_config()
-        else:
-            raise ConfigurationError("Network name not recognized")
-
-        network = {"name": ""}
-        network.update(vars(net_config))
-
-        default_profile = list(data["profile"].keys())[0]
-
-        contract_data = data["profile"][default_profile]["contracts"]
-
-        for deployment_name in contract_data.keys():
-            contract_data[deployment_name]["network"] = network_name
-
-        data["profile"][profile] = {
-            "network": network,
-            "contracts": contract_data,
-        }
-
-        output_file_name = "jenesis.toml"
-        with open(output_file_name, "w") as toml_file:
-            # pylint: disable=all
-            toml.dump(data, toml_file)
+        with edit_project() as editor:
+            editor.add_profile(profile, network_name)
 
     @staticmethod
     def add_contract(project_root: str, template: str, name: str, branch: Optional[str]) -> Optional[Contract]:
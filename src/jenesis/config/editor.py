@@ -0,0 +1,123 @@
+import copy
+import os
+from typing import Optional
+
+import tomlkit
+
+from jenesis.config.errors import ConfigurationError
+from jenesis.config.lockfile import write_atomically
+from jenesis.contracts import Contract
+from jenesis.network import (Network, fetchai_localnode_config,
+                             fetchai_mainnet_config, fetchai_testnet_config)
+
+PROJECT_FILE_NAME = "jenesis.toml"
+
+
+def network_config(network_name: str) -> Network:
+    if network_name == "fetchai-testnet":
+        return fetchai_testnet_config()
+    if network_name == "fetchai-localnode":
+        return fetchai_localnode_config()
+    if network_name == "fetchai-mainnet":
+        return fetchai_mainnet_config()
+    raise ConfigurationError("Network name not recognized")
+
+
+def _without_none(values: dict) -> dict:
+    # toml has no null value, so unset fields are left out
+    return {key: value for (key, value) in values.items() if value is not None}
+
+
+class ProjectEditor:
+    """
+    Editing session for the project file: it is loaded once, any number of changes are made to it and it is
+    then written once, atomically. The formatting and comments of the file are kept
+    """
+
+    def __init__(self, project_path: str):
+        self._path = os.path.join(os.path.abspath(project_path), PROJECT_FILE_NAME)
+        self._modified = False
+
+        with open(self._path, "r", encoding="utf-8") as project_file:
+            text = project_file.read()
+        self._data = tomlkit.parse(text)
+
+    def __enter__(self) -> "ProjectEditor":
+        return self
+
+    def __exit__(self, exc_type, *_):
+        # the changes are discarded if the session did not complete
+        if exc_type is None:
+            self.save()
+
+    @property
+    def modified(self) -> bool:
+        return self._modified
+
+    def set_deployment(self, profile: str, network_name: str, contract: Contract, deployment_name: str):
+        """
+        Adds a deployment of a contract to a profile, replacing the existing deployment with the same name
+
+        :param profile: The profile name
+        :param network_name: The name of the network of the profile
+        :param contract: The contract to deploy
+        :param deployment_name: The deployment name
+        :return:
+        """
+        deployment = {
+            "name": deployment_name,
+            "contract": contract.name,
+            "network": network_name,
+            "deployer_key": "",
+            "init": {arg: "" for arg in contract.init_args()},
+            "init_funds": "",
+        }
+        self._data["profile"][profile]["contracts"][deployment_name] = deployment
+        self._modified = True
+
+    def set_deployer_key(self, profile: str, deployment_name: str, key: str):
+        deployment = self._data["profile"][profile]["contracts"][deployment_name]
+        if deployment.get("deployer_key") != key:
+            deployment["deployer_key"] = key
+            self._modified = True
+
+    def add_profile(self, profile: str, network_name: str):
+        """
+        Adds a profile with the same deployments as the default profile
+
+        :param profile: The profile name
+        :param network_name: The name of the network of the profile
+        :return:
+        """
+        network = {"name": ""}
+        network.update(_without_none(vars(network_config(network_name))))
+
+        default_profile = list(self._data["profile"].keys())[0]
+        contract_data = copy.deepcopy(self._data["profile"][default_profile]["contracts"])
+        for deployment_name in contract_data.keys():
+            contract_data[deployment_name]["network"] = network_name
+
+        self._data["profile"][profile] = {
+            "network": network,
+            "contracts": contract_data,
+        }
+        self._modified = True
+
+    def save(self):
+        # nothing is written if nothing has changed
+        if not self._modified:
+            return
+
+        text = tomlkit.dumps(self._data)
+        write_atomically(self._path, text)
+        self._modified = False
+
+
+def edit_project(project_path: Optional[str] = None) -> ProjectEditor:
+    """
+    Starts an editing session for the project file, which is written when the session ends
+
+    :param project_path: The path to the project. If None then the current directory is used
+    :return: The editing session
+    """
+    return ProjectEditor(project_path or os.getcwd())
@@ -0,0 +1,127 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, List, Optional, Set
+
+import toml
+
+from jenesis.cache import state_path
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+if TYPE_CHECKING:
+    from jenesis.config import Config
+    from jenesis.config.state import DeployRecord
+
+LOCK_FILE_NAME = "jenesis.lock"
+LOCK_FILE_MUTEX_NAME = "jenesis.lock.mutex"
+
+
+@contextmanager
+def lock_file_mutex(project_path: str):
+    """
+    Holds an advisory lock on the lock file of a project, so that jenesis processes running at the same
+    time do not overwrite each other's updates
+
+    :param project_path: The path to the project
+    :return:
+    """
+    mutex_path = state_path(project_path, LOCK_FILE_MUTEX_NAME)
+    os.makedirs(os.path.dirname(mutex_path), exist_ok=True)
+
+    with open(mutex_path, "a", encoding="utf-8") as mutex_file:
+        if fcntl is not None:
+            fcntl.flock(mutex_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(mutex_file.fileno(), fcntl.LOCK_UN)
+
+
+def read_lock_file(project_path: str) -> Any:
+    lock_file_path = os.path.join(project_path, LOCK_FILE_NAME)
+    if not os.path.isfile(lock_file_path):
+        return {}
+    return toml.load(lock_file_path)
+
+
+def write_atomically(path: str, text: str):
+    """
+    Replaces a file atomically, so that it is never left partially written
+
+    :param path: The path to the file
+    :param text: The new contents of the file
+    :return:
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+
+    with open(temp_path, "w", encoding="utf-8") as output_file:
+        output_file.write(text)
+        output_file.flush()
+        os.fsync(output_file.fileno())
+    os.replace(temp_path, path)
+
+    # make the rename itself durable
+    if hasattr(os, "O_DIRECTORY"):
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+
+def write_lock_file(project_path: str, contents: Any):
+    write_atomically(os.path.join(project_path, LOCK_FILE_NAME), toml.dumps(contents))
+
+
+class LockFileWriter:
+    """
+    Collects the updates to the deployments of a project and writes them to the lock file (or the state
+    backend of the project) together. Only the profiles that have changed are written, so the updates of
+    other processes to other profiles are kept
+    """
+
+    def __init__(self, cfg: "Config", project_path: str):
+        self._cfg = cfg
+        self._project_path = project_path
+        self._dirty = set()  # type: Set[str]
+        self._history = []  # type: List[DeployRecord]
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "LockFileWriter":
+        return self
+
+    def __exit__(self, *_):
+        self.flush()
+
+    def update_deployment(self, profile_name: str, deployment_name: str, digest: Optional[str],
+                          code_id: Optional[int], address: Optional[Any]):
+        with self._lock:
+            self._cfg.update_deployment(profile_name, deployment_name, digest, code_id, address)
+            self._dirty.add(profile_name)
+
+    def mark_dirty(self, profile_name: str):
+        with self._lock:
+            self._dirty.add(profile_name)
+
+    def record_history(self, records: List["DeployRecord"]):
+        with self._lock:
+            self._history.extend(records)
+
+    def flush(self):
+        """
+        Writes all the pending updates to the lock file
+
+        :return:
+        """
+        with self._lock:
+            if len(self._dirty) > 0:
+                self._cfg.save(self._project_path, profile_names=self._dirty)
+                self._dirty = set()
+            if len(self._history) > 0:
+                self._cfg.state_store(self._project_path).record_history(self._history)
+                self._history = []
@@ -0,0 +1,238 @@
+import os
+from abc import ABC, abstractmethod
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+from jenesis.cache.state_db import (STATE_BACKEND_SQLITE, STATE_BACKEND_TOML,
+                                    STATE_META_LOCK_FILE_IMPORTED, connect_state_db)
+from jenesis.config.errors import ConfigurationError
+from jenesis.config.lockfile import (LOCK_FILE_NAME, lock_file_mutex,
+                                     read_lock_file, write_lock_file)
+
+if TYPE_CHECKING:
+    from jenesis.config import Profile
+
+LOCK_FIELDS = ("checksum", "digest", "address", "code_id")
+
+
+@dataclass
+class DeployRecord:
+    profile: str
+    deployment: str
+    chain_id: str
+    action: str  # store, instantiate or migrate
+    tx_hash: str
+    gas_wanted: Optional[int]
+    gas_used: Optional[int]
+    timestamp: str  # ISO 8601
+
+
+class StateStore(ABC):
+    """
+    Where the deployment state of a project (the contents of the lock file) is kept
+    """
+
+    def __init__(self, project_path: str):
+        self._project_path = project_path
+
+    @abstractmethod
+    def load(self) -> Any:
+        """
+        Loads the deployment state of all the profiles
+
+        :return: The state, in the same layout as the lock file
+        """
+
+    @abstractmethod
+    def save(self, profiles: Dict[str, "Profile"], profile_names: Optional[Iterable[str]] = None):
+        """
+        Saves the deployment state of the profiles
+
+        :param profiles: The profiles of the project
+        :param profile_names: Only save these profiles, keeping the others as they are. If None then all the
+                              profiles are saved and the state of any other profiles is removed
+        :return:
+        """
+
+    def record_history(self, records: List[DeployRecord]):
+        # the deploy history is only kept by the stores that support it
+        pass
+
+    def history(self, profile_name: Optional[str] = None, deployment_name: Optional[str] = None) -> List[DeployRecord]:  # pylint: disable=unused-argument
+        """
+        Gets the deploy transactions, oldest first
+
+        :param profile_name: Optional profile to get the transactions of
+        :param deployment_name: Optional deployment to get the transactions of
+        :return: The deploy records
+        """
+        return []
+
+
+class TomlStateStore(StateStore):
+    """
+    Keeps the deployment state in the `jenesis.lock` file, which is rewritten on every save
+    """
+
+    def load(self) -> Any:
+        return read_lock_file(self._project_path)
+
+    def save(self, profiles: Dict[str, "Profile"], profile_names: Optional[Iterable[str]] = None):
+        with lock_file_mutex(self._project_path):
+            if profile_names is None:
+                contents = {"profile": {}}
+                names = profiles.keys()
+            else:
+                # other processes may have updated the remaining profiles in the meantime
+                contents = read_lock_file(self._project_path)
+                contents.setdefault("profile", {})
+                names = [name for name in profile_names if name in profiles]
+
+            for name in names:
+                contents["profile"][name] = profiles[name].to_lockfile()
+
+            write_lock_file(self._project_path, contents)
+
+
+class SqliteStateStore(StateStore):
+    """
+    Keeps the deployment state in an indexed table in `.jenesis/state.db`, along with the history of the
+    deploy transactions. Only the rows of the deployments that have changed are written on each save
+    """
+
+    def _connect(self):
+        connection = connect_state_db(self._project_path)
+        if not self._is_lock_file_imported(connection):
+            self._import_lock_file(connection)
+        return connection
+
+    @staticmethod
+    def _is_lock_file_imported(connection) -> bool:
+        row = connection.execute("SELECT 1 FROM state_meta WHERE key = ?", (STATE_META_LOCK_FILE_IMPORTED,))
+        return row.fetchone() is not None
+
+    def _import_lock_file(self, connection):
+        # carry over the state of a project that used the lock file until now. This is recorded in the database
+        # rather than inferred from it being created, since e.g. the code id index may have created it first
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+
+            # another process may have imported it in the meantime
+            if self._is_lock_file_imported(connection):
+                return
+
+            # databases created before the import was recorded already hold the deployment state
+            if connection.execute("SELECT 1 FROM deployments LIMIT 1").fetchone() is None:
+                self._write_profiles(connection, read_lock_file(self._project_path).get("profile", {}), None)
+            connection.execute("INSERT INTO state_meta (key, value) VALUES (?, ?)",
+                               (STATE_META_LOCK_FILE_IMPORTED, "1"))
+
+    @contextmanager
+    def _transaction(self):
+        with closing(self._connect()) as connection:
+            with connection:
+                yield connection
+
+    def load(self) -> Any:
+        profiles = {}  # type: Dict[str, Dict[str, Any]]
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT profile, name, checksum, digest, address, code_id FROM deployments")
+            for (profile_name, name, *values) in rows:
+                profiles.setdefault(profile_name, {})[name] = {
+                    field: value for (field, value) in zip(LOCK_FIELDS, values) if value is not None
+                }
+        return {"profile": profiles}
+
+    def save(self, profiles: Dict[str, "Profile"], profile_names: Optional[Iterable[str]] = None):
+        names = profiles.keys() if profile_names is None else [name for name in profile_names if name in profiles]
+        contents = {name: profiles[name].to_lockfile() for name in names}
+
+        with self._transaction() as connection:
+            self._write_profiles(connection, contents, None if profile_names is None else names)
+
+    @staticmethod
+    def _write_profiles(connection, contents: Dict[str, Any], profile_names: Optional[Iterable[str]]):
+        if profile_names is None:
+            existing = connection.execute("SELECT profile, name, checksum, digest, address, code_id "
+                                          "FROM deployments").fetchall()
+        else:
+            existing = []
+            for profile_name in profile_names:
+                existing.extend(connection.execute(
+                    "SELECT profile, name, checksum, digest, address, code_id FROM deployments WHERE profile = ?",
+                    (profile_name,),
+                ))
+        existing_rows = {(row[0], row[1]): tuple(row[2:]) for row in existing}
+
+        rows = {}
+        for (profile_name, deployments) in contents.items():
+            for (name, lock) in deployments.items():
+                rows[(profile_name, name)] = tuple(lock.get(field) for field in LOCK_FIELDS)
+
+        connection.executemany(
+            "INSERT INTO deployments (profile, name, checksum, digest, address, code_id) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (profile, name) DO UPDATE SET checksum = excluded.checksum, digest = excluded.digest, "
+            "address = excluded.address, code_id = excluded.code_id",
+            [key + values for (key, values) in rows.items() if existing_rows.get(key) != values],
+        )
+        connection.executemany(
+            "DELETE FROM deployments WHERE profile = ? AND name = ?",
+            [key for key in existing_rows if key not in rows],
+        )
+
+    def record_history(self, records: List[DeployRecord]):
+        if len(records) == 0:
+            return
+
+        with self._transaction() as connection:
+            connection.executemany(
+                "INSERT INTO deploy_history (profile, deployment, chain_id, action, tx_hash, gas_wanted, gas_used, "
+                "timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(record.profile, record.deployment, record.chain_id, record.action, record.tx_hash,
+                  record.gas_wanted, record.gas_used, record.timestamp) for record in records],
+            )
+
+    def history(self, profile_name: Optional[str] = None,
+                deployment_name: Optional[str] = None) -> List[DeployRecord]:
+        query = ("SELECT profile, deployment, chain_id, action, tx_hash, gas_wanted, gas_used, timestamp "
+                 "FROM deploy_history")
+        conditions, params = [], []
+        if profile_name is not None:
+            conditions.append("profile = ?")
+            params.append(profile_name)
+        if deployment_name is not None:
+            conditions.append("deployment = ?")
+            params.append(deployment_name)
+        if len(conditions) > 0:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id"
+
+        with closing(self._connect()) as connection:
+            return [DeployRecord(*row) for row in connection.execute(query, params)]
+
+    def export(self) -> str:
+        """
+        Writes the deployment state to the lock file, e.g. so that it can be reviewed
+
+        :return: The path to the lock file
+        """
+        contents = self.load()
+        with lock_file_mutex(self._project_path):
+            write_lock_file(self._project_path, contents)
+        return os.path.join(self._project_path, LOCK_FILE_NAME)
+
+
+STATE_STORES = {
+    STATE_BACKEND_TOML: TomlStateStore,
+    STATE_BACKEND_SQLITE: SqliteStateStore,
+}
+
+
+def create_state_store(project_path: str, backend: str) -> StateStore:
+    store_cls = STATE_STORES.get(backend)
+    if store_cls is None:
+        raise ConfigurationError(
+            f'invalid state backend "{backend}", expected one of {", ".join(STATE_STORES.keys())}'
+        )
+    return store_cls(project_path)
@@ -2,7 +2,7 @@ import os.path
 from dataclasses import dataclass, field
 from typing import Optional, Dict, Any
 
-from cosmpy.aerial.contract import _compute_digest
+from jenesis.cache.digest import DigestCache, hash_file
 
 
 SchemaType = Dict[str, Any]
@@ -19,12 +19,15 @@ class Contract:
     instantiate_schema: Optional[SchemaType] = field(default=None, init=False)
     query_schema: Optional[SchemaType] = field(default=None, init=False)
     execute_schema: Optional[SchemaType] = field(default=None, init=False)
+    migrate_schema: Optional[SchemaType] = field(default=None, init=False)
+    digests: Optional[DigestCache] = field(default=None, repr=False, compare=False)
 
     def __post_init__(self):
         self.variable_name = self.to_variable_name(self.name)
         self.instantiate_schema = {}
         self.query_schema = {}
         self.execute_schema = {}
+        self.migrate_schema = {}
         self.update_schema()
 
     def update_schema(self):
@@ -41,12 +44,17 @@ class Contract:
                 self.query_schema = schema
             elif 'execute' in msg_type:
                 self.execute_schema = schema
+            elif 'migrate' in msg_type:
+                self.migrate_schema = schema
 
     def digest(self) -> Optional[str]:
         if not os.path.isfile(self.binary_path):
             return None
 
-        return _compute_digest(self.binary_path).hex()
+        # the digest cache of the project avoids hashing binaries that have not changed
+        if self.digests is not None:
+            return self.digests.digest(self.binary_path).hex()
+        return hash_file(self.binary_path).hex()
 
     def execute_msgs(self) -> dict:
         return _extract_msgs(self.execute_schema, self.execute_schema)
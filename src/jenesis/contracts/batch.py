@@ -0,0 +1,474 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import grpc
+from cosmpy.aerial.contract.cosmwasm import create_cosmwasm_store_code_msg
+from cosmpy.aerial.exceptions import BroadcastError
+from cosmpy.aerial.tx import Transaction
+from cosmpy.aerial.tx_helpers import SubmittedTx, TxResponse
+from cosmpy.aerial.wallet import Wallet
+from cosmpy.crypto.address import Address
+from jenesis.cache.code_ids import CodeIdIndex
+from jenesis.config import Deployment, Profile
+from jenesis.config.lockfile import LockFileWriter
+from jenesis.config.state import DeployRecord
+from jenesis.contracts import Contract
+from jenesis.contracts.instantiate2 import is_instantiated
+from jenesis.contracts.journal import DeployJournal, JournalTarget
+from jenesis.contracts.monkey import MonkeyContract, check_contract_address
+from jenesis.contracts.sequence import SequenceManager, TxLimitError
+from jenesis.contracts.uploads import CodeUploads
+from jenesis.network.aio import AsyncLedger
+from jenesis.tasks.aio import AsyncTask
+
+TX_OVERHEAD_BYTES = 4096  # room left in each bundle for the signature, fee and memo of the transaction
+
+
+def _message_events(response: TxResponse, event_type: str, attribute: str,
+                    indices: Optional[List[int]] = None) -> List[str]:
+    # the events of the transaction are merged together, so the per message logs are used instead
+    if len(response.logs) == 0:
+        raise RuntimeError(f"Unable to extract the {event_type} events of transaction {response.hash}")
+
+    logs = {log.index: log for log in response.logs}
+    values = []
+    for index in sorted(logs) if indices is None else indices:
+        value = logs[index].events.get(event_type, {}).get(attribute) if index in logs else None
+        if value is None:
+            raise RuntimeError(f"Unable to extract {attribute} of message {index} in transaction {response.hash}")
+        values.append(value)
+    return values
+
+
+def extract_code_ids(response: TxResponse, indices: Optional[List[int]] = None) -> List[int]:
+    """
+    Extracts the code id stored by each message of a transaction
+
+    :param response: The transaction response
+    :param indices: Optional indices of the messages to extract the code ids of. If None then every message
+                    of the transaction must store a code
+    :return: The code ids in message order
+    """
+    return [int(code_id) for code_id in _message_events(response, "store_code", "code_id", indices)]
+
+
+def extract_contract_addresses(response: TxResponse, indices: Optional[List[int]] = None) -> List[Address]:
+    """
+    Extracts the address of the contract instantiated by each message of a transaction
+
+    :param response: The transaction response
+    :param indices: Optional indices of the messages to extract the addresses of. If None then every message
+                    of the transaction must instantiate a contract
+    :return: The contract addresses in message order
+    """
+    return [Address(address) for address in _message_events(response, "instantiate", "_contract_address", indices)]
+
+
+def create_deploy_records(profile_name: str, chain_id: str, action: str, deployment_names: List[str],
+                          response: TxResponse) -> List[DeployRecord]:
+    """
+    Creates the deploy history records of a transaction, one for each deployment it is for
+
+    :param profile_name: The profile being deployed
+    :param chain_id: The chain id
+    :param action: The action of the transaction: store, instantiate or migrate
+    :param deployment_names: The deployments the transaction is for
+    :param response: The transaction response
+    :return: The deploy records
+    """
+    timestamp = (response.timestamp or datetime.now(timezone.utc)).isoformat()
+    return [
+        DeployRecord(profile_name, name, chain_id, action, response.hash, response.gas_wanted, response.gas_used,
+                     timestamp)
+        for name in dict.fromkeys(deployment_names)
+    ]
+
+
+@dataclass
+class TxUnit:
+    """
+    Messages that are sent in the same transaction, along with the deployment (and contract digest) and the
+    action of each message
+    """
+    key: str
+    messages: List[Any]
+    targets: List[JournalTarget]
+    actions: List[str]
+    fallback: Optional["TxUnit"] = None  # sent instead when the transaction of the unit fails or is too large
+    size: int = field(init=False)
+
+    def __post_init__(self):
+        self.size = sum(len(msg.SerializeToString()) for msg in self.messages)
+
+
+def pack_units(units: List[TxUnit], max_bytes: Optional[int]) -> List[List[TxUnit]]:
+    """
+    Packs units into bundles, each of which is sent as a single transaction, keeping the messages of every
+    bundle within the given number of bytes. A unit that is larger than the limit is put in a bundle by itself
+
+    :param units: The units to pack, in the order they are sent
+    :param max_bytes: The maximum size of the messages of a bundle, None if unbounded
+    :return: The bundles in order
+    """
+    bundles = []  # type: List[List[TxUnit]]
+    size = 0
+    for unit in units:
+        if len(bundles) == 0 or (max_bytes is not None and size + unit.size > max_bytes):
+            bundles.append([])
+            size = 0
+        bundles[-1].append(unit)
+        size += unit.size
+    return bundles
+
+
+def _unit_offsets(bundle: List[TxUnit]) -> List[int]:
+    # the index of the first message of each unit in the transaction of the bundle
+    offsets, offset = [], 0
+    for unit in bundle:
+        offsets.append(offset)
+        offset += len(unit.messages)
+    return offsets
+
+
+def _fallbacks(bundle: List[TxUnit]) -> Optional[List[TxUnit]]:
+    if all(unit.fallback is None for unit in bundle):
+        return None
+    return [unit.fallback or unit for unit in bundle]
+
+
+@dataclass
+class BatchDeployment:
+    deployment: Deployment
+    contract: Contract
+    ledger_contract: Optional[MonkeyContract] = None
+    contract_address: Optional[Address] = None
+    salt: Optional[bytes] = None  # when set the contract is instantiated at a predictable address
+    migrating: bool = False  # when set the existing contract is migrated to the new code
+    deployed: bool = False  # set once the contract has been instantiated or migrated
+
+
+class DeployBatchTask(AsyncTask):
+    """
+    Deploys a group of deployments that share a deployer key and do not depend on each other. Each binary
+    that needs storing is stored in the same transaction as the contracts that use it, which are instantiated
+    (or migrated) with the code id that the binary is predicted to get. The contracts of binaries that are
+    already stored, or that could not be deployed along with their binary, are deployed together afterwards.
+    The messages are bundled into as few transactions as fit within the size and gas limits of the network
+    """
+
+    def __init__(self, lock_file: LockFileWriter, profile: Profile, deployments: List[BatchDeployment],
+                 ledger: AsyncLedger, wallet: Wallet, sequences: SequenceManager, uploads: CodeUploads,
+                 journal: Optional[DeployJournal] = None, code_ids: Optional[CodeIdIndex] = None):
+        assert len(deployments) > 0
+        super().__init__(ledger.runtime)
+        self._lock_file = lock_file
+        self._profile = profile
+        self._deployments = deployments
+        self._ledger = ledger
+        self._client = ledger.client
+        self._wallet = wallet
+        self._sequences = sequences
+        self._journal = journal
+        self._uploads = uploads
+
+        # the code ids of the stored binaries are predicted from the codes already on chain
+        if code_ids is None:
+            code_ids = CodeIdIndex(self._client.network_config.chain_id)
+        self._code_ids = code_ids
+        self._included = []  # type: List[str]
+
+    @property
+    def name(self) -> str:
+        return ', '.join(self.deployment_names)
+
+    @property
+    def deployment_names(self) -> List[str]:
+        return [item.deployment.name for item in self._deployments]
+
+    @property
+    def group(self) -> Optional[str]:
+        return f'{self._profile.name} ({self._client.network_config.chain_id})'
+
+    @property
+    def included_tx_hashes(self) -> List[str]:
+        # the transactions of the deployments that were included in a block
+        return self._included
+
+    async def run(self):
+        chain_id = self._client.network_config.chain_id
+
+        self.set_status_text('(1/3) Determining contract parameters...')
+        await self._ledger.run_blocking(self._create_ledger_contracts, chain_id)
+
+        await self._store_contracts(chain_id)
+
+        await self._migrate_contracts()
+        await self._instantiate_contracts()
+
+    def on_complete(self):
+        # update the configuration, it is written to disk once the current wave of deployments completes
+        for item in self._deployments:
+            self._lock_file.update_deployment(self._profile.name, item.deployment.name,
+                                              item.ledger_contract.digest.hex(),
+                                              item.ledger_contract.code_id, item.contract_address)
+        if self._journal is not None:
+            self._journal.resolve(self._included)
+
+    def _create_ledger_contracts(self, chain_id: str):
+        for item in self._deployments:
+            # a contract that no longer exists (e.g. on a local chain that has been reset) is instantiated again
+            address = item.deployment.address
+            item.migrating = address is not None and is_instantiated(self._client, address)
+            if item.migrating:
+                item.contract_address = address
+
+            code_id = self._uploads.lookup(chain_id, item.contract.digest())
+            item.ledger_contract = MonkeyContract(
+                item.contract,
+                self._client,
+                code_id=item.deployment.code_id if code_id is None else code_id,
+                address=item.contract_address,
+                sequences=self._sequences,
+                code_ids=self._code_ids,
+            )
+
+    async def _store_contracts(self, chain_id: str):
+        # determine the unique binaries that still need to be stored
+        to_store = {}  # type: Dict[str, List[BatchDeployment]]
+        for item in self._deployments:
+            ledger_contract = item.ledger_contract
+            if ledger_contract.code_id is not None and ledger_contract.code_id > 0:
+                continue
+            to_store.setdefault(ledger_contract.digest.hex(), []).append(item)
+
+        if len(to_store) == 0:
+            return
+
+        async def store(digests: List[str]) -> List[int]:
+            # only the binaries claimed by this task are stored, the others are stored by other deployments
+            self.set_status_text(f'(2/3) Storing {len(digests)} contract(s)...')
+
+            # the code ids stored on the chain are predicted by one deployment at a time
+            async with self._uploads.store_lock(chain_id):
+                return await self._store_and_deploy(digests, to_store)
+
+        code_ids = await self._uploads.async_code_ids(chain_id, list(to_store.keys()), store)
+        for (digest, items) in to_store.items():
+            for item in items:
+                item.ledger_contract.set_code_id(code_ids[digest])
+
+    async def _store_and_deploy(self, digests: List[str],
+                                to_store: Dict[str, List[BatchDeployment]]) -> List[int]:
+        # each binary is assumed to get the next code id, in the order that they are stored
+        last_code_id = await self._ledger.run_blocking(self._sync_code_ids)
+        predicted = {digest: last_code_id + 1 + index for (index, digest) in enumerate(digests)}
+
+        units = {}  # type: Dict[str, TxUnit]
+        for digest in digests:
+            store_msg = create_cosmwasm_store_code_msg(to_store[digest][0].ledger_contract.path,
+                                                       self._wallet.address())
+            units[digest] = TxUnit(digest, [store_msg], [(to_store[digest][0].deployment.name, digest)], ["store"])
+
+        deploys = await self._combine_deployments(units, predicted)
+
+        code_ids = {}
+        for (bundle, response) in await self._broadcast(list(units.values())):
+            for (unit, offset) in zip(bundle, _unit_offsets(bundle)):
+                (code_id,) = extract_code_ids(response, [offset])
+                code_ids[unit.key] = code_id
+
+                # when the prediction was wrong the contracts are deployed again with the code that was stored
+                if unit.fallback is None or code_id != predicted[unit.key]:
+                    continue
+
+                for (index, (item, expected_address)) in enumerate(deploys[unit.key]):
+                    if not item.migrating:
+                        (address,) = extract_contract_addresses(response, [offset + 1 + index])
+                        item.contract_address = check_contract_address(address, expected_address)
+                    item.deployed = True
+
+        return [code_ids[digest] for digest in digests]
+
+    async def _combine_deployments(self, units: Dict[str, TxUnit], predicted: Dict[str, int]) \
+            -> Dict[str, List[Tuple[BatchDeployment, Optional[Address]]]]:
+        # with predictable addresses the contracts may depend on each other during instantiation, so they are
+        # only combined with the store of their binary while that keeps them in order
+        ordered = self._profile.predictable_addresses
+        positions = {digest: position for (position, digest) in enumerate(units)}
+        position = 0
+
+        deploys = {digest: [] for digest in units}  # type: Dict[str, List[Tuple[BatchDeployment, Optional[Address]]]]
+        for item in self._deployments:
+            digest = item.ledger_contract.digest.hex()
+            if digest not in units or (ordered and positions[digest] < position):
+                if ordered:
+                    break
+                continue
+
+            (msg, expected_address, action) = await self._create_deploy_msg(item, predicted[digest])
+            if msg is None:
+                continue
+
+            deploys[digest].append((item, expected_address))
+            position = positions[digest]
+
+            store_unit = units[digest].fallback or units[digest]
+            combined = units[digest]
+            units[digest] = TxUnit(digest, combined.messages + [msg], combined.targets + self._targets([item]),
+                                   combined.actions + [action], fallback=store_unit)
+
+        return deploys
+
+    def _sync_code_ids(self) -> int:
+        self._code_ids.sync(self._client)
+        return self._code_ids.last_code_id
+
+    async def _create_deploy_msg(self, item: BatchDeployment, code_id: int) -> Tuple[Any, Optional[Address], str]:
+        if item.migrating:
+            msg = item.ledger_contract.create_migrate_msg(item.deployment.migrate or {}, self._wallet, code_id)
+            return msg, None, "migrate"
+
+        (msg, expected_address) = await self._ledger.run_blocking(
+            item.ledger_contract.create_instantiate_msg,
+            item.deployment.init,
+            self._wallet,
+            admin_address=self._wallet.address(),
+            funds=item.deployment.init_funds,
+            salt=item.salt,
+            code_id=code_id,
+        )
+        return msg, expected_address, "instantiate"
+
+    async def _migrate_contracts(self):
+        to_migrate = [item for item in self._deployments if item.migrating and not item.deployed]
+        if len(to_migrate) == 0:
+            return
+
+        self.set_status_text(f'(3/3) Migrating {len(to_migrate)} contract(s)...')
+
+        units = []
+        for item in to_migrate:
+            (msg, _, action) = await self._create_deploy_msg(item, item.ledger_contract.code_id)
+            units.append(TxUnit(item.deployment.name, [msg], self._targets([item]), [action]))
+
+        await self._broadcast(units)
+        for item in to_migrate:
+            item.deployed = True
+
+    async def _instantiate_contracts(self):
+        to_create = [item for item in self._deployments if not item.migrating and not item.deployed]
+        if len(to_create) == 0:
+            return
+
+        self.set_status_text(f'(3/3) Instantiating {len(to_create)} contract(s)...')
+
+        to_instantiate = {}  # type: Dict[str, Tuple[BatchDeployment, Optional[Address]]]
+        units = []  # type: List[TxUnit]
+        for item in to_create:
+            (msg, expected_address, action) = await self._create_deploy_msg(item, item.ledger_contract.code_id)
+
+            # a contract that already exists at the predicted address was deployed with this exact configuration
+            if msg is None:
+                item.contract_address = expected_address
+                item.deployed = True
+            else:
+                to_instantiate[item.deployment.name] = (item, expected_address)
+                units.append(TxUnit(item.deployment.name, [msg], self._targets([item]), [action]))
+
+        for (bundle, response) in await self._broadcast(units):
+            for (unit, address) in zip(bundle, extract_contract_addresses(response, _unit_offsets(bundle))):
+                (item, expected_address) = to_instantiate[unit.key]
+                item.contract_address = check_contract_address(address, expected_address)
+                item.deployed = True
+
+    async def _broadcast(self, units: List[TxUnit]) -> List[Tuple[List[TxUnit], TxResponse]]:
+        # the bundles are waited for together once they have all been broadcast. The fallbacks of a bundle are
+        # sent instead when it is too large, or when it is known to have failed
+        if len(units) == 0:
+            return []
+
+        (submitted, fallbacks) = await self._submit_bundles(units)
+
+        results = await asyncio.gather(*[self._ledger.wait_for_tx(submitted_tx.tx_hash)
+                                         for (_, submitted_tx) in submitted], return_exceptions=True)
+
+        responses, errors = [], []
+        for ((bundle, _), result) in zip(submitted, results):
+            if isinstance(result, BroadcastError) and self._journal is not None:
+                self._journal.discard([result.tx_hash])
+
+            # a transaction that failed on chain had no effect, so its fallbacks can be sent instead
+            if isinstance(result, BroadcastError) and _fallbacks(bundle) is not None:
+                fallbacks.extend(_fallbacks(bundle))
+            elif isinstance(result, BaseException):
+                errors.append(result)
+            else:
+                self._included.append(result.hash)
+                self._record_history(bundle, result)
+                responses.append((bundle, result))
+
+        if len(errors) > 0:
+            raise errors[0]
+        return responses + await self._broadcast(fallbacks)
+
+    async def _submit_bundles(self, units: List[TxUnit]) -> Tuple[List[Tuple[List[TxUnit], SubmittedTx]],
+                                                                   List[TxUnit]]:
+        max_bytes = (await self._ledger.run_blocking(self._sequences.limits)).max_bytes
+        if max_bytes is not None:
+            max_bytes = max(max_bytes - TX_OVERHEAD_BYTES, 0)
+
+        # the bundles are broadcast one after the other, so that they use consecutive sequences. A bundle that is
+        # over the limits once signed (or simulated) is split in two and retried
+        submitted, fallbacks = [], []
+        pending = pack_units(units, max_bytes)
+        while len(pending) > 0:
+            bundle = pending.pop(0)
+            signed = []
+            try:
+                submitted.append((bundle, await self._submit(bundle, signed.append)))
+            except TxLimitError:
+                if len(bundle) > 1:
+                    middle = len(bundle) // 2
+                    pending[0:0] = [bundle[:middle], bundle[middle:]]
+                elif bundle[0].fallback is not None:
+                    pending.insert(0, [bundle[0].fallback])
+                else:
+                    raise
+            except (BroadcastError, grpc.RpcError, RuntimeError) as ex:
+                # the transaction was either rejected by the node or never sent
+                if _fallbacks(bundle) is None or not (isinstance(ex, BroadcastError) or len(signed) == 0):
+                    raise
+                fallbacks.extend(_fallbacks(bundle))
+
+        return submitted, fallbacks
+
+    async def _submit(self, bundle: List[TxUnit], on_signed: Callable[[Transaction], None]) -> SubmittedTx:
+        transaction = Transaction()
+        for unit in bundle:
+            for msg in unit.messages:
+                transaction.add_message(msg)
+
+        sequences = self._sequences
+        if self._journal is not None:
+            targets = [target for unit in bundle for target in unit.targets]
+            sequences = self._journal.sequences(self._sequences, self._profile.name,
+                                                self._client.network_config.chain_id, targets)
+        return await self._ledger.run_blocking(sequences.broadcast, transaction, self._wallet, on_signed=on_signed)
+
+    def _record_history(self, bundle: List[TxUnit], response: TxResponse):
+        names = {}  # type: Dict[str, List[str]]
+        for unit in bundle:
+            for ((name, _), action) in zip(unit.targets, unit.actions):
+                names.setdefault(action, []).append(name)
+
+        chain_id = self._client.network_config.chain_id
+        for (action, deployment_names) in names.items():
+            self._lock_file.record_history(create_deploy_records(
+                self._profile.name, chain_id, action, deployment_names, response,
+            ))
+
+    @staticmethod
+    def _targets(items: List[BatchDeployment]) -> List[JournalTarget]:
+        return [(item.deployment.name, item.ledger_contract.digest.hex()) for item in items]
@@ -1,14 +1,18 @@
+import hashlib
 import os
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional, Union
 
+import toml
 from docker import from_env
 from docker.models.containers import Container
 from docker.types import Mount
 
+from jenesis.cache.build import BuildManifest, compute_build_key
 from jenesis.contracts import Contract
+from jenesis.tasks.builder import BuilderExec, BuilderPool
 from jenesis.tasks.container import ContainerTask
 from jenesis.tasks.monitor import run_tasks
-from jenesis.tasks.utils import chunks, get_last_modified_timestamp
+from jenesis.tasks.utils import get_last_modified_timestamp
 
 
 CONTRACT_BUILD_IMAGE = "cosmwasm/rust-optimizer:0.13.0"
@@ -18,18 +22,125 @@ DEFAULT_BUILD_STEPS = [
     "mkdir -p artifacts",
     "mv target/wasm32-unknown-unknown/release/*.wasm artifacts/",
 ]
+SHARED_CACHE_DIR = "/sccache"
+BUILD_INPUT_FILES = (
+    "Cargo.toml",
+    "Cargo.lock",
+    "build.rs",
+    "rust-toolchain",
+    "rust-toolchain.toml",
+    os.path.join(".cargo", "config"),
+    os.path.join(".cargo", "config.toml"),
+)
+DEPENDENCY_SECTIONS = ("dependencies", "build-dependencies")
+
+
+def _path_dependencies(crate_path: str) -> List[str]:
+    try:
+        cargo_contents = toml.load(os.path.join(crate_path, "Cargo.toml"))
+    except (OSError, toml.TomlDecodeError):
+        return []
+
+    sections = [cargo_contents.get(section, {}) for section in DEPENDENCY_SECTIONS]
+    sections.append(cargo_contents.get("workspace", {}).get("dependencies", {}))
+    for target in cargo_contents.get("target", {}).values():
+        sections += [target.get(section, {}) for section in DEPENDENCY_SECTIONS]
+
+    dependencies = []
+    for section in sections:
+        for dependency in section.values():
+            if isinstance(dependency, dict) and "path" in dependency:
+                dependencies.append(os.path.join(crate_path, dependency["path"]))
+    return dependencies
+
+
+def get_shared_cache_volume(project_path: str) -> str:
+    """
+    Determines the name of the docker volume holding the compiler cache that is shared between
+    all the contracts of a project
+
+    :param project_path: The path to the project
+    :return: The volume name
+    """
+    project_path = os.path.abspath(project_path)
+    path_hash = hashlib.sha256(project_path.encode()).hexdigest()[:8]
+    return f'project_{os.path.basename(project_path)}_{path_hash}_sccache'
+
+
+def _shared_cache_build_steps(build_steps: List[str]) -> List[str]:
+    # every contract keeps its own target directory, so builds do not wait on each other's cargo lock, while
+    # sccache shares the compiled dependencies between them. Images without sccache simply build uncached
+    return [
+        "if command -v sccache > /dev/null; then export RUSTC_WRAPPER=sccache; fi",
+        *build_steps,
+    ]
+
+
+def get_build_inputs(crate_paths: List[str], cargo_root: str) -> List[str]:
+    """
+    Determines all the files that contribute to the build of the specified crates. This
+    includes the sources, manifests, lockfiles and build scripts of the crates as well as
+    any (transitive) path dependencies
+
+    :param crate_paths: The paths of the crates being built
+    :param cargo_root: The root of the cargo project (or workspace)
+    :return: The sorted list of input file paths
+    """
+    input_files = set()
+    visited = set()
+
+    pending = list(crate_paths) + [cargo_root]
+    while len(pending) > 0:
+        crate_path = os.path.abspath(pending.pop())
+        if crate_path in visited:
+            continue
+        visited.add(crate_path)
+
+        for filename in BUILD_INPUT_FILES:
+            file_path = os.path.join(crate_path, filename)
+            if os.path.isfile(file_path):
+                input_files.add(file_path)
+
+        for root, _, files in os.walk(os.path.join(crate_path, "src")):
+            for filename in files:
+                input_files.add(os.path.join(root, filename))
+
+        pending += _path_dependencies(crate_path)
+
+    return sorted(input_files)
+
+
+def get_build_size(contract: Contract) -> int:
+    """
+    Estimates the size of a contract build from the total size of its build inputs
+
+    :param contract: The contract
+    :return: The total size (in bytes) of the build inputs
+    """
+    return sum(
+        map(os.path.getsize, get_build_inputs([contract.source_path], contract.cargo_root))
+    )
 
 
 class ContractBuildTask(ContainerTask):
 
-    def __init__(self, contract: Contract, optimize: bool, rebuild: bool, log: bool):
-        super().__init__()
+    def __init__(self, contract: Contract, optimize: bool, rebuild: bool, log: bool,
+                 manifest: Optional[BuildManifest] = None, builders: Optional[BuilderPool] = None,
+                 shared_cache: Optional[str] = None, project_path: Optional[str] = None):
+        super().__init__(project_path)
         self.contract = contract
         self._optimize = optimize
         self._rebuild = rebuild
         self._log = log
+        self._manifest = manifest
+        self._builders = builders
+        self._build_key = None  # type: Optional[str]
         self._build_image = CONTRACT_BUILD_IMAGE
         self._build_steps = DEFAULT_BUILD_STEPS
+
+        # the optimizer script expects the target directory inside the contract, so optimized builds
+        # always use the contract's own cache
+        self._shared_cache = None if optimize else shared_cache
         self._working_dir = '/code'
         self._in_progress_text = 'Building...'
 
@@ -43,9 +154,24 @@ class ContractBuildTask(ContainerTask):
 
     def _is_out_of_date(self) -> bool:
         #  pylint: disable=duplicate-code
+        if self._manifest is not None:
+            self._build_key = compute_build_key(
+                self.contract.cargo_root,
+                get_build_inputs([self.contract.source_path], self.contract.cargo_root),
+                self._build_image,
+                self._optimize,
+            )
+
         if self._rebuild:
             return True
 
+        # compare the build inputs against the artifacts recorded for them, restoring them from a previous build
+        if self._build_key is not None:
+            artifact_paths = [self.contract.binary_path]
+            if self._manifest.is_up_to_date(self._build_key, artifact_paths):
+                return False
+            return not self._manifest.restore(self._build_key, artifact_paths)
+
         # determine the timestamp of the compiled contract
         if os.path.isfile(self.contract.binary_path):
             compiled_contract_timestamp = os.path.getmtime(self.contract.binary_path)
@@ -58,28 +184,46 @@ class ContractBuildTask(ContainerTask):
 
         return contract_source_timestamp > compiled_contract_timestamp
 
-    def _schedule_container(self) -> Container:
+    def _schedule_container(self) -> Union[Container, BuilderExec]:
+        environment = {}  # type: Dict[str, str]
+        build_steps = self._build_steps
         mounts = [
             Mount('/code/target', f'contract_{self.contract.variable_name}_cache'),
             Mount('/usr/local/cargo/registry', 'registry_cache'),
             Mount('/code', os.path.abspath(self.contract.cargo_root), type='bind'),
         ]
+        if self._shared_cache is not None:
+            mounts.append(Mount(SHARED_CACHE_DIR, self._shared_cache))
+            environment['SCCACHE_DIR'] = SHARED_CACHE_DIR
+            build_steps = _shared_cache_build_steps(build_steps)
+
+        # run the build inside the warm builder if configured
+        if self._builders is not None:
+            command = None if self._optimize else ["/bin/sh", "-c", " && ".join(build_steps)]
+            return self._builders.run(self._build_image, command, mounts, self._working_dir, environment)
 
         # get the docker client
         client = from_env()
 
         # start the container
         entrypoint = None if self._optimize else "/bin/sh"
-        args = None if self._optimize else ["-c", " && ".join(self._build_steps)]
+        args = None if self._optimize else ["-c", " && ".join(build_steps)]
         return client.containers.run(
             self._build_image,
             args,
             mounts=mounts,
             working_dir=self._working_dir,
             entrypoint=entrypoint,
+            environment=environment,
             detach=True,
         )
 
+    def _on_success(self):
+        if self._build_key is None:
+            return
+
+        self._manifest.record_artifacts(self._build_key, [self.contract.binary_path])
+
     def _show_logs(self):
         return self._log
 
@@ -90,6 +234,11 @@ def build_contracts(
     optimize: Optional[bool] = False,
     rebuild: Optional[bool] = False,
     log: Optional[bool] = False,
+    manifest: Optional[BuildManifest] = None,
+    builders: Optional[BuilderPool] = None,
+    priority: Optional[Callable[[Contract], Any]] = None,
+    shared_cache: Optional[str] = None,
+    project_path: Optional[str] = None,
 ):
     """
     Will attempt to build all the specified contracts (provided they are out of date)
@@ -98,6 +247,12 @@ def build_contracts(
     :param batch_size: The max number of builds to do in parallel. If None then will attempt to all in parallel
     :param optimize: Whether to perform an optimized build
     :param rebuild: Whether to force a rebuild of the contracts
+    :param manifest: The build manifest used to detect up to date builds. If None then file timestamps are used
+    :param builders: The pool of warm builders to run the builds in. If None then a container is created per build
+    :param priority: Optional sort key for the contracts, the contracts with the lowest key are built first
+    :param shared_cache: The volume holding a compiler cache shared by all the contracts. If None then each
+                         contract compiles its own dependencies
+    :param project_path: The path to the project, the full build logs are kept in its state folder
     :return:
     """
 
@@ -109,23 +264,38 @@ def build_contracts(
             [optimize] * len(contracts),
             [rebuild] * len(contracts),
             [log] * len(contracts),
+            [manifest] * len(contracts),
+            [builders] * len(contracts),
+            [shared_cache] * len(contracts),
+            [project_path] * len(contracts),
         )
     )
 
-    # run the tasks (in batches if configured)
-    for batch in chunks(tasks, batch_size=batch_size):
-        run_tasks(batch)
+    # run the tasks, starting the next queued build as soon as one finishes
+    try:
+        run_tasks(
+            tasks,
+            max_parallel=batch_size,
+            priority=None if priority is None else lambda task: priority(task.contract),
+        )
+    finally:
+        if manifest is not None:
+            manifest.save()
 
 
 class WorkspaceBuildTask(ContainerTask):
 
-    def __init__(self, path: str, contracts: List[Contract], optimize: bool, rebuild: bool, log: bool):
-        super().__init__()
+    def __init__(self, path: str, contracts: List[Contract], optimize: bool, rebuild: bool, log: bool,
+                 manifest: Optional[BuildManifest] = None, builders: Optional[BuilderPool] = None):
+        super().__init__(path)
         self._path = path
         self._contracts = contracts
         self._optimize = optimize
         self._rebuild = rebuild
         self._log = log
+        self._manifest = manifest
+        self._builders = builders
+        self._build_key = None  # type: Optional[str]
         self._build_image = WORKSPACE_BUILD_IMAGE
         self._build_steps = DEFAULT_BUILD_STEPS
 
@@ -137,10 +307,28 @@ class WorkspaceBuildTask(ContainerTask):
     def path(self) -> str:
         return self._path
 
+    @property
+    def artifact_paths(self) -> List[str]:
+        return [contract.binary_path for contract in self._contracts]
+
     def _is_out_of_date(self) -> bool:
+        if self._manifest is not None:
+            self._build_key = compute_build_key(
+                self._path,
+                get_build_inputs([contract.source_path for contract in self._contracts], self._path),
+                self._build_image,
+                self._optimize,
+            )
+
         if self._rebuild:
             return True
 
+        # compare the build inputs against the artifacts recorded for them, restoring them from a previous build
+        if self._build_key is not None:
+            if self._manifest.is_up_to_date(self._build_key, self.artifact_paths):
+                return False
+            return not self._manifest.restore(self._build_key, self.artifact_paths)
+
         # determine the most recent timestamp of the compiled workspace files
         build_path = os.path.join(self._path, 'artifacts')
         workspace_build_timestamp = get_last_modified_timestamp([build_path], 'wasm')
@@ -151,13 +339,18 @@ class WorkspaceBuildTask(ContainerTask):
 
         return contract_source_timestamp > workspace_build_timestamp
 
-    def _schedule_container(self) -> Container:
+    def _schedule_container(self) -> Union[Container, BuilderExec]:
         mounts = [
             Mount('/code/target', f'workspace_{os.path.basename(self.path)}_cache'),
             Mount('/usr/local/cargo/registry', 'registry_cache'),
             Mount('/code', os.path.abspath(self.path), type='bind'),
         ]
 
+        # run the build inside the warm builder if configured
+        if self._builders is not None:
+            command = None if self._optimize else ["/bin/sh", "-c", " && ".join(self._build_steps)]
+            return self._builders.run(self._build_image, command, mounts, '/code')
+
         # get the docker client
         client = from_env()
 
@@ -172,6 +365,12 @@ class WorkspaceBuildTask(ContainerTask):
             detach=True,
         )
 
+    def _on_success(self):
+        if self._build_key is None:
+            return
+
+        self._manifest.record_artifacts(self._build_key, self.artifact_paths)
+
     def _show_logs(self):
         return self._log
 
@@ -180,17 +379,25 @@ def build_workspace(
     contracts: List[Contract],
     optimize: Optional[bool] = False,
     rebuild: Optional[bool] = False,
-    log: Optional[bool] = False
+    log: Optional[bool] = False,
+    manifest: Optional[BuildManifest] = None,
+    builders: Optional[BuilderPool] = None,
 ):
     """
     Will attempt to build the cargo workspace including all contracts
 
     :param optimize: Whether to perform an optimized build
     :param rebuild: Whether to force a rebuild of the workspace
+    :param manifest: The build manifest used to detect up to date builds. If None then file timestamps are used
+    :param builders: The pool of warm builders to run the build in. If None then a dedicated container is used
     :return:
     """
     # create all the tasks to be done
-    tasks = [WorkspaceBuildTask(path, contracts, optimize, rebuild, log)]
+    tasks = [WorkspaceBuildTask(path, contracts, optimize, rebuild, log, manifest, builders)]
 
     # run the tasks
-    run_tasks(tasks)
+    try:
+        run_tasks(tasks)
+    finally:
+        if manifest is not None:
+            manifest.save()
@@ -1,60 +1,95 @@
 import graphlib as gl
-import os
-from concurrent.futures import ThreadPoolExecutor
-from concurrent.futures import TimeoutError as ConcurrentTimeoutError
-from typing import Dict, List, Optional, Set, Union
+import hashlib
+from typing import Dict, List, Optional, Set, Tuple
 
 from cosmpy.aerial.client import LedgerClient
-from cosmpy.aerial.contract import LedgerContract
+from cosmpy.aerial.contract.cosmwasm import create_cosmwasm_store_code_msg
+from cosmpy.aerial.exceptions import BroadcastError
+from cosmpy.aerial.tx import Transaction
+from cosmpy.aerial.tx_helpers import TxResponse
 from cosmpy.aerial.wallet import LocalWallet, Wallet
 from cosmpy.crypto.address import Address
 from cosmpy.crypto.keypairs import PrivateKey
 from jenesis.config import Config, Deployment, Profile
+from jenesis.config.editor import ProjectEditor, edit_project
+from jenesis.config.lockfile import LockFileWriter
+from jenesis.cache.code_ids import CodeIdIndex
+from jenesis.cache.digest import DigestCache
 from jenesis.contracts import Contract
+from jenesis.contracts.batch import (BatchDeployment, DeployBatchTask, create_deploy_records, extract_code_ids,
+                                     extract_contract_addresses)
 from jenesis.contracts.detect import detect_contracts
-from jenesis.contracts.monkey import MonkeyContract
+from jenesis.contracts.instantiate2 import compute_salt, is_instantiated, predict_address
+from jenesis.contracts.journal import DeployJournal, reconcile_journal
+from jenesis.contracts.monkey import MonkeyContract, check_contract_address
+from jenesis.contracts.plan import (PLAN_MIGRATE, DeploymentPlan, assign_deployer_keys, compute_dependency_components,
+                                    compute_deployment_plan, compute_instantiation_order, insert_address,
+                                    resolve_init)
+from jenesis.contracts.sequence import SequenceManager, broadcast_and_wait
+from jenesis.contracts.uploads import CodeUploads
 from jenesis.keyring import (LocalInfo, query_keychain_item,
                              query_keychain_items)
-from jenesis.tasks import Task, TaskStatus
+from jenesis.network.aio import AsyncLedger, AsyncLedgerPool
+from jenesis.tasks import Task
+from jenesis.tasks.aio import AsyncRuntime, AsyncTask
 from jenesis.tasks.monitor import run_tasks
 
 
-# Recursive function to insert deployed contract address into instantiation msg
-def insert(data: Union[Dict, List], contract_name: str, address: str):
-    for key, value in data.items() if isinstance(data, dict) else enumerate(data):
-        if value == ("$" + contract_name):
-            data[key] = address
-        elif isinstance(value, (dict, list)):
-            insert(value, contract_name, address)
+def predict_deployment_addresses(
+    cfg: Config,
+    profile: Profile,
+    prepared: List[Tuple[Deployment, Contract]],
+    keys: Dict[str, PrivateKey],
+    init_addresses: Dict[str, Set[str]],
+) -> Tuple[Dict[str, bytes], Dict[str, Address]]:
+    """
+    Computes the instantiation salts and the resulting contract addresses of the deployments of a
+    profile that uses predictable addresses. This must be done before any contract addresses are
+    inserted into the init messages
+
+    :param cfg: The project configuration
+    :param profile: The profile being deployed
+    :param prepared: The deployments (and their contracts) that are about to be deployed
+    :param keys: The deployer keys
+    :param init_addresses: The deployments referenced by each deployment
+    :return: The salts and the addresses of the deployments
+    """
+    # contracts that are migrated keep their current address
+    to_instantiate = {
+        deployment.name: (deployment, contract) for (deployment, contract) in prepared if deployment.address is None
+    }
+    creators = {
+        name: LocalWallet(keys[deployment.deployer_key]).address()
+        for (name, (deployment, _)) in to_instantiate.items()
+    }
+
+    def identity(name: str) -> str:
+        deployment, contract = to_instantiate[name]
+        base_salt = compute_salt(cfg.project_name, profile.name, name, deployment.init, deployment.init_funds)
+        return hashlib.sha256(bytes.fromhex(contract.digest()) + bytes(creators[name]) + base_salt).hexdigest()
+
+    salts, addresses = {}, {}
+    for component in compute_dependency_components(list(to_instantiate), init_addresses):
+        # the salt covers the addresses of the dependencies, so redeploying a dependency moves its dependents
+        # to new addresses too. Deployments that reference each other cover each other's configuration instead
+        dependencies = {}
+        for name in component:
+            for dependency in init_addresses.get(name, set()).difference(component):
+                address = addresses.get(dependency, profile.deployments[dependency].address)
+                dependencies[dependency] = "" if address is None else str(address)
+        if len(component) > 1:
+            dependencies.update({name: identity(name) for name in component})
+
+        for name in component:
+            deployment, contract = to_instantiate[name]
+            salt = compute_salt(cfg.project_name, profile.name, name, deployment.init, deployment.init_funds,
+                                dependencies)
+
+            salts[name] = salt
+            addresses[name] = predict_address(bytes.fromhex(contract.digest()), creators[name], salt)
+    return salts, addresses
 
 
-def insert_address(contract_address_names: List[str], deployment: Deployment, profile: Profile) -> dict:
-
-    deployment_names = list(profile.deployments.keys())
-    init_data = deployment.init
-
-    # iterate over the addresses to insert
-    for name in contract_address_names:
-        if name in deployment_names:
-            deployed_contract_address = profile.deployments[name].address
-
-            assert deployed_contract_address is not None, f"Contract {name} address not found"
-
-            # insert deployed contract address in instantiation msg
-            insert(init_data, name, str(deployed_contract_address))
-
-    return init_data
-
-def retreive_init_addresses(data: Union[Dict, List], contract_names: List[str], init_addresses: List[str]):
-    for _, value in data.items() if isinstance(data, dict) else enumerate(data):
-        if isinstance(value, str) and len(value) > 0:
-            if value[0] == "$" and value[1:] in contract_names:
-                init_addresses.append(value[1:])
-                contract_names.remove(value[1:])
-        elif isinstance(value, (dict, list)):
-            retreive_init_addresses(value, contract_names,init_addresses)
-    return init_addresses
-
 def load_keys(key_names: Set[str], cfg: Config) -> Dict[str, PrivateKey]:
     keys = {}
     available_key_names = set(query_keychain_items(cfg.keyring_backend))
@@ -73,219 +108,617 @@ def load_keys(key_names: Set[str], cfg: Config) -> Dict[str, PrivateKey]:
     return keys
 
 
-class DeployContractTask(Task):
-    def __init__(self, project_path: str, cfg: Config, profile: Profile, contract: Contract,
-                 deployment: Deployment, client: LedgerClient, wallet: Wallet):
-        self._project_path = project_path
-        self._cfg = cfg
+def load_code_uploads(cfg: Config, profile: Profile) -> CodeUploads:
+    """
+    Collects the binaries that have already been stored on the chain of the profile by any of the
+    profiles that target the same chain
+
+    :param cfg: The project configuration
+    :param profile: The profile being deployed
+    :return: The code uploads
+    """
+    chain_id = profile.network.chain_id
+
+    uploads = CodeUploads()
+    for other_profile in cfg.profiles.values():
+        if other_profile.network.chain_id != chain_id:
+            continue
+        for deployment in other_profile.deployments.values():
+            if deployment.digest is not None and deployment.code_id is not None:
+                uploads.add(chain_id, deployment.digest, deployment.code_id)
+    return uploads
+
+
+class DeployContractTask(AsyncTask):
+    def __init__(self, lock_file: LockFileWriter, profile: Profile, contract: Contract,
+                 deployment: Deployment, ledger: AsyncLedger, wallet: Wallet, sequences: SequenceManager,
+                 uploads: CodeUploads, salt: Optional[bytes] = None, journal: Optional[DeployJournal] = None,
+                 code_ids: Optional[CodeIdIndex] = None):
+        super().__init__(ledger.runtime)
+        self._lock_file = lock_file
         self._profile = profile
         self._contract = contract
         self._deployment = deployment
-        self._client = client
+        self._ledger = ledger
+        self._client = ledger.client
         self._wallet = wallet
 
-        # task status
-        self._status = TaskStatus.IDLE
-        self._status_text = ''
-        self._logs = ''
+        # the account sequences are shared by all the deployments so transactions from the same wallet
+        # can be broadcast without waiting for each other to be included in a block
+        self._sequences = sequences
+
+        # the code uploads are shared by all the deployments so each unique binary is only stored once
+        self._uploads = uploads
+        self._code_ids = code_ids
 
-        # background worker
-        self._executor = ThreadPoolExecutor(max_workers=1)
+        # when set the contract is instantiated at the address predicted from this salt
+        self._salt = salt
 
-        # state machine state
-        self._state = 'idle'
-        self.ledger_contract = None  # type: Optional[LedgerContract]
+        # when set every transaction is recorded in the journal before it is broadcast
+        self._journal = journal
+        self._included = []  # type: List[str]
+        if journal is not None:
+            self._sequences = journal.sequences(
+                sequences, profile.name, self._client.network_config.chain_id,
+                [(deployment.name, contract.digest())],
+            )
+
+        self._migrating = False
+        self.ledger_contract = None  # type: Optional[MonkeyContract]
         self.contract_address = None  # type: Optional[Address]
-        self._future = None
 
     @property
     def name(self) -> str:
         return self._deployment.name
 
     @property
-    def status(self) -> TaskStatus:
-        return self._status
+    def deployment_names(self) -> List[str]:
+        return [self._deployment.name]
 
     @property
-    def status_text(self) -> str:
-        return self._status_text
+    def group(self) -> Optional[str]:
+        return f'{self._profile.name} ({self._client.network_config.chain_id})'
 
     @property
-    def logs_text(self) -> str:
-        return self._logs
-
-    def poll(self):
-        if self._state == 'idle':
-            self._schedule_build_contract()
-        elif self._state == 'wait-for-ledger-contract':
-            self._wait_for_ledger_contract()
-        elif self._state == 'schedule-deployment':
-            self._schedule_deploy_contract()
-        elif self._state == 'wait-for-deployment':
-            self._wait_for_contract_deployment()
-        elif self._state == 'failed':
-            self._failed()
-        elif self._state == 'complete':
-            self._complete()
-        else:
-            assert False, "bad state"
+    def included_tx_hashes(self) -> List[str]:
+        # the transactions of the deployment that were included in a block
+        return self._included
+
+    async def run(self):
+        self.set_status_text('(1/2) Determining contract parameters...')
+        self.ledger_contract = await self._ledger.run_blocking(self._create_ledger_contract)
 
-    def _schedule_build_contract(self):
-        assert self._future is None
+        self.set_status_text('(2/2) Migrating contract...' if self._migrating else '(2/2) Deploying contract...')
 
-        def action():
-            return MonkeyContract(
-                self._contract,
-                self._client,
-                code_id=self._deployment.code_id,
-                address=self._deployment.address
+        # store the binary unless it is already on chain or being stored for another deployment
+        if self.ledger_contract.code_id is None or self.ledger_contract.code_id <= 0:
+            code_id = await self._uploads.async_code_id(
+                self._client.network_config.chain_id, self.ledger_contract.digest.hex(), self._store,
             )
+            self.ledger_contract.set_code_id(code_id)
 
-        self._future = self._executor.submit(action)
-        self._state = 'wait-for-ledger-contract'
-        self._status = TaskStatus.IN_PROGRESS
-        self._status_text = '(1/2) Determining contract parameters...'
+        if self._migrating:
+            await self._migrate()
+            self.contract_address = self.ledger_contract.address
+        else:
+            self.contract_address = await self._instantiate()
+
+    def _create_ledger_contract(self) -> MonkeyContract:
+        # prefer a code id that is known to hold this exact binary over the one from the previous deployment
+        code_id = self._uploads.lookup(self._client.network_config.chain_id, self._contract.digest())
+        if code_id is None:
+            code_id = self._deployment.code_id
+
+        # a contract that no longer exists (e.g. on a local chain that has been reset) is instantiated again
+        address = self._deployment.address
+        if address is not None and not is_instantiated(self._client, address):
+            address = None
+        self._migrating = address is not None
+
+        return MonkeyContract(
+            self._contract,
+            self._client,
+            code_id=code_id,
+            address=address,
+            sequences=self._sequences,
+            code_ids=self._code_ids,
+        )
 
-    def _wait_for_ledger_contract(self):
-        try:
-            self.ledger_contract = self._future.result(timeout=0.05)
-            self._state = 'schedule-deployment'
-            self._future = None
-        except ConcurrentTimeoutError:
-            pass
-
-    def _schedule_deploy_contract(self):
-        assert self._future is None
-        assert self.ledger_contract is not None
-
-        def action():
-            return self.ledger_contract._deploy( #  pylint: disable=W0212
-                args=self._deployment.init,
-                sender=self._wallet,
-                admin_address=self._wallet.address(),
-                funds=self._deployment.init_funds,
-            )
+    async def _store(self) -> int:
+        transaction = Transaction()
+        transaction.add_message(create_cosmwasm_store_code_msg(self._contract.binary_path, self._wallet.address()))
 
-        self._future = self._executor.submit(action)
-        self._state = 'wait-for-deployment'
-        self._status = TaskStatus.IN_PROGRESS
-        self._status_text = '(2/2) Deploying contract...'
+        response = await self._broadcast(transaction, "store")
+        code_ids = extract_code_ids(response)
+        if len(code_ids) == 0:
+            raise RuntimeError("Unable to extract contract code id")
+        return code_ids[0]
 
-    def _wait_for_contract_deployment(self):
-        try:
-            self.contract_address = self._future.result(timeout=0.05)
-            self._state = 'complete'
-            self._future = None
-        except ConcurrentTimeoutError:
-            pass
-
-    def _complete(self):
-        # update the configuration and save it to disk
-        self._cfg.update_deployment(self._profile.name, self._deployment.name,
-                                    self.ledger_contract.digest.hex(),
-                                    self.ledger_contract.code_id, self.contract_address)
-        self._cfg.save(self._project_path)
-
-        self._finished(True)
-
-    def _failed(self):
-        self._finished(False)
-
-    def _finished(self, success: bool):
-        self._executor.shutdown(wait=True)
-        if success:
-            self._status = TaskStatus.COMPLETE
+    async def _migrate(self):
+        msg = self.ledger_contract.create_migrate_msg(
+            self._deployment.migrate or {}, self._wallet, self.ledger_contract.code_id,
+        )
+
+        transaction = Transaction()
+        transaction.add_message(msg)
+        await self._broadcast(transaction, "migrate")
+
+    async def _instantiate(self) -> Address:
+        (msg, expected_address) = await self._ledger.run_blocking(
+            self.ledger_contract.create_instantiate_msg,
+            self._deployment.init,
+            self._wallet,
+            admin_address=self._wallet.address(),
+            funds=self._deployment.init_funds,
+            salt=self._salt,
+        )
+
+        # the contract already exists at the address predicted from its salt
+        if msg is None:
+            address = expected_address
         else:
-            self._status = TaskStatus.FAILED
-        self._status_text = ''
+            transaction = Transaction()
+            transaction.add_message(msg)
+            response = await self._broadcast(transaction, "instantiate")
+            addresses = extract_contract_addresses(response)
+            address = check_contract_address(addresses[0] if addresses else None, expected_address)
 
-    def teardown(self):
-        pass
+        self.ledger_contract.set_address(address)
+        return address
 
+    async def _broadcast(self, transaction: Transaction, action: str) -> TxResponse:
+        try:
+            response = await broadcast_and_wait(self._ledger, self._sequences, transaction, self._wallet)
+        except BroadcastError as ex:
+            # a transaction that failed has no results to recover
+            if self._journal is not None:
+                self._journal.discard([ex.tx_hash])
+            raise
+
+        self._included.append(response.hash)
+        self._lock_file.record_history(create_deploy_records(
+            self._profile.name, self._client.network_config.chain_id, action, [self._deployment.name], response,
+        ))
+        return response
+
+    def on_complete(self):
+        # update the configuration, it is written to disk once the current wave of deployments completes
+        self._lock_file.update_deployment(self._profile.name, self._deployment.name,
+                                          self.ledger_contract.digest.hex(),
+                                          self.ledger_contract.code_id, self.contract_address)
+        if self._journal is not None:
+            self._journal.resolve(self._included)
+
+
+def _create_deployment_sorter(profile: Profile, init_addresses: Dict[str, Set[str]]) -> gl.TopologicalSorter:
+    # when the addresses are predictable they are all known up front, so every deployment can start straight away
+    if profile.predictable_addresses:
+        sorter = gl.TopologicalSorter({name: set() for name in compute_instantiation_order(profile.deployments)})
+    else:
+        sorter = gl.TopologicalSorter(init_addresses)
+    sorter.prepare()
+    return sorter
+
+
+def _resolve_init_addresses(
+    cfg: Config,
+    profile: Profile,
+    prepared: List[Tuple[Deployment, Contract]],
+    init_addresses: Dict[str, Set[str]],
+    keys: Dict[str, PrivateKey],
+    predicted_salts: Dict[str, bytes],
+    predicted_addresses: Dict[str, Address],
+) -> List[Tuple[Deployment, Contract]]:
+    # the salts are derived from the init messages before any addresses have been inserted into them
+    if profile.predictable_addresses:
+        salts, addresses = predict_deployment_addresses(cfg, profile, prepared, keys, init_addresses)
+        predicted_salts.update(salts)
+        predicted_addresses.update(addresses)
+
+    resolved = []
+    for (deployment, contract) in prepared:
+        contract_address_names = list(init_addresses[deployment.name])
+
+        unresolved = [
+            name for name in contract_address_names
+            if name not in predicted_addresses and profile.deployments[name].address is None
+        ]
+        if len(unresolved) > 0:
+            print(f"Skipping {deployment.name}: not all of its dependencies were deployed")
+            continue
 
-def deploy_contracts(cfg: Config, project_path: str, deployer_key: Optional[str], profile_name: Optional[str] = None):
+        deployment.init = insert_address(contract_address_names, deployment, profile, predicted_addresses)
+        resolved.append((deployment, contract))
+    return resolved
+
+
+def _create_deploy_tasks(
+    prepared: List[Tuple[Deployment, Contract]],
+    batch: bool,
+    lock_file: LockFileWriter,
+    profile: Profile,
+    ledger: AsyncLedger,
+    keys: Dict[str, PrivateKey],
+    sequences: SequenceManager,
+    uploads: CodeUploads,
+    code_ids: CodeIdIndex,
+    salts: Dict[str, bytes],
+    journal: DeployJournal,
+) -> List[Task]:
+    if not batch:
+        return [
+            DeployContractTask(
+                lock_file, profile, contract, deployment, ledger,
+                LocalWallet(keys[deployment.deployer_key]), sequences, uploads, salts.get(deployment.name), journal,
+                code_ids,
+            )
+            for (deployment, contract) in prepared
+        ]
+
+    # deployments that share a key are stored and instantiated together
+    batches = {}  # type: Dict[str, List[BatchDeployment]]
+    for (deployment, contract) in prepared:
+        batches.setdefault(deployment.deployer_key, []).append(
+            BatchDeployment(deployment, contract, salt=salts.get(deployment.name))
+        )
+
+    return [
+        DeployBatchTask(
+            lock_file, profile, batch_deployments, ledger, LocalWallet(keys[key_name]), sequences, uploads,
+            journal, code_ids,
+        )
+        for (key_name, batch_deployments) in batches.items()
+    ]
+
+
+def _override_deployer_key(profile: Profile, deployer_key: Optional[str], editor: Optional[ProjectEditor]):
+    if deployer_key is None:
+        return
+
+    for (deployment_name, deployment) in profile.deployments.items():
+        deployment.deployer_key = deployer_key
+        if editor is not None:
+            editor.set_deployer_key(profile.name, deployment_name, deployer_key)
+
+
+def plan_deployment(cfg: Config, project_path: str, deployer_key: Optional[str], profile_name: Optional[str] = None,
+                    batch: bool = False, key_pool: Optional[List[str]] = None) -> DeploymentPlan:
+    """
+    Computes and prints the deployments that would be carried out by deploying a profile, without
+    deploying anything
+
+    :param cfg: The project configuration
+    :param project_path: The path to the project
+    :param deployer_key: Optional key to deploy all the contracts with
+    :param profile_name: The profile to deploy. If None then the default profile is planned
+    :param batch: Whether the transactions are estimated for a batch deployment
+    :param key_pool: Optional keys to spread the new deployments across. Their balances are not checked,
+                     since the plan is made offline
+    :return: The deployment plan
+    """
     if profile_name is None:
         profile_name = cfg.get_default_profile()
 
     profile = cfg.profiles[profile_name]
+    _override_deployer_key(profile, deployer_key, None)
+
+    # only the local records of the stored binaries are consulted, so the plan can be made offline
+    chain_id = profile.network.chain_id
+    uploads = load_code_uploads(cfg, profile)
+    index = CodeIdIndex.for_project(project_path, chain_id)
+
+    def is_stored(digest: str) -> bool:
+        return uploads.lookup(chain_id, digest) is not None or index.lookup(digest) is not None
+
+    digests = DigestCache.load(project_path)
+    project_contracts = {contract.name: contract for contract in detect_contracts(project_path, digests)}
+    plan = compute_deployment_plan(profile, project_contracts, is_stored=is_stored)
+    digests.save()
+
+    # the keys are only assigned in memory, the project file is left as it is
+    assigned = {}
+    if key_pool:
+        assigned = assign_deployer_keys(plan, key_pool)
+        for (deployment_name, key_name) in assigned.items():
+            profile.deployments[deployment_name].deployer_key = key_name
+
+    print(plan.format(profile, batch))
+    if len(assigned) > 0:
+        print(f"Deployer keys: {', '.join(f'{name} -> {key}' for (name, key) in assigned.items())}")
+    return plan
+
+
+def _funded_keys(client: LedgerClient, key_pool: List[str], keys: Dict[str, PrivateKey]) -> List[str]:
+    funded = []
+    denom = client.network_config.fee_denomination
+    for key_name in key_pool:
+        if key_name not in keys:
+            continue
 
-    project_contracts = {contract.name: contract for contract in detect_contracts(project_path)}
-    deployments = profile.deployments
-
-    init_addresses = {}
-
-    # iterate over the addresses to insert
-    for (name, deployment) in deployments.items():
-        init_data = deployment.init
-        deployment_names = list(deployments.keys())
-
-        # retreive init addresses for each contract
-        contract_init_addresses = retreive_init_addresses(init_data, deployment_names, [])
+        address = LocalWallet(keys[key_name]).address()
+        if client.query_bank_balance(address, denom) <= 0:
+            print(f"Key {key_name} has no {denom} to pay fees with, it will not be used")
+            continue
+        funded.append(key_name)
+    return funded
+
+
+def _plan_with_key_pool(profile: Profile, contracts: Dict[str, Contract], client: LedgerClient,
+                        keys: Dict[str, PrivateKey], key_pool: List[str],
+                        editor: ProjectEditor) -> Optional[DeploymentPlan]:
+    pool = _funded_keys(client, key_pool, keys)
+    if len(pool) == 0:
+        print("Skipping all deployments: none of the keys in the pool are available and funded")
+        return None
+
+    # the keys are assigned before any addresses are predicted, since they depend on the deployer
+    plan = compute_deployment_plan(profile, contracts)
+    for (deployment_name, key_name) in assign_deployer_keys(plan, pool).items():
+        profile.deployments[deployment_name].deployer_key = key_name
+        editor.set_deployer_key(profile.name, deployment_name, key_name)
+
+    return compute_deployment_plan(profile, contracts, available_keys=set(keys))
+
+
+def _plan_profile(
+    profile: Profile,
+    contracts: Dict[str, Contract],
+    client: LedgerClient,
+    keys: Dict[str, PrivateKey],
+    deployer_key: Optional[str],
+    key_pool: Optional[List[str]],
+    editor: ProjectEditor,
+) -> Optional[DeploymentPlan]:
+    if deployer_key is not None and deployer_key not in keys:
+        print(f"Skipping all deployments: deployer key {deployer_key} not available")
+        return None
+    _override_deployer_key(profile, deployer_key, editor)
+
+    if key_pool:
+        return _plan_with_key_pool(profile, contracts, client, keys, key_pool, editor)
+    return compute_deployment_plan(profile, contracts, available_keys=set(keys))
+
+
+def _recover_deployment(journal: DeployJournal, cfg: Config, profile: Profile, network: "_NetworkResources",
+                        project_path: str, resume: bool) -> bool:
+    pending = journal.pending(profile.name)
+    if len(pending) == 0:
+        return True
+
+    if not resume:
+        print(f"A previous deployment of profile {profile.name} was interrupted before the outcome of "
+              f"{len(pending)} transaction(s) was known")
+        print("Run 'jenesis deploy --resume' to recover its results before deploying again")
+        return False
+
+    recovered = reconcile_journal(journal, cfg, profile, network.client, project_path, code_ids=network.code_ids)
+    print(f"Recovered {recovered} deployment(s) from the interrupted deployment of profile {profile.name}")
+
+    # sending the deployments again while their transactions may still be included would pay for them twice
+    unresolved = journal.pending(profile.name)
+    if len(unresolved) > 0:
+        print(f"{len(unresolved)} transaction(s) of the interrupted deployment of profile {profile.name} are "
+              f"still pending, run 'jenesis deploy --resume' again once they have been included or have expired")
+        return False
+    return True
+
+
+class _NetworkResources:  # pylint: disable=too-few-public-methods
+    """
+    The client, account sequences, code uploads and code id index of a network, shared by all the profiles that
+    deploy to it
+    """
+
+    def __init__(self, cfg: Config, profile: Profile, project_path: str):
+        self.client = LedgerClient(profile.network)
+        self.sequences = SequenceManager(self.client, max_tx_bytes=profile.max_tx_bytes)
+        self.uploads = load_code_uploads(cfg, profile)
+        self.code_ids = CodeIdIndex.for_project(project_path, profile.network.chain_id)
+
+
+class _ProfileDeployment:
+    """
+    Walks the dependency graph of the deployments of a single profile, so that every deployment is started as
+    soon as its dependencies are deployed. The deployments of several profiles can run side by side
+    """
+
+    def __init__(self, cfg: Config, lock_file: LockFileWriter, profile: Profile, contracts: Dict[str, Contract],
+                 keys: Dict[str, PrivateKey], plan: DeploymentPlan, network: _NetworkResources,
+                 journal: DeployJournal, batch: bool, show_profile: bool = False):
+        self._cfg = cfg
+        self._lock_file = lock_file
+        self._profile = profile
+        self._contracts = contracts
+        self._keys = keys
+        self._plan = plan
+        self._network = network
+        self._journal = journal
+        self._batch = batch
+        self._show_profile = show_profile
+
+        self._sorter = _create_deployment_sorter(profile, plan.init_addresses)
+        self._started = set()  # type: Set[str]
+        self._tasks = set()  # type: Set[Task]
+        self._predicted_salts = {}  # type: Dict[str, bytes]
+        self._predicted_addresses = {}  # type: Dict[str, Address]
+        self.ledger = None  # type: Optional[AsyncLedger]
 
-        # add all contract init addresses in one dictionary
-        init_addresses[name] = set(contract_init_addresses)
+    @property
+    def client(self) -> LedgerClient:
+        return self._network.client
+
+    def owns(self, task: Task) -> bool:
+        return task in self._tasks
+
+    def ready_tasks(self) -> List[Task]:
+        prepared = []
+
+        # deployments that are skipped as up to date immediately release their dependents
+        ready = self._sorter.get_ready()
+        while len(ready) > 0:
+            for deployment_name in ready:
+                self._started.add(deployment_name)
+                contract = self._prepare(deployment_name)
+                if contract is not None:
+                    prepared.append((self._profile.deployments[deployment_name], contract))
+            ready = self._sorter.get_ready()
+
+        resolved = _resolve_init_addresses(self._cfg, self._profile, prepared, self._plan.init_addresses, self._keys,
+                                           self._predicted_salts, self._predicted_addresses)
+
+        tasks = _create_deploy_tasks(
+            resolved, self._batch, self._lock_file, self._profile, self.ledger, self._keys,
+            self._network.sequences, self._network.uploads, self._network.code_ids, self._predicted_salts,
+            self._journal,
+        )
+        self._tasks.update(tasks)
+        return tasks
+
+    def on_complete(self, task: Task) -> List[Task]:
+        for deployment_name in task.deployment_names:
+            self._sorter.done(deployment_name)
+        return self.ready_tasks()
+
+    def finish(self, failed_tasks: List[Task]):
+        # the results of the transactions of failed deployments are not recorded, only the transactions whose
+        # outcome is unknown are kept
+        for task in failed_tasks:
+            if self.owns(task):
+                self._journal.resolve(task.included_tx_hashes)
+        self._journal.prune()
+
+        for deployment_name in self._profile.deployments:
+            if deployment_name not in self._started:
+                self._skip(deployment_name, "not all of its dependencies were deployed")
+
+    def _prepare(self, deployment_name: str) -> Optional[Contract]:
+        deployment = self._profile.deployments[deployment_name]
+        plan = self._plan
+
+        if deployment_name in plan.blocked:
+            self._skip(deployment_name, plan.blocked[deployment_name])
+            return None
+
+        if deployment_name not in plan.planned:
+            if deployment_name in plan.kept:
+                self._skip(deployment_name, f"binary has not changed, so it can not be migrated "
+                                            f"({plan.kept[deployment_name]})")
+            else:
+                self._skip(deployment_name, "configuration is up to date")
+                # record the checksum of the init message with the addresses inserted, like a deployed one
+                resolve_init(deployment, self._profile, plan.init_addresses)
+                self._lock_file.mark_dirty(self._profile.name)
+            self._sorter.done(deployment_name)
+            return None
+
+        # a migrated contract keeps its address, so its dependents do not need to be redeployed
+        if plan.planned[deployment_name].action != PLAN_MIGRATE:
+            deployment.address = None  # clear the old address
+
+        return self._contracts[deployment.contract]
+
+    def _skip(self, deployment_name: str, reason: str):
+        if self._show_profile:
+            deployment_name = f"{self._profile.name}.{deployment_name}"
+        print(f"Skipping {deployment_name}: {reason}")
+
+
+def deploy_contracts(cfg: Config, project_path: str, deployer_key: Optional[str], profile_name: Optional[str] = None,
+                     batch: bool = False, resume: bool = False, key_pool: Optional[List[str]] = None):
+    """
+    Deploys all the contracts of a profile that have changed, along with the contracts that refer to
+    the contracts that are replaced
+
+    :param cfg: The project configuration
+    :param project_path: The path to the project
+    :param deployer_key: Optional key to deploy all the contracts with
+    :param profile_name: The profile to deploy. If None then the default profile is deployed
+    :param batch: Whether to store and instantiate the contracts that are ready at the same time (and share a
+                  deployer key) together in a single transaction each
+    :param resume: Whether to recover the results of an interrupted deployment from the chain before deploying
+    :param key_pool: Optional keys to spread the new deployments across, so that the ones that are ready at
+                     the same time are sent from different accounts
+    :return:
+    """
+    if profile_name is None:
+        profile_name = cfg.get_default_profile()
 
-    # sort the contracts to be deployed in the right order
-    sorter = gl.TopologicalSorter(init_addresses)
-    deployment_order = list(sorter.static_order())
+    deploy_profiles(cfg, project_path, deployer_key, [profile_name], batch=batch, resume=resume, key_pool=key_pool)
+
+
+def deploy_profiles(cfg: Config, project_path: str, deployer_key: Optional[str], profile_names: List[str],
+                    batch: bool = False, resume: bool = False, key_pool: Optional[List[str]] = None):
+    """
+    Deploys several profiles at the same time. The contracts, their digests and the keys are only loaded once,
+    and the profiles that deploy to the same network share its client, account sequences and code uploads
+
+    :param cfg: The project configuration
+    :param project_path: The path to the project
+    :param deployer_key: Optional key to deploy all the contracts with
+    :param profile_names: The profiles to deploy
+    :param batch: Whether to deploy the contracts that are ready at the same time together
+    :param resume: Whether to recover the results of interrupted deployments from the chain before deploying
+    :param key_pool: Optional keys to spread the new deployments across
+    :return:
+    """
+    digests = DigestCache.load(project_path)
+    project_contracts = {contract.name: contract for contract in detect_contracts(project_path, digests)}
+    journal = DeployJournal.load(project_path)
+    lock_file = LockFileWriter(cfg, project_path)
 
     # load all the keys required for this operation
-    key_names = {deployment.deployer_key for deployment in deployments.values()} | {deployer_key}
+    key_names = set(key_pool or [])
+    for profile_name in profile_names:
+        key_names.update(deployment.deployer_key for deployment in cfg.profiles[profile_name].deployments.values())
+    if deployer_key is not None:
+        key_names.add(deployer_key)
     keys = load_keys(key_names, cfg)
 
-    for deployment_name in deployment_order:
-        deployment = deployments[deployment_name]
-
-        # ensure specified contract is in project
-        if deployment.contract not in project_contracts:
-            print(f"Contract {deployment_name} not found in project")
-            continue
-        contract = project_contracts[deployment.contract]
-
-        # ensure that contract has been compiled first
-        if not os.path.isfile(contract.binary_path):
-            print(f"No contract binary found for {contract.name}. Please run 'jenesis compile' first.")
-            continue
-
-        if deployer_key is not None:
+    networks = {}  # type: Dict[str, _NetworkResources]
+    sessions = []  # type: List[_ProfileDeployment]
 
-            if deployer_key not in keys:
-                print(f"Skipping {deployment_name}: deployer key {deployer_key} not available")
-                continue
-
-            deployment.deployer_key = deployer_key
-            Config.update_key(os.getcwd(), profile_name, deployment_name, deployer_key)
+    # the deployer keys assigned to the deployments of all the profiles are written to the project file at once
+    with edit_project(project_path) as editor:
+        for profile_name in profile_names:
+            profile = cfg.profiles[profile_name]
+            if profile.network.url not in networks:
+                networks[profile.network.url] = _NetworkResources(cfg, profile, project_path)
+            network = networks[profile.network.url]
 
-        if deployment.address is not None:
-            if not deployment.is_configuration_out_of_date():
-                print(f"Skipping {deployment_name}: configuration is up to date")
+            # transactions recorded by an interrupted deployment may have been executed after it stopped
+            if not _recover_deployment(journal, cfg, profile, network, project_path, resume):
                 continue
 
-            if contract.digest() == deployment.digest:
-                print(f"Skipping {deployment_name}: digest has not changed")
+            # determine the deployments that have changed and the ones that depend on them
+            plan = _plan_profile(profile, project_contracts, network.client, keys, deployer_key, key_pool, editor)
+            if plan is None:
                 continue
 
-        client = LedgerClient(profile.network)
+            sessions.append(_ProfileDeployment(cfg, lock_file, profile, project_contracts, keys, plan, network,
+                                               journal, batch, show_profile=len(profile_names) > 1))
 
-        deployment.address = None  # clear the old address
+    # the binaries have all been hashed while planning
+    digests.save()
 
-        contract_address_names = list(init_addresses[deployment_name])
+    def on_complete(task: Task) -> List[Task]:
+        session = next(session for session in sessions if session.owns(task))
+        return session.on_complete(task)
 
-        deployment.init = insert_address(contract_address_names, deployment, profile)
+    def on_wave_complete(_: List[Task]):
+        # the journal entries of the completed deployments are only removed once their results are on disk
+        lock_file.flush()
+        journal.prune()
 
-        # lookup the wallet key
-        wallet = LocalWallet(keys[deployment.deployer_key])
+    # run all the deployments on a single event loop, each one being queued as soon as its dependencies are
+    # deployed. The deployments to each network share one async channel to wait for their transactions. The
+    # lock file is written once for each wave of deployments that complete together (and on the way out)
+    with lock_file, AsyncRuntime() as runtime:
+        ledgers = AsyncLedgerPool(runtime)
+        for session in sessions:
+            session.ledger = ledgers.get(session.client)
 
-        # create the deployment task
-        task = DeployContractTask(
-            project_path,
-            cfg,
-            profile,
-            contract,
-            deployment,
-            client,
-            wallet,
-        )
+        tasks = [task for session in sessions for task in session.ready_tasks()]
+        (_, failed_tasks) = run_tasks(tasks, on_complete=on_complete, on_wave_complete=on_wave_complete)
 
-        # run the deployment task
-        run_tasks([task])
+    for session in sessions:
+        session.finish(failed_tasks)
@@ -3,6 +3,7 @@ from typing import List, Optional
 
 import toml
 
+from jenesis.cache.digest import DigestCache
 from jenesis.contracts import Contract
 from jenesis.contracts.schema import load_contract_schema
 
@@ -23,7 +24,7 @@ def is_workspace(path: str) -> bool:
     return True
 
 
-def parse_contract(path: str, name: str) -> Contract:
+def parse_contract(path: str, name: str, digests: Optional[DigestCache] = None) -> Contract:
     contracts_folder = os.path.join(path, 'contracts')
     cargo_file_path = os.path.join(contracts_folder, name, 'Cargo.toml')
     with open(cargo_file_path, 'r', encoding="utf-8") as cargo_file:
@@ -48,10 +49,11 @@ def parse_contract(path: str, name: str) -> Contract:
         binary_path=binary_path,
         cargo_root=cargo_root,
         schema=schema,
+        digests=digests,
     )
 
 
-def detect_contracts(path: str) -> Optional[List[Contract]]:
+def detect_contracts(path: str, digests: Optional[DigestCache] = None) -> Optional[List[Contract]]:
     contracts_folder = os.path.join(path, 'contracts')
     if not os.path.isdir(contracts_folder):
         return None
@@ -79,6 +81,7 @@ def detect_contracts(path: str) -> Optional[List[Contract]]:
         parse_contract,
         [path] * len(contract_list),
         contract_list,
+        [digests] * len(contract_list),
     )
 
     return list(contracts)
@@ -0,0 +1,231 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import grpc
+from cosmpy.aerial.client import Account, LedgerClient
+from cosmpy.aerial.contract import _generate_label
+from cosmpy.aerial.contract.cosmwasm import (create_cosmwasm_instantiate_msg, create_cosmwasm_migrate_msg,
+                                             create_cosmwasm_store_code_msg)
+from cosmpy.aerial.tx import SigningCfg, Transaction
+from cosmpy.aerial.wallet import LocalWallet, Wallet
+from jsonschema import ValidationError, validate as validate_schema
+from jenesis.cache.code_ids import CodeIdIndex
+from jenesis.cache.digest import DigestCache
+from jenesis.config import Config, Deployment, Profile
+from jenesis.contracts import Contract
+from jenesis.contracts.deploy import load_code_uploads, load_keys, predict_deployment_addresses
+from jenesis.contracts.detect import detect_contracts
+from jenesis.contracts.instantiate2 import create_instantiate2_msg
+from jenesis.contracts.plan import PLAN_MIGRATE, DeploymentPlan, compute_deployment_plan, insert_address
+
+MAX_PARALLEL_SIMULATIONS = 8
+
+
+@dataclass
+class SimulatedDeployment:
+    name: str
+    action: str
+    store_gas: int = 0  # zero when the binary is already on chain (or stored by an earlier deployment)
+    deploy_gas: int = 0  # the gas of the instantiation or migration
+    error: Optional[str] = None
+
+    @property
+    def gas(self) -> int:
+        return self.store_gas + self.deploy_gas
+
+
+def simulate_gas(client: LedgerClient, transaction: Transaction, sender: Wallet, account: Account) -> int:
+    """
+    Estimates the gas of a transaction by simulating it, in the same way as when it is broadcast
+
+    :param client: The ledger client
+    :param transaction: The transaction (with all of its messages added)
+    :param sender: The wallet the transaction would be sent from
+    :param account: The account of the sender
+    :return: The estimated gas limit
+    """
+    transaction.seal(SigningCfg.direct(sender.public_key(), account.sequence), fee="", gas_limit=0)
+    transaction.sign(sender.signer(), client.network_config.chain_id, account.number)
+    transaction.complete()
+    return client.estimate_gas_for_tx(transaction)
+
+
+class _DeploymentSimulator:  # pylint: disable=too-few-public-methods
+    def __init__(self, client: LedgerClient, plan: DeploymentPlan, contracts: Dict[str, Contract],
+                 wallets: Dict[str, Wallet], code_ids: Dict[str, int], next_code_id: int):
+        self._client = client
+        self._plan = plan
+        self._contracts = contracts
+        self._wallets = wallets
+        self._code_ids = code_ids
+        self._next_code_id = next_code_id
+        self._accounts = {
+            key_name: client.query_account(wallet.address()) for (key_name, wallet) in wallets.items()
+        }
+
+    def simulate(self, deployment: Deployment, salt: Optional[bytes]) -> SimulatedDeployment:
+        planned = self._plan.planned[deployment.name]
+        result = SimulatedDeployment(deployment.name, planned.action)
+
+        contract = self._contracts[deployment.contract]
+        wallet = self._wallets[deployment.deployer_key]
+        account = self._accounts[deployment.deployer_key]
+
+        try:
+            deploy_msg = self._create_deploy_msg(deployment, contract, wallet, planned.digest, salt)
+
+            # binaries that are not on chain yet are stored ahead of the deployment in the same simulation
+            code_id = self._code_ids.get(planned.digest)
+            if code_id is None:
+                store_tx = Transaction()
+                store_tx.add_message(create_cosmwasm_store_code_msg(contract.binary_path, wallet.address()))
+                result.store_gas = simulate_gas(self._client, store_tx, wallet, account)
+
+            deploy_tx = Transaction()
+            if code_id is None:
+                deploy_tx.add_message(create_cosmwasm_store_code_msg(contract.binary_path, wallet.address()))
+            deploy_tx.add_message(deploy_msg)
+            result.deploy_gas = max(simulate_gas(self._client, deploy_tx, wallet, account) - result.store_gas, 0)
+        except ValidationError as ex:
+            result.error = f"invalid message: {ex.message}"
+        except (grpc.RpcError, RuntimeError) as ex:
+            result.error = f"simulation failed: {ex}"
+
+        return result
+
+    def _create_deploy_msg(self, deployment: Deployment, contract: Contract, wallet: Wallet, digest: str,
+                           salt: Optional[bytes]) -> Any:
+        code_id = self._code_ids.get(digest, self._next_code_id)
+
+        if self._plan.planned[deployment.name].action == PLAN_MIGRATE:
+            migrate_args = deployment.migrate or {}
+            if contract.migrate_schema:
+                validate_schema(migrate_args, contract.migrate_schema)
+            return create_cosmwasm_migrate_msg(code_id, migrate_args, deployment.address, wallet.address())
+
+        if contract.instantiate_schema:
+            validate_schema(deployment.init, contract.instantiate_schema)
+
+        label = _generate_label(bytes.fromhex(digest))
+        if salt is not None:
+            return create_instantiate2_msg(
+                code_id, deployment.init, label, wallet.address(), salt,
+                admin_address=wallet.address(), funds=deployment.init_funds,
+            )
+        return create_cosmwasm_instantiate_msg(
+            code_id, deployment.init, label, wallet.address(),
+            admin_address=wallet.address(), funds=deployment.init_funds,
+        )
+
+
+def _placeholder_addresses(profile: Profile, plan: DeploymentPlan, wallets: Dict[str, Wallet]) -> Dict[str, str]:
+    # contracts that would be replaced do not have an address yet, so their current address (or that of
+    # their deployer) stands in for it
+    addresses = {}
+    for name in plan.order:
+        deployment = profile.deployments[name]
+        address = deployment.address or wallets[deployment.deployer_key].address()
+        addresses[name] = str(address)
+    return addresses
+
+
+def _format_report(client: LedgerClient, plan: DeploymentPlan, results: List[SimulatedDeployment]) -> str:
+    lines = [f"Dry run for profile {plan.profile_name} (nothing has been broadcast):"]
+
+    width = max([len(result.name) for result in results] + [0])
+    for (index, result) in enumerate(results):
+        if result.error is not None:
+            lines.append(f"  {index + 1}. {result.name:<{width}}  {result.action:<11}  FAILED: {result.error}")
+            continue
+        lines.append(
+            f"  {index + 1}. {result.name:<{width}}  {result.action:<11}  store gas {result.store_gas:>9}  "
+            f"{result.action} gas {result.deploy_gas:>9}  fee {client.estimate_fee_from_gas(result.gas)}"
+        )
+
+    for (name, reason) in plan.blocked.items():
+        lines.append(f"  {name}: blocked ({reason})")
+
+    total_gas = sum(result.gas for result in results if result.error is None)
+    lines.append(f"Total gas: {total_gas}, total fees: {client.estimate_fee_from_gas(total_gas)}")
+
+    failed = [result.name for result in results if result.error is not None]
+    if len(failed) > 0:
+        lines.append(f"{len(failed)} deployment(s) failed to simulate: {', '.join(failed)}")
+    return "\n".join(lines)
+
+
+def dry_run_deployment(cfg: Config, project_path: str, deployer_key: Optional[str],
+                       profile_name: Optional[str] = None) -> List[SimulatedDeployment]:
+    """
+    Validates and simulates all the deployments of a profile that would be carried out, reporting the gas
+    and fees of each one in execution order. No transactions are broadcast and the project is not modified
+
+    :param cfg: The project configuration
+    :param project_path: The path to the project
+    :param deployer_key: Optional key to deploy all the contracts with
+    :param profile_name: The profile to simulate. If None then the default profile is simulated
+    :return: The simulated deployments in execution order
+    """
+    if profile_name is None:
+        profile_name = cfg.get_default_profile()
+
+    # the deployments are modified while simulating them, so the configuration is left untouched
+    profile = copy.deepcopy(cfg.profiles[profile_name])
+    deployments = profile.deployments
+    if deployer_key is not None:
+        for deployment in deployments.values():
+            deployment.deployer_key = deployer_key
+
+    keys = load_keys({deployment.deployer_key for deployment in deployments.values()}, cfg)
+    wallets = {key_name: LocalWallet(key) for (key_name, key) in keys.items()}
+
+    digests = DigestCache.load(project_path)
+    contracts = {contract.name: contract for contract in detect_contracts(project_path, digests)}
+    plan = compute_deployment_plan(profile, contracts, available_keys=set(keys))
+    digests.save()
+
+    client = LedgerClient(profile.network)
+    chain_id = profile.network.chain_id
+
+    # the binaries that are not on chain yet are simulated as the next code to be stored
+    index = CodeIdIndex.for_project(project_path, chain_id)
+    index.sync(client)
+    uploads = load_code_uploads(cfg, profile)
+    code_ids = {}
+    for name in plan.order:
+        digest = plan.planned[name].digest
+        code_id = uploads.lookup(chain_id, digest) or index.lookup(digest)
+        if code_id is not None:
+            code_ids[digest] = code_id
+
+    prepared = [(deployments[name], contracts[deployments[name].contract]) for name in plan.order]
+    salts, addresses = {}, {}
+    if profile.predictable_addresses:
+        salts, addresses = predict_deployment_addresses(cfg, profile, prepared, keys, plan.init_addresses)
+    placeholders = _placeholder_addresses(profile, plan, wallets)
+    placeholders.update({name: str(address) for (name, address) in addresses.items()})
+    for (deployment, _) in prepared:
+        if deployment.init is not None:
+            deployment.init = insert_address(list(plan.init_addresses[deployment.name]), deployment, profile,
+                                             placeholders)
+
+    # none of the simulations depend on each other, so they are all run at the same time
+    simulator = _DeploymentSimulator(client, plan, contracts, wallets, code_ids, index.last_code_id + 1)
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_SIMULATIONS) as executor:
+        results = list(executor.map(
+            lambda item: simulator.simulate(item[0], salts.get(item[0].name)), prepared
+        ))
+
+    # every unique binary is only stored once
+    stored = set()
+    for result in results:
+        digest = plan.planned[result.name].digest
+        if digest in stored:
+            result.store_gas = 0
+        elif result.store_gas > 0:
+            stored.add(digest)
+
+    print(_format_report(client, plan, results))
+    return results
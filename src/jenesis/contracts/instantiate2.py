@@ -0,0 +1,173 @@
+import functools
+import hashlib
+import json
+import struct
+from typing import Any, Dict, Optional
+
+import bech32
+import grpc
+from cosmpy.aerial.client import LedgerClient
+from cosmpy.aerial.coins import parse_coins
+from cosmpy.common.utils import json_encode
+from cosmpy.crypto.address import Address
+from cosmpy.protos.cosmos.base.v1beta1 import coin_pb2
+from cosmpy.protos.cosmwasm.wasm.v1.query_pb2 import QueryContractInfoRequest
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+INSTANTIATE2_MSG_NAME = "cosmwasm.wasm.v1.MsgInstantiateContract2"
+WASM_MODULE_NAME = b"wasm"
+
+
+def _length_prefixed(value: bytes) -> bytes:
+    return struct.pack(">Q", len(value)) + value
+
+
+@functools.lru_cache(maxsize=None)
+def _instantiate2_msg_class():
+    # the version of cosmpy in use does not ship the instantiate2 message, so it is defined here from
+    # its wire format in the wasm module (cosmwasm/wasm/v1/tx.proto)
+    # pylint: disable=no-member
+    pool = descriptor_pool.Default()
+    try:
+        return message_factory.GetMessageClass(pool.FindMessageTypeByName(INSTANTIATE2_MSG_NAME))
+    except KeyError:
+        pass
+
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name="jenesis/cosmwasm/wasm/v1/instantiate2.proto",
+        package="cosmwasm.wasm.v1",
+        dependency=[coin_pb2.DESCRIPTOR.name],
+        syntax="proto3",
+    )
+    msg_proto = file_proto.message_type.add(name="MsgInstantiateContract2")
+
+    field = descriptor_pb2.FieldDescriptorProto
+    fields = [
+        ("sender", 1, field.TYPE_STRING, field.LABEL_OPTIONAL, None),
+        ("admin", 2, field.TYPE_STRING, field.LABEL_OPTIONAL, None),
+        ("code_id", 3, field.TYPE_UINT64, field.LABEL_OPTIONAL, None),
+        ("label", 4, field.TYPE_STRING, field.LABEL_OPTIONAL, None),
+        ("msg", 5, field.TYPE_BYTES, field.LABEL_OPTIONAL, None),
+        ("funds", 6, field.TYPE_MESSAGE, field.LABEL_REPEATED, ".cosmos.base.v1beta1.Coin"),
+        ("salt", 7, field.TYPE_BYTES, field.LABEL_OPTIONAL, None),
+        ("fix_msg", 8, field.TYPE_BOOL, field.LABEL_OPTIONAL, None),
+    ]
+    for (name, number, field_type, label, type_name) in fields:
+        msg_field = msg_proto.field.add(name=name, number=number, type=field_type, label=label)
+        if type_name is not None:
+            msg_field.type_name = type_name
+
+    pool.Add(file_proto)
+    return message_factory.GetMessageClass(pool.FindMessageTypeByName(INSTANTIATE2_MSG_NAME))
+
+
+def compute_salt(project_name: str, profile_name: str, deployment_name: str, init: Any,
+                 init_funds: Optional[str], dependencies: Optional[Dict[str, str]] = None) -> bytes:
+    """
+    Computes the deterministic instantiation salt of a deployment. The init message is included
+    (before any contract addresses are inserted) so that changing the configuration of a deployment
+    results in a new address rather than a collision with the previous instance. Likewise the
+    dependencies are included, so that redeploying a dependency also moves its dependents
+
+    :param project_name: The name of the project
+    :param profile_name: The name of the profile
+    :param deployment_name: The name of the deployment
+    :param init: The init message of the deployment
+    :param init_funds: The funds sent with the instantiation
+    :param dependencies: The address (or identity) of each deployment referenced by the deployment
+    :return: The salt
+    """
+    contents = {
+        "project": project_name,
+        "profile": profile_name,
+        "deployment": deployment_name,
+        "init": init,
+        "init_funds": init_funds,
+    }
+    if dependencies:
+        contents["dependencies"] = dependencies
+
+    canonical = json.dumps(contents, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).digest()
+
+
+def predict_address(checksum: bytes, creator: Address, salt: bytes) -> Address:
+    """
+    Computes the address that a contract instantiated with instantiate2 will have (without the init
+    message being fixed into the address)
+
+    :param checksum: The sha256 digest of the contract binary
+    :param creator: The address of the account instantiating the contract
+    :param salt: The instantiation salt
+    :return: The contract address, using the same prefix as the creator
+    """
+    prefix, _ = bech32.bech32_decode(str(creator))
+    if prefix is None:
+        raise RuntimeError(f"Unable to parse creator address {creator}")
+
+    key = (
+        WASM_MODULE_NAME + b"\x00"
+        + _length_prefixed(bytes(checksum))
+        + _length_prefixed(bytes(creator))
+        + _length_prefixed(bytes(salt))
+        + _length_prefixed(b"")
+    )
+    address = hashlib.sha256(hashlib.sha256(b"module").digest() + key).digest()
+
+    return Address(bech32.bech32_encode(prefix, bech32.convertbits(address, 8, 5, True)))
+
+
+def create_instantiate2_msg(
+    code_id: int,
+    args: Any,
+    label: str,
+    sender_address: Address,
+    salt: bytes,
+    funds: Optional[str] = None,
+    admin_address: Optional[Address] = None,
+) -> Any:
+    """
+    Creates an instantiate2 message, which instantiates a contract at a predictable address
+
+    :param code_id: The code id
+    :param args: The init message
+    :param label: The contract label
+    :param sender_address: The address of the sender
+    :param salt: The instantiation salt
+    :param funds: The funds to send with the instantiation
+    :param admin_address: The admin of the contract
+    :return: The instantiate2 message
+    """
+    msg = _instantiate2_msg_class()(
+        sender=str(sender_address),
+        code_id=code_id,
+        msg=json_encode(args).encode("UTF8"),
+        label=label,
+        salt=salt,
+        fix_msg=False,
+    )
+
+    if funds is not None:
+        msg.funds.extend(parse_coins(funds))
+    if admin_address is not None:
+        msg.admin = str(admin_address)
+
+    return msg
+
+
+def is_instantiated(client: LedgerClient, address: Address) -> bool:
+    """
+    Checks whether a contract has already been instantiated at an address
+
+    :param client: The ledger client
+    :param address: The contract address
+    :return: True if the contract exists, otherwise False
+    """
+    try:
+        client.wasm.ContractInfo(QueryContractInfoRequest(address=str(address)))
+    except (grpc.RpcError, RuntimeError) as ex:
+        # pylint: disable=no-member
+        if hasattr(ex, 'details') and 'not found' in (ex.details() or '') or 'not found' in str(ex):
+            return False
+        raise
+    return True
@@ -0,0 +1,360 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from cosmpy.aerial.client import LedgerClient
+from cosmpy.aerial.exceptions import BroadcastError, NotFoundError
+from cosmpy.aerial.tx import Transaction
+from cosmpy.aerial.tx_helpers import SubmittedTx, TxResponse
+from cosmpy.aerial.wallet import Wallet
+from cosmpy.crypto.address import Address
+from jenesis.cache import state_path
+from jenesis.cache.code_ids import CodeIdIndex
+from jenesis.config import Config, Profile
+from jenesis.contracts.sequence import SequenceManager
+from jenesis.network.aio import DEFAULT_TX_POLL_PERIOD_SECS, DEFAULT_TX_TIMEOUT_SECS
+
+DEPLOY_JOURNAL_FILENAME = "deploy-journal.jsonl"
+
+# the kind of each message that is recorded in the journal, by message type
+JOURNAL_MESSAGE_KINDS = {
+    "MsgStoreCode": "store",
+    "MsgInstantiateContract": "instantiate",
+    "MsgInstantiateContract2": "instantiate",
+    "MsgMigrateContract": "migrate",
+}
+
+JournalTarget = Tuple[str, Optional[str]]  # the deployment name and the digest of its contract
+
+
+def compute_tx_hash(transaction: Transaction) -> str:
+    return hashlib.sha256(transaction.tx.SerializeToString()).hexdigest().upper()
+
+
+class DeployJournal:
+    """
+    Write-ahead journal of the transactions sent while deploying. Each transaction is recorded along with
+    what it is meant to do before it is broadcast, so that the results of a deployment that is interrupted
+    after broadcasting can be recovered from the chain rather than being paid for again
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._entries = []  # type: List[Dict[str, Any]]
+        self._resolved = set()  # type: Set[str]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, project_path: str) -> "DeployJournal":
+        journal = cls(state_path(project_path, DEPLOY_JOURNAL_FILENAME))
+
+        if os.path.isfile(journal._path):
+            with open(journal._path, "r", encoding="utf-8") as journal_file:
+                for line in journal_file:
+                    try:
+                        journal._entries.append(json.loads(line))
+                    except ValueError:
+                        # the last entry may have only been partially written
+                        continue
+
+        return journal
+
+    def pending(self, profile_name: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [entry for entry in self._entries if entry.get("profile") == profile_name]
+
+    def record(self, profile_name: str, chain_id: str, transaction: Transaction, targets: List[JournalTarget],
+               sender: Optional[str] = None):
+        """
+        Records a signed transaction that is about to be broadcast
+
+        :param profile_name: The profile being deployed
+        :param chain_id: The chain id
+        :param transaction: The signed transaction
+        :param targets: The deployment (and contract digest) that each message of the transaction is for
+        :param sender: The address of the account that signed the transaction
+        :return:
+        """
+        messages = []
+        for (index, msg) in enumerate(transaction.msgs):
+            (deployment_name, digest) = targets[min(index, len(targets) - 1)]
+            messages.append({
+                "kind": JOURNAL_MESSAGE_KINDS.get(type(msg).__name__, "other"),
+                "deployment": deployment_name,
+                "digest": digest,
+            })
+
+        entry = {
+            "profile": profile_name,
+            "chain_id": chain_id,
+            "tx_hash": compute_tx_hash(transaction),
+            "messages": messages,
+        }
+
+        # used to tell whether a transaction that is not on chain can still be included in a block
+        signer_infos = transaction.tx.auth_info.signer_infos
+        if sender is not None and len(signer_infos) > 0:
+            entry["sender"] = sender
+            entry["sequence"] = int(signer_infos[0].sequence)
+        if transaction.tx.body.timeout_height > 0:
+            entry["timeout_height"] = int(transaction.tx.body.timeout_height)
+
+        with self._lock:
+            self._entries.append(entry)
+            if self._path is None:
+                return
+
+            # the entry must be on disk before the transaction is sent
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            with open(self._path, "a", encoding="utf-8") as journal_file:
+                journal_file.write(json.dumps(entry) + "\n")
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+
+    def clear(self, profile_name: str):
+        with self._lock:
+            self._entries = [entry for entry in self._entries if entry.get("profile") != profile_name]
+            self._rewrite()
+
+    def remove(self, entries: List[Dict[str, Any]]):
+        """
+        Removes the entries of transactions whose outcome is known
+
+        :param entries: The entries to remove
+        :return:
+        """
+        self.discard([entry["tx_hash"] for entry in entries])
+
+    def discard(self, tx_hashes: List[str]):
+        """
+        Removes the entries of transactions that failed or were never accepted by the network, since they have
+        no results to recover
+
+        :param tx_hashes: The hashes of the transactions
+        :return:
+        """
+        tx_hashes = set(tx_hashes)
+        if len(tx_hashes) == 0:
+            return
+
+        with self._lock:
+            self._entries = [entry for entry in self._entries if entry.get("tx_hash") not in tx_hashes]
+            self._rewrite()
+
+    def resolve(self, tx_hashes: List[str]):
+        """
+        Marks transactions that were included in a block and whose results have been recorded. Their entries
+        are removed by the next `prune`, once the results have been written to the lock file
+
+        :param tx_hashes: The hashes of the transactions
+        :return:
+        """
+        with self._lock:
+            self._resolved.update(tx_hashes)
+
+    def prune(self):
+        with self._lock:
+            (tx_hashes, self._resolved) = (list(self._resolved), set())
+        self.discard(tx_hashes)
+
+    def _rewrite(self):
+        if self._path is None:
+            return
+
+        if len(self._entries) == 0:
+            if os.path.isfile(self._path):
+                os.remove(self._path)
+            return
+
+        temp_path = f"{self._path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as journal_file:
+            for entry in self._entries:
+                journal_file.write(json.dumps(entry) + "\n")
+        os.replace(temp_path, self._path)
+
+    def sequences(self, sequences: SequenceManager, profile_name: str, chain_id: str,
+                  targets: List[JournalTarget]) -> "JournalledSequences":
+        return JournalledSequences(self, sequences, profile_name, chain_id, targets)
+
+
+class JournalledSequences:  # pylint: disable=too-few-public-methods
+    """
+    Broadcasts transactions through the shared account sequences, recording each one in the deploy
+    journal before it is sent
+    """
+
+    def __init__(self, journal: DeployJournal, sequences: SequenceManager, profile_name: str, chain_id: str,
+                 targets: List[JournalTarget]):
+        self._journal = journal
+        self._sequences = sequences
+        self._profile_name = profile_name
+        self._chain_id = chain_id
+        self._targets = targets
+
+    def broadcast(self, transaction: Transaction, sender: Wallet, gas_limit: Optional[int] = None,
+                  memo: Optional[str] = None, on_signed: Optional[Callable[[Transaction], None]] = None) -> SubmittedTx:
+        signed = []  # type: List[str]
+
+        def record(signed_tx: Transaction):
+            self._journal.record(self._profile_name, self._chain_id, signed_tx, self._targets,
+                                 sender=str(sender.address()))
+            signed.append(compute_tx_hash(signed_tx))
+            if on_signed is not None:
+                on_signed(signed_tx)
+
+        try:
+            return self._sequences.broadcast(transaction, sender, gas_limit=gas_limit, memo=memo, on_signed=record)
+        except BroadcastError:
+            # the node rejected the transaction, so it can never be included
+            self._journal.discard(signed)
+            raise
+        finally:
+            # the earlier attempts were rejected for using the wrong sequence
+            self._journal.discard(signed[:-1])
+
+
+def _message_result(logs: Dict[int, Any], index: int, event_type: str, attribute: str) -> Optional[str]:
+    log = logs.get(index)
+    if log is None:
+        return None
+    return log.events.get(event_type, {}).get(attribute)
+
+
+def _recover_message(cfg: Config, profile: Profile, message: Dict[str, Any], logs: Dict[int, Any], index: int) -> bool:
+    name = message["deployment"]
+
+    if message["kind"] == "instantiate":
+        address = _message_result(logs, index, "instantiate", "_contract_address")
+        if address is None:
+            return False
+        code_id = _message_result(logs, index, "instantiate", "code_id")
+        cfg.update_deployment(profile.name, name, message["digest"], code_id, address)
+        return True
+
+    if message["kind"] == "migrate":
+        code_id = _message_result(logs, index, "migrate", "code_id")
+        if code_id is None:
+            return False
+        cfg.update_deployment(profile.name, name, message["digest"], code_id, None)
+        return True
+
+    return False
+
+
+def _query_entry(client: LedgerClient, entry: Dict[str, Any]) -> Optional[TxResponse]:
+    try:
+        return client.query_tx(entry["tx_hash"])
+    except NotFoundError:
+        return None
+
+
+def _is_dropped(client: LedgerClient, entry: Dict[str, Any]) -> bool:
+    sender, sequence = entry.get("sender"), entry.get("sequence")
+    if sender is None or sequence is None:
+        # entries written by older versions can not be checked, so they are assumed to have been dropped
+        return True
+
+    # once the sequence of the transaction has been used (by it or another transaction) it can no longer be
+    # included, and neither can it once the chain is past its timeout height
+    if client.query_account(Address(sender)).sequence > sequence:
+        return True
+    timeout_height = entry.get("timeout_height", 0)
+    return 0 < timeout_height < client.query_height()
+
+
+def _reconcile_entry(cfg: Config, profile: Profile, entry: Dict[str, Any], response: TxResponse,
+                     recovered: set) -> bool:
+    stored = False
+    if not response.is_successful():
+        return stored
+
+    logs = {log.index: log for log in response.logs}
+    stored_code_ids = {
+        message["digest"]: _message_result(logs, index, "store_code", "code_id")
+        for (index, message) in enumerate(entry["messages"]) if message["kind"] == "store"
+    }
+
+    for (index, message) in enumerate(entry["messages"]):
+        if message["deployment"] not in profile.deployments:
+            continue
+        if message["kind"] == "store":
+            stored = True
+            continue
+
+        # a contract deployed along with its binary used the wrong code if its code id was mispredicted
+        code_id = _message_result(logs, index, message["kind"], "code_id")
+        if message["digest"] in stored_code_ids and code_id != stored_code_ids[message["digest"]]:
+            continue
+        if _recover_message(cfg, profile, message, logs, index):
+            recovered.add(message["deployment"])
+    return stored
+
+
+def reconcile_journal(journal: DeployJournal, cfg: Config, profile: Profile, client: LedgerClient,
+                      project_path: str, timeout: float = DEFAULT_TX_TIMEOUT_SECS,
+                      poll_period: float = DEFAULT_TX_POLL_PERIOD_SECS,
+                      code_ids: Optional[CodeIdIndex] = None) -> int:
+    """
+    Recovers the results of the transactions of an interrupted deployment from the chain and records them
+    in the lock file, so that the deployment continues where it stopped. Transactions that are not on chain
+    yet are waited for until they are included, their sequence has been used or their timeout height has
+    passed. The entries of the transactions that are still pending after that are kept in the journal
+
+    :param journal: The deploy journal
+    :param cfg: The project configuration
+    :param profile: The profile being deployed
+    :param client: The ledger client
+    :param project_path: The path to the project
+    :param timeout: The max number of seconds to wait for pending transactions
+    :param poll_period: The number of seconds between checks of the pending transactions
+    :param code_ids: The code id index of the chain. If None then the index of the project is loaded
+    :return: The number of deployments that were recovered
+    """
+    recovered = set()
+    stored = False
+    resolved, pending = [], []
+
+    # the transactions sent to a chain the profile no longer uses can not be recovered
+    for entry in journal.pending(profile.name):
+        (pending if entry.get("chain_id") == profile.network.chain_id else resolved).append(entry)
+
+    deadline = time.monotonic() + timeout
+    while True:
+        unresolved = []
+        for entry in pending:
+            response = _query_entry(client, entry)
+
+            # the transaction may have been included since it was last queried
+            if response is None and _is_dropped(client, entry):
+                response = _query_entry(client, entry)
+                if response is None:
+                    # the transaction never made it into a block, so it is simply sent again
+                    resolved.append(entry)
+                    continue
+
+            if response is None:
+                unresolved.append(entry)
+                continue
+
+            stored = _reconcile_entry(cfg, profile, entry, response, recovered) or stored
+            resolved.append(entry)
+
+        pending = unresolved
+        if len(pending) == 0 or time.monotonic() >= deadline:
+            break
+        time.sleep(poll_period)
+
+    # the stored codes are picked up by the code id index, so they are not stored again
+    if stored:
+        if code_ids is None:
+            code_ids = CodeIdIndex.for_project(project_path, profile.network.chain_id)
+        code_ids.sync(client)
+
+    if len(recovered) > 0:
+        cfg.save(project_path, profile_names=[profile.name])
+    journal.remove(resolved)
+
+    return len(recovered)
@@ -1,17 +1,23 @@
-from typing import Dict, Optional, Any, Callable, List
+from typing import Dict, Optional, Any, Callable, List, Tuple
 from abc import ABC, abstractmethod
 from keyword import iskeyword as is_python_keyword
 
 import grpc
-from cosmpy.aerial.client import LedgerClient
-from cosmpy.aerial.contract import LedgerContract, _compute_digest
+from cosmpy.aerial.client import LedgerClient, prepare_and_broadcast_basic_transaction
+from cosmpy.aerial.contract import LedgerContract, _generate_label
+from cosmpy.aerial.contract.cosmwasm import (create_cosmwasm_instantiate_msg, create_cosmwasm_migrate_msg,
+                                             create_cosmwasm_store_code_msg)
+from cosmpy.aerial.tx import Transaction
 from cosmpy.aerial.tx_helpers import SubmittedTx
 from cosmpy.aerial.wallet import Wallet
 from cosmpy.crypto.address import Address
 from cosmpy.protos.cosmwasm.wasm.v1.query_pb2 import QueryCodeRequest
 from jsonschema import ValidationError, validate as validate_schema
 from makefun import create_function
+from jenesis.cache.code_ids import CodeIdIndex
 from jenesis.contracts import Contract
+from jenesis.contracts.instantiate2 import create_instantiate2_msg, is_instantiated, predict_address
+from jenesis.contracts.sequence import SequenceManager
 
 
 KEYWORD_PREFIX = '_'
@@ -48,6 +54,15 @@ def validate(args: Any, schema: dict):
         raise ex
 
 
+def check_contract_address(address: Optional[Address], expected_address: Optional[Address]) -> Address:
+    # the address of a contract instantiated with a salt must be the one that was predicted
+    if address is None:
+        raise RuntimeError("Unable to extract contract address")
+    if expected_address is not None and str(address) != str(expected_address):
+        raise RuntimeError(f"Contract instantiated at {address} rather than {expected_address}")
+    return address
+
+
 class MonkeyContract(LedgerContract):
     def __init__(
         self,
@@ -58,6 +73,8 @@ class MonkeyContract(LedgerContract):
         code_id: Optional[int] = None,
         observer: Optional[ContractObserver] = None,
         init_args: Optional[dict] = None,
+        sequences: Optional[SequenceManager] = None,
+        code_ids: Optional[CodeIdIndex] = None,
     ):
         # pylint: disable=super-init-not-called
         self._contract = contract
@@ -66,12 +83,19 @@ class MonkeyContract(LedgerContract):
         self._address = address
         self._observer = observer
         self._init_args = init_args
+        self._sequences = sequences
+
+        # without the index of the project the codes on chain are only indexed in memory
+        if code_ids is None:
+            code_ids = CodeIdIndex(client.network_config.chain_id)
+        self._code_ids = code_ids
 
         self._load_schema(contract.source_path)
 
         # build the digest
-        if contract.binary_path is not None:
-            self._digest = _compute_digest(contract.binary_path)
+        contract_digest = contract.digest() if contract.binary_path is not None else None
+        if contract_digest is not None:
+            self._digest = bytes.fromhex(contract_digest)
         elif digest is not None:
             self._digest = digest
         else:
@@ -93,17 +117,33 @@ class MonkeyContract(LedgerContract):
         if self._observer is not None and self._code_id is not None:
             self._observer.on_code_id_update(self._code_id)
 
+    def set_code_id(self, code_id: int):
+        self._code_id = code_id
+
+        # record the code so later lookups do not need to query the chain
+        self._code_ids.add(self._digest.hex(), code_id)
+        self._code_ids.save()
+
+        # trigger the observer if necessary
+        if self._observer is not None:
+            self._observer.on_code_id_update(code_id)
+
     def store(
             self,
             sender: Wallet,
             gas_limit: Optional[int] = None,
             memo: Optional[str] = None,
     ) -> int:
-        code_id = super().store(sender, gas_limit=gas_limit, memo=memo)
+        transaction = Transaction()
+        transaction.add_message(create_cosmwasm_store_code_msg(self._path, sender.address()))
 
-        # trigger the observer if necessary
-        if self._observer is not None:
-            self._observer.on_code_id_update(code_id)
+        submitted_tx = self._broadcast(transaction, sender, gas_limit=gas_limit, memo=memo).wait_to_complete()
+
+        # extract the code id
+        code_id = submitted_tx.contract_code_id
+        if code_id is None:
+            raise RuntimeError("Unable to extract contract code id")
+        self.set_code_id(code_id)
 
         return code_id
 
@@ -116,7 +156,40 @@ class MonkeyContract(LedgerContract):
             admin_address: Optional[Address] = None,
             funds: Optional[str] = None,
             do_validate: Optional[bool] = True,
+            salt: Optional[bytes] = None,
     ) -> Address:
+        msg, expected_address = self.create_instantiate_msg(
+            args, sender, label=label, admin_address=admin_address, funds=funds, do_validate=do_validate, salt=salt,
+        )
+
+        if msg is None:
+            # the same binary has already been instantiated by the same sender with the same salt
+            address = expected_address
+        else:
+            address = self._broadcast_instantiate(msg, sender, gas_limit, expected_address)
+        self.set_address(address)
+
+        return address
+
+    def create_instantiate_msg(
+            self,
+            args: Any,
+            sender: Wallet,
+            label: Optional[str] = None,
+            admin_address: Optional[Address] = None,
+            funds: Optional[str] = None,
+            do_validate: Optional[bool] = True,
+            salt: Optional[bytes] = None,
+            code_id: Optional[int] = None,
+    ) -> Tuple[Optional[Any], Optional[Address]]:
+        """
+        Builds the message that instantiates the contract
+
+        :param code_id: Optional code id to instantiate, e.g. the one the code is predicted to get when it is
+                        stored in the same transaction. If None then the code id of the contract is used
+        :return: The message, or None if the contract already exists at its predicted address, and the
+                 predicted address if a salt is given
+        """
         # if no args provided, insert init args from configuration
         if args is None:
             if self._init_args is not None:
@@ -127,13 +200,95 @@ class MonkeyContract(LedgerContract):
                 )
         if do_validate and self._contract.instantiate_schema:
             validate(args, self._contract.instantiate_schema)
-        address = super().instantiate(args, sender, label=label, gas_limit=gas_limit,
-                                      admin_address=admin_address, funds=funds)
 
+        code_id = self._code_id if code_id is None else code_id
+        assert code_id, RuntimeError("Code id was not set.")
+
+        if label is None:
+            label = _generate_label(bytes(self._digest))
+
+        if salt is None:
+            msg = create_cosmwasm_instantiate_msg(
+                code_id, args, label, sender.address(), admin_address=admin_address, funds=funds
+            )
+            return msg, None
+
+        expected_address = predict_address(self._digest, sender.address(), salt)
+        if is_instantiated(self._client, expected_address):
+            return None, expected_address
+
+        msg = create_instantiate2_msg(
+            code_id, args, label, sender.address(), salt, admin_address=admin_address, funds=funds
+        )
+        return msg, expected_address
+
+    def set_address(self, address: Address):
+        self._address = address
+
+        # trigger the observer if necessary
         if self._observer is not None:
             self._observer.on_contract_address_update(address)
 
-        return address
+    def migrate(
+            self,
+            args: Any,
+            sender: Wallet,
+            new_code_id: int,
+            gas_limit: Optional[int] = None,
+            do_validate: Optional[bool] = True,
+    ) -> SubmittedTx:
+        transaction = Transaction()
+        transaction.add_message(self.create_migrate_msg(args, sender, new_code_id, do_validate=do_validate))
+
+        submitted_tx = self._broadcast(transaction, sender, gas_limit=gas_limit).wait_to_complete()
+
+        self._code_id = new_code_id
+        if self._observer is not None:
+            self._observer.on_code_id_update(new_code_id)
+
+        return submitted_tx
+
+    def create_migrate_msg(
+            self,
+            args: Any,
+            sender: Wallet,
+            new_code_id: int,
+            do_validate: Optional[bool] = True,
+    ) -> Any:
+        assert self._address, RuntimeError("Address was not set.")
+
+        if do_validate and self._contract.migrate_schema:
+            validate(args, self._contract.migrate_schema)
+
+        return create_cosmwasm_migrate_msg(new_code_id, args, self._address, sender.address())
+
+    def _broadcast_instantiate(
+        self,
+        msg: Any,
+        sender: Wallet,
+        gas_limit: Optional[int],
+        expected_address: Optional[Address],
+    ) -> Address:
+        transaction = Transaction()
+        transaction.add_message(msg)
+
+        submitted_tx = self._broadcast(transaction, sender, gas_limit=gas_limit).wait_to_complete()
+
+        return check_contract_address(submitted_tx.contract_address, expected_address)
+
+    def _broadcast(
+        self,
+        transaction: Transaction,
+        sender: Wallet,
+        gas_limit: Optional[int] = None,
+        memo: Optional[str] = None,
+    ) -> SubmittedTx:
+        # use the locally tracked account sequence if available, so the transaction does not need to wait for others
+        if self._sequences is not None:
+            return self._sequences.broadcast(transaction, sender, gas_limit=gas_limit, memo=memo)
+        return prepare_and_broadcast_basic_transaction(
+            self._client, transaction, sender, gas_limit=gas_limit, memo=memo
+        )
 
     def _deploy(
         self,
@@ -145,6 +300,7 @@ class MonkeyContract(LedgerContract):
         admin_address: Optional[Address] = None,
         funds: Optional[str] = None,
         do_validate: Optional[bool] = True,
+        salt: Optional[bytes] = None,
     ) -> Address:
 
         # in the case where the contract is already deployed
@@ -166,6 +322,7 @@ class MonkeyContract(LedgerContract):
             admin_address=admin_address,
             funds=funds,
             do_validate=do_validate,
+            salt=salt,
         )
         return address
 
@@ -187,23 +344,31 @@ class MonkeyContract(LedgerContract):
         return super().query(args)
 
     def make_queries(self) -> Dict[str, Callable]:
+        return self.queries_for(self._contract)
+
+    @classmethod
+    def queries_for(cls, contract: Contract) -> Dict[str, Callable]:
 
         def make_query(msg: str, msg_args: List[str]):
             def query(self, *args, **kwargs):
                 query_arg = {msg: {python_keyword_unwrapper(key): value for (key, value) in kwargs.items()}}
                 return self.query(query_arg, *args)
 
-            sig = self._make_function_signature(msg, msg_args, [])
+            sig = cls._make_function_signature(msg, msg_args, [])
             func = create_function(sig, query)
             return func
 
         queries = {}
-        for (msg, msg_args) in self._contract.query_msgs().items():
+        for (msg, msg_args) in contract.query_msgs().items():
             queries[msg] = make_query(msg, msg_args)
 
         return queries
 
     def make_executions(self) -> Dict[str, Callable]:
+        return self.executions_for(self._contract)
+
+    @classmethod
+    def executions_for(cls, contract: Contract) -> Dict[str, Callable]:
 
         def make_execution(msg: str, msg_args: List[str]):
 
@@ -220,17 +385,21 @@ class MonkeyContract(LedgerContract):
                 execute_arg = {msg: contract_func_args}
                 return self.execute(execute_arg, **ledger_exec_args)
 
-            sig = self._make_function_signature(msg, msg_args, ledger_args)
+            sig = cls._make_function_signature(msg, msg_args, ledger_args)
             func = create_function(sig, execute)
             return func
 
         executions = {}
-        for (msg, msg_args) in self._contract.execute_msgs().items():
+        for (msg, msg_args) in contract.execute_msgs().items():
             executions[msg] = make_execution(msg, msg_args)
 
         return executions
 
     def make_deploy(self) -> Dict[str, Callable]:
+        return self.deploy_for(self._contract)
+
+    @classmethod
+    def deploy_for(cls, contract: Contract) -> Dict[str, Callable]:
 
         def make_deploy(msg: str, msg_args: List[str]):
 
@@ -246,13 +415,13 @@ class MonkeyContract(LedgerContract):
                         ledger_deploy_args[key] = value
                     else:
                         contract_init_args[python_keyword_unwrapper(key)] = value
-                return self._deploy(contract_init_args, **ledger_deploy_args)
+                return self._deploy(contract_init_args, **ledger_deploy_args)  # pylint: disable=protected-access
 
-            sig = self._make_function_signature(msg, msg_args, ledger_args)
+            sig = cls._make_function_signature(msg, msg_args, ledger_args)
             func = create_function(sig, deploy)
             return func
 
-        deploy = {'deploy': make_deploy('deploy', self._contract.init_args())}
+        deploy = {'deploy': make_deploy('deploy', contract.init_args())}
 
         return deploy
 
@@ -293,6 +462,10 @@ class MonkeyContract(LedgerContract):
 
         return self._find_contract_id_by_digest(self._digest)
 
+    def _find_contract_id_by_digest(self, digest: bytes) -> Optional[int]:
+        # use the local index of the codes on this chain rather than walking all of them
+        return self._code_ids.find(self._client, digest)
+
     def __repr__(self):
         return str(self._address)
 
@@ -305,6 +478,7 @@ def make_contract(
     code_id: Optional[int] = None,
     observer: Optional[ContractObserver] = None,
     init_args: Optional[dict] = None,
+    code_ids: Optional[CodeIdIndex] = None,
 ) -> Any:
     """
     Makes the contract objects for interaction from the shell and scripts.
@@ -318,24 +492,22 @@ def make_contract(
     :param code_id: The contract code_id
     :param observer: The contract observer
     :param init_args: The instantiation arguments
+    :param code_ids: The code id index of the chain. If None then the codes are only indexed in memory
     :return: The contract object with queries and executions attached
     """
 
-    monkey_contract = MonkeyContract(
-        contract, client, address, digest, code_id, observer, init_args
-    )
-
-    # add methods based on schema
+    # add methods based on schema (these only depend on the static contract data, so the contract
+    # object itself is only constructed once)
     contract_functions = {}
     if contract.schema is not None:
-        contract_functions.update(monkey_contract.make_queries())
-        contract_functions.update(monkey_contract.make_executions())
-        contract_functions.update(monkey_contract.make_deploy())
+        contract_functions.update(MonkeyContract.queries_for(contract))
+        contract_functions.update(MonkeyContract.executions_for(contract))
+        contract_functions.update(MonkeyContract.deploy_for(contract))
 
     JenesisContract = type('JenesisContract', (MonkeyContract,), contract_functions)
 
     return JenesisContract(
-        contract, client, address, digest, code_id, observer, init_args
+        contract, client, address, digest, code_id, observer, init_args, code_ids=code_ids
     )
 
 
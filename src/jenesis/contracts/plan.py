@@ -0,0 +1,353 @@
+import copy
+import dataclasses
+import graphlib as gl
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Union
+
+from jenesis.config import Deployment, Profile
+from jenesis.contracts import Contract
+
+PLAN_INSTANTIATE = "instantiate"
+PLAN_MIGRATE = "migrate"
+
+
+# Recursive function to insert deployed contract address into instantiation msg
+def insert(data: Union[Dict, List], contract_name: str, address: str):
+    for key, value in data.items() if isinstance(data, dict) else enumerate(data):
+        if value == ("$" + contract_name):
+            data[key] = address
+        elif isinstance(value, (dict, list)):
+            insert(value, contract_name, address)
+
+
+def insert_address(contract_address_names: List[str], deployment: Deployment, profile: Profile,
+                   addresses: Optional[Dict[str, str]] = None) -> dict:
+
+    deployment_names = list(profile.deployments.keys())
+    init_data = deployment.init
+    addresses = addresses or {}
+
+    # iterate over the addresses to insert
+    for name in contract_address_names:
+        if name in deployment_names:
+            # precomputed addresses take precedence over the ones from previous deployments
+            deployed_contract_address = addresses.get(name, profile.deployments[name].address)
+
+            assert deployed_contract_address is not None, f"Contract {name} address not found"
+
+            # insert deployed contract address in instantiation msg
+            insert(init_data, name, str(deployed_contract_address))
+
+    return init_data
+
+def retreive_init_addresses(data: Union[Dict, List], contract_names: List[str], init_addresses: List[str]):
+    for _, value in data.items() if isinstance(data, dict) else enumerate(data):
+        if isinstance(value, str) and len(value) > 0:
+            if value[0] == "$" and value[1:] in contract_names:
+                init_addresses.append(value[1:])
+                contract_names.remove(value[1:])
+        elif isinstance(value, (dict, list)):
+            retreive_init_addresses(value, contract_names,init_addresses)
+    return init_addresses
+
+def compute_init_addresses(deployments: Dict[str, Deployment]) -> Dict[str, Set[str]]:
+    init_addresses = {}
+
+    # iterate over the addresses to insert
+    for (name, deployment) in deployments.items():
+        init_data = deployment.init or {}
+        deployment_names = list(deployments.keys())
+
+        # retreive init addresses for each contract
+        contract_init_addresses = retreive_init_addresses(init_data, deployment_names, [])
+
+        # add all contract init addresses in one dictionary
+        init_addresses[name] = set(contract_init_addresses)
+
+    return init_addresses
+
+
+def compute_deployment_order(deployments: Dict[str, Deployment]) -> List[str]:
+    sorter = gl.TopologicalSorter(compute_init_addresses(deployments))
+    return list(sorter.static_order())
+
+
+def compute_instantiation_order(deployments: Dict[str, Deployment]) -> List[str]:
+    # with predictable addresses deployments may reference each other, in which case there is no order
+    # that instantiates every dependency first
+    try:
+        return compute_deployment_order(deployments)
+    except gl.CycleError:
+        return list(deployments.keys())
+
+
+def compute_dependency_components(names: List[str], init_addresses: Dict[str, Set[str]]) -> List[List[str]]:
+    """
+    Groups deployments that reference each other (directly or indirectly) together. The groups are ordered so
+    that the groups a group references come before it
+
+    :param names: The deployments to group
+    :param init_addresses: The deployments referenced by each deployment
+    :return: The groups of deployments
+    """
+    graph = {name: sorted(dep for dep in init_addresses.get(name, set()) if dep in names) for name in names}
+
+    # Tarjan's algorithm, which completes every component after the components it references
+    index, lowlink, stack, on_stack = {}, {}, [], set()
+    components = []
+
+    def visit(name: str):
+        index[name] = lowlink[name] = len(index)
+        stack.append(name)
+        on_stack.add(name)
+
+        for dep in graph[name]:
+            if dep not in index:
+                visit(dep)
+                lowlink[name] = min(lowlink[name], lowlink[dep])
+            elif dep in on_stack:
+                lowlink[name] = min(lowlink[name], index[dep])
+
+        if lowlink[name] == index[name]:
+            component = []
+            while True:
+                member = stack.pop()
+                on_stack.discard(member)
+                component.append(member)
+                if member == name:
+                    break
+            components.append(sorted(component))
+
+    for name in names:
+        if name not in index:
+            visit(name)
+    return components
+
+
+def resolve_init(deployment: Deployment, profile: Profile, init_addresses: Dict[str, Set[str]]):
+    """
+    Inserts the addresses of the current deployments into the init message of a deployment
+
+    :param deployment: The deployment
+    :param profile: The profile of the deployment
+    :param init_addresses: The deployments referenced by each deployment
+    :return:
+    """
+    referenced = [name for name in init_addresses[deployment.name] if profile.deployments[name].address is not None]
+    if deployment.init is not None:
+        deployment.init = insert_address(referenced, deployment, profile)
+
+
+def is_configuration_changed(deployment: Deployment, profile: Profile, init_addresses: Dict[str, Set[str]]) -> bool:
+    """
+    Checks whether the configuration of a deployment has changed since it was deployed. The lock records the
+    checksum of the init message with the contract addresses inserted, so they are inserted before comparing
+
+    :param deployment: The deployment
+    :param profile: The profile of the deployment
+    :param init_addresses: The deployments referenced by each deployment
+    :return: True if the configuration has changed, otherwise False
+    """
+    resolved = dataclasses.replace(deployment, init=copy.deepcopy(deployment.init))
+    resolve_init(resolved, profile, init_addresses)
+
+    # older lock files recorded the checksum of the init message without the addresses inserted
+    return resolved.is_configuration_out_of_date() and deployment.is_configuration_out_of_date()
+
+
+@dataclass
+class PlannedDeployment:
+    name: str
+    action: str  # either instantiate (the contract gets a new address) or migrate
+    reason: str
+    digest: str
+    store: bool  # whether the contract binary needs to be stored on chain
+
+
+@dataclass
+class DeploymentPlan:
+    profile_name: str
+    init_addresses: Dict[str, Set[str]]
+    predictable_addresses: bool = False
+    order: List[str] = field(default_factory=list)  # the planned deployments in dependency order
+    planned: Dict[str, PlannedDeployment] = field(default_factory=dict)
+    kept: Dict[str, str] = field(default_factory=dict)  # out of date deployments that are migrated, not replaced
+    blocked: Dict[str, str] = field(default_factory=dict)
+    up_to_date: List[str] = field(default_factory=list)
+
+    def estimate_transactions(self, profile: Profile, batch: bool = False) -> Dict[str, int]:
+        """
+        Estimates the number of transactions needed to carry out the plan
+
+        :param profile: The profile being deployed
+        :param batch: Whether the deployment is carried out in batch mode
+        :return: The number of store, migrate and instantiate transactions
+        """
+        stored = set()
+        transactions = {"store": set(), PLAN_MIGRATE: set(), PLAN_INSTANTIATE: set()}
+
+        levels = self.compute_levels()
+        for name in self.order:
+            planned = self.planned[name]
+            deployment = profile.deployments[name]
+
+            # in batch mode the deployments that become ready together share their transactions
+            group = (levels[name], deployment.deployer_key) if batch else name
+
+            # every unique binary is only stored once
+            if planned.store and planned.digest not in stored:
+                stored.add(planned.digest)
+                transactions["store"].add(group if batch else planned.digest)
+            transactions[planned.action].add(group)
+
+        return {name: len(groups) for (name, groups) in transactions.items()}
+
+    def compute_levels(self) -> Dict[str, int]:
+        """
+        Groups the planned deployments by the point at which they become ready. Deployments on the same level
+        do not depend on each other, so they can all be deployed at the same time
+
+        :return: The level of each planned deployment
+        """
+        levels = {}  # type: Dict[str, int]
+        for name in self.order:
+            dependencies = [levels[dependency] for dependency in self.init_addresses[name] if dependency in levels]
+            levels[name] = 0 if self.predictable_addresses or len(dependencies) == 0 else max(dependencies) + 1
+        return levels
+
+    def format(self, profile: Profile, batch: bool = False) -> str:
+        lines = [f"Deployment plan for profile {self.profile_name}:"]
+        if len(self.order) == 0:
+            lines.append("  Nothing to deploy")
+
+        width = max([len(name) for name in self.order] + [0])
+        for name in self.order:
+            planned = self.planned[name]
+            store = ", store binary" if planned.store else ""
+            lines.append(f"  {name:<{width}}  {planned.action}{store} ({planned.reason})")
+        for (name, reason) in self.kept.items():
+            lines.append(f"  {name}: kept at its current address ({reason})")
+        for (name, reason) in self.blocked.items():
+            lines.append(f"  {name}: blocked ({reason})")
+        if len(self.up_to_date) > 0:
+            lines.append(f"  {len(self.up_to_date)} deployment(s) up to date: {', '.join(self.up_to_date)}")
+
+        transactions = self.estimate_transactions(profile, batch)
+        summary = ", ".join(f"{count} {name}" for (name, count) in transactions.items())
+        lines.append(f"Estimated transactions: {summary} ({sum(transactions.values())} total)")
+        return "\n".join(lines)
+
+
+def _blocked_reason(deployment: Deployment, contracts: Dict[str, Contract],
+                    available_keys: Optional[Set[str]]) -> Optional[str]:
+    if deployment.contract not in contracts:
+        return f"contract {deployment.contract} not found in project"
+    if not os.path.isfile(contracts[deployment.contract].binary_path):
+        return f"no contract binary found for {deployment.contract}, please run 'jenesis compile' first"
+    if available_keys is not None and deployment.deployer_key not in available_keys:
+        return f"deployer key {deployment.deployer_key} not available"
+    return None
+
+
+def _change_reason(deployment: Deployment, contract: Contract, profile: Profile,
+                   init_addresses: Dict[str, Set[str]], replaced: Set[str]) -> Optional[str]:
+    if deployment.address is None:
+        return "not deployed"
+    if contract.digest() != deployment.digest:
+        return "binary changed"
+
+    # a dependency that is replaced gets a new address, which changes the init message of this deployment
+    dependencies = sorted(init_addresses[deployment.name] & replaced)
+    if len(dependencies) > 0:
+        return f"dependency {', '.join(dependencies)} redeployed"
+
+    if is_configuration_changed(deployment, profile, init_addresses):
+        return "configuration changed"
+    return None
+
+
+def compute_deployment_plan(
+    profile: Profile,
+    contracts: Dict[str, Contract],
+    is_stored: Optional[Callable[[str], bool]] = None,
+    available_keys: Optional[Set[str]] = None,
+) -> DeploymentPlan:
+    """
+    Computes the minimal set of deployments of a profile that need to be deployed. A deployment is
+    redeployed when it has changed (binary, init message, deployer key or network), or when one of the
+    deployments it refers to is replaced by a contract at a new address
+
+    :param profile: The profile to deploy
+    :param contracts: The contracts of the project by name
+    :param is_stored: Optional callable that checks whether a binary (by digest) is already stored on chain
+    :param available_keys: The names of the available deployer keys. If None then the keys are not checked
+    :return: The deployment plan
+    """
+    deployments = profile.deployments
+    init_addresses = compute_init_addresses(deployments)
+    plan = DeploymentPlan(profile.name, init_addresses, predictable_addresses=profile.predictable_addresses)
+
+    if profile.predictable_addresses:
+        order = compute_instantiation_order(deployments)
+    else:
+        order = compute_deployment_order(deployments)
+
+    replaced = set()  # type: Set[str]
+    for name in order:
+        deployment = deployments[name]
+
+        blocked = _blocked_reason(deployment, contracts, available_keys)
+        if blocked is None:
+            blocked_dependencies = sorted(init_addresses[name] & set(plan.blocked))
+            if len(blocked_dependencies) > 0:
+                blocked = f"depends on {', '.join(blocked_dependencies)}"
+        if blocked is not None:
+            plan.blocked[name] = blocked
+            continue
+
+        contract = contracts[deployment.contract]
+        reason = _change_reason(deployment, contract, profile, init_addresses, replaced)
+        if reason is None:
+            plan.up_to_date.append(name)
+            continue
+
+        # a migrated contract keeps its address, but only a new binary can be migrated to
+        action = PLAN_MIGRATE if deployment.migrates and deployment.address is not None else PLAN_INSTANTIATE
+        if action == PLAN_MIGRATE and reason != "binary changed":
+            plan.kept[name] = reason
+            continue
+
+        digest = contract.digest()
+        store = is_stored is None or not is_stored(digest)
+        plan.order.append(name)
+        plan.planned[name] = PlannedDeployment(name, action, reason, digest, store)
+        if action == PLAN_INSTANTIATE:
+            replaced.add(name)
+
+    return plan
+
+
+def assign_deployer_keys(plan: DeploymentPlan, key_pool: List[str]) -> Dict[str, str]:
+    """
+    Spreads the planned instantiations across a pool of deployer keys, so that the deployments that are ready
+    at the same time are sent from different accounts and can be included in the same block. Migrations keep
+    their deployer key, since only the admin of a contract can migrate it
+
+    :param plan: The deployment plan
+    :param key_pool: The names of the keys to deploy with
+    :return: The deployer key assigned to each planned instantiation
+    """
+    assert len(key_pool) > 0
+
+    assigned = {}  # type: Dict[str, str]
+    next_key = {}  # type: Dict[int, int]
+    for (name, level) in plan.compute_levels().items():
+        if plan.planned[name].action != PLAN_INSTANTIATE:
+            continue
+
+        index = next_key.get(level, 0)
+        assigned[name] = key_pool[index % len(key_pool)]
+        next_key[level] = index + 1
+
+    return assigned
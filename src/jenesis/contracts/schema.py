@@ -1,11 +1,14 @@
 import json
 import os
 
-from typing import List, Optional
+from typing import Any, Callable, List, Optional
 
+from jenesis.cache.build import BuildManifest
 from jenesis.contracts import Contract
 from jenesis.contracts.build import ContractBuildTask
-from jenesis.tasks.utils import chunks, get_last_modified_timestamp
+from jenesis.tasks.builder import BuilderPool
+from jenesis.tasks.chain import TaskChain
+from jenesis.tasks.utils import get_last_modified_timestamp
 from jenesis.tasks.monitor import run_tasks
 
 SCHEMA_BUILD_STEPS = ["cargo schema"]
@@ -13,8 +16,10 @@ SCHEMA_BUILD_STEPS = ["cargo schema"]
 
 class ContractSchemaTask(ContractBuildTask):
 
-    def __init__(self, contract: Contract, rebuild: bool):
-        super().__init__(contract, False, rebuild, False)
+    def __init__(self, contract: Contract, rebuild: bool, builders: Optional[BuilderPool] = None,
+                 shared_cache: Optional[str] = None, project_path: Optional[str] = None):
+        super().__init__(contract, False, rebuild, False, builders=builders, shared_cache=shared_cache,
+                         project_path=project_path)
         self._build_steps = SCHEMA_BUILD_STEPS
 
         # set working directory according to whether project is a cargo workspace
@@ -28,6 +33,7 @@ class ContractSchemaTask(ContractBuildTask):
             )
 
         self._in_progress_text = "Generating schemas..."
+        self._log_suffix = "-schema"
 
     def _is_out_of_date(self) -> bool:
         #  pylint: disable=duplicate-code
@@ -51,6 +57,10 @@ def generate_schemas(
     contracts: List[Contract],
     batch_size: Optional[int] = None,
     rebuild: Optional[bool] = False,
+    builders: Optional[BuilderPool] = None,
+    priority: Optional[Callable[[Contract], Any]] = None,
+    shared_cache: Optional[str] = None,
+    project_path: Optional[str] = None,
 ):
     """
     Will attempt to build all the specified contract schemas (provided they are out of date)
@@ -58,6 +68,11 @@ def generate_schemas(
     :param contracts: The list of contracts to build schemas for
     :param batch_size: The max number of builds to do in parallel. If None then will attempt to all in parallel
     :param rebuild: Whether to force a rebuild of the contract schemas
+    :param builders: The pool of warm builders to run the schema generation in
+    :param priority: Optional sort key for the contracts, the contracts with the lowest key are processed first
+    :param shared_cache: The volume holding a compiler cache shared by all the contracts. If None then each
+                         contract compiles its own dependencies
+    :param project_path: The path to the project, the full logs are kept in its state folder
     :return:
     """
     # create all the tasks to be done
@@ -66,13 +81,75 @@ def generate_schemas(
             ContractSchemaTask,
             contracts,
             [rebuild] * len(contracts),
+            [builders] * len(contracts),
+            [shared_cache] * len(contracts),
+            [project_path] * len(contracts),
         )
     )
 
-    # run the tasks (in batches if configured)
-    for batch in chunks(tasks, batch_size=batch_size):
-        run_tasks(batch)
+    # run the tasks, starting the next queued task as soon as one finishes
+    run_tasks(
+        tasks,
+        max_parallel=batch_size,
+        priority=None if priority is None else lambda task: priority(task.contract),
+    )
+
+    _load_schemas(contracts)
+
+
+def build_contracts_and_schemas(
+    contracts: List[Contract],
+    batch_size: Optional[int] = None,
+    optimize: Optional[bool] = False,
+    rebuild: Optional[bool] = False,
+    log: Optional[bool] = False,
+    manifest: Optional[BuildManifest] = None,
+    builders: Optional[BuilderPool] = None,
+    priority: Optional[Callable[[Contract], Any]] = None,
+    shared_cache: Optional[str] = None,
+    project_path: Optional[str] = None,
+):
+    """
+    Will attempt to build all the specified contracts and their schemas (provided they are out of date). The
+    schema generation for each contract is started as soon as the build of that contract has finished, rather
+    than waiting for all the contracts to be built
+
+    :param contracts: The list of contracts to build
+    :param batch_size: The max number of contracts to process in parallel. If None then will attempt to all in parallel
+    :param optimize: Whether to perform an optimized build
+    :param rebuild: Whether to force a rebuild of the contracts and schemas
+    :param manifest: The build manifest used to detect up to date builds. If None then file timestamps are used
+    :param builders: The pool of warm builders to run the builds in. When provided, the build and schema
+                     generation of a contract run in the same builder and share its target directory
+    :param priority: Optional sort key for the contracts, the contracts with the lowest key are built first
+    :param shared_cache: The volume holding a compiler cache shared by all the contracts. If None then each
+                         contract compiles its own dependencies
+    :param project_path: The path to the project, the full logs are kept in its state folder
+    :return:
+    """
+    tasks = [
+        TaskChain([
+            ContractBuildTask(contract, optimize, rebuild, log, manifest, builders, shared_cache, project_path),
+            ContractSchemaTask(contract, rebuild, builders, shared_cache, project_path),
+        ])
+        for contract in contracts
+    ]
+
+    # run the tasks, starting the next queued contract as soon as one finishes
+    try:
+        run_tasks(
+            tasks,
+            max_parallel=batch_size,
+            priority=None if priority is None else lambda task: priority(task.tasks[0].contract),
+        )
+    finally:
+        if manifest is not None:
+            manifest.save()
+
+    _load_schemas(contracts)
+
 
+def _load_schemas(contracts: List[Contract]):
     for contract in contracts:
         contract.schema = load_contract_schema(contract.source_path)
         contract.update_schema()
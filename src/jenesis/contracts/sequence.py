@@ -0,0 +1,199 @@
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+import grpc
+from cosmpy.aerial.client import Account, LedgerClient
+from cosmpy.aerial.exceptions import BroadcastError
+from cosmpy.aerial.tx import SigningCfg, Transaction
+from cosmpy.aerial.tx_helpers import SubmittedTx, TxResponse
+from cosmpy.aerial.wallet import Wallet
+from jenesis.network.aio import AsyncLedger
+
+SEQUENCE_MISMATCH_ERROR = "account sequence mismatch"
+MAX_BROADCAST_ATTEMPTS = 3
+
+
+class TxLimitError(RuntimeError):
+    """
+    Raised when a signed transaction is larger than the network accepts, before it is broadcast
+    """
+
+
+@dataclass
+class TxLimits:
+    max_bytes: Optional[int] = None  # the largest transaction the nodes accept, None if unbounded
+    max_gas: Optional[int] = None  # the gas limit of a block, None if unbounded
+
+    def check(self, transaction: Transaction, gas_limit: int):
+        size = len(transaction.tx.SerializeToString())
+        if self.max_bytes is not None and size > self.max_bytes:
+            raise TxLimitError(f"transaction of {size} bytes exceeds the limit of {self.max_bytes} bytes")
+        if self.max_gas is not None and gas_limit > self.max_gas:
+            raise TxLimitError(f"transaction gas of {gas_limit} exceeds the block gas limit of {self.max_gas}")
+
+
+def query_block_max_gas(client: LedgerClient) -> Optional[int]:
+    """
+    Queries the gas limit of a block on the network
+
+    :param client: The ledger client
+    :return: The maximum gas of a block, or None if it is unbounded or could not be queried
+    """
+    try:
+        max_gas = int(client.query_params("baseapp", "BlockParams")["max_gas"])
+    except (grpc.RpcError, RuntimeError, KeyError, TypeError, ValueError):
+        return None
+    return max_gas if max_gas > 0 else None
+
+
+def is_sequence_mismatch(ex: Exception) -> bool:
+    # pylint: disable=no-member
+    if hasattr(ex, 'details') and callable(ex.details) and SEQUENCE_MISMATCH_ERROR in (ex.details() or ''):
+        return True
+    return SEQUENCE_MISMATCH_ERROR in str(ex)
+
+
+def prepare_transaction(client: LedgerClient, transaction: Transaction, sender: Wallet, account: Account,
+                        gas_limit: Optional[int] = None, memo: Optional[str] = None,
+                        limits: Optional[TxLimits] = None):
+    """
+    Seals and signs a transaction with the given account sequence, estimating the gas by simulating the
+    transaction if no gas limit is given. A TxLimitError is raised if the signed transaction exceeds the limits
+
+    :param client: The ledger client
+    :param transaction: The transaction (with all of its messages added)
+    :param sender: The wallet sending the transaction
+    :param account: The account of the sender
+    :param gas_limit: Optional gas limit. If None then the gas is estimated by simulating the transaction
+    :param memo: Optional transaction memo
+    :param limits: Optional size and gas limits of the network
+    :return:
+    """
+    if gas_limit is not None:
+        fee = client.estimate_fee_from_gas(gas_limit)
+    else:
+        # build up a representative transaction so that it can be simulated
+        transaction.seal(SigningCfg.direct(sender.public_key(), account.sequence), fee="", gas_limit=0, memo=memo)
+        transaction.sign(sender.signer(), client.network_config.chain_id, account.number)
+        transaction.complete()
+        gas_limit, fee = client.estimate_gas_and_fee_for_tx(transaction)
+
+    transaction.seal(SigningCfg.direct(sender.public_key(), account.sequence), fee=fee, gas_limit=gas_limit, memo=memo)
+    transaction.sign(sender.signer(), client.network_config.chain_id, account.number)
+    transaction.complete()
+
+    if limits is not None:
+        limits.check(transaction, gas_limit)
+
+
+class AccountSequence:
+    """
+    Tracks the account number and next sequence of a single wallet locally. Transactions are signed
+    with locally assigned sequences and broadcast in sync mode, so the next transaction from the
+    wallet can be broadcast without waiting for the previous one to be included in a block.
+    """
+
+    def __init__(self, client: LedgerClient, wallet: Wallet, limits: Optional[Callable[[], TxLimits]] = None):
+        self._client = client
+        self._wallet = wallet
+        self._limits = limits
+        self._account = None  # type: Optional[Account]
+        self._lock = threading.Lock()
+
+    def broadcast(self, transaction: Transaction, gas_limit: Optional[int] = None, memo: Optional[str] = None,
+                  on_signed: Optional[Callable[[Transaction], None]] = None) -> SubmittedTx:
+        """
+        Signs the transaction with the next sequence of the wallet and broadcasts it. This returns as soon as the
+        transaction has been accepted into the mempool, call `wait_to_complete` on the result to wait for inclusion
+
+        :param transaction: The transaction (with all of its messages added)
+        :param gas_limit: Optional gas limit. If None then the gas is estimated by simulating the transaction
+        :param memo: Optional transaction memo
+        :param on_signed: Optional callback that is called with the signed transaction just before it is sent
+        :return: The submitted transaction
+        """
+        limits = self._limits() if self._limits is not None else None
+        with self._lock:
+            attempt = 0
+            while True:
+                if self._account is None:
+                    self._account = self._client.query_account(self._wallet.address())
+
+                try:
+                    prepare_transaction(self._client, transaction, self._wallet, self._account, gas_limit, memo,
+                                        limits=limits)
+                    if on_signed is not None:
+                        on_signed(transaction)
+                    submitted_tx = self._client.broadcast_tx(transaction)
+                except (BroadcastError, grpc.RpcError, RuntimeError) as ex:
+                    # another client has used the account (or a transaction was dropped), so resync and retry
+                    attempt += 1
+                    if is_sequence_mismatch(ex) and attempt < MAX_BROADCAST_ATTEMPTS:
+                        self._account = None
+                        continue
+                    raise
+
+                self._account = Account(
+                    address=self._account.address,
+                    number=self._account.number,
+                    sequence=self._account.sequence + 1,
+                )
+                return submitted_tx
+
+    def reset(self):
+        # force the account to be queried again before the next broadcast
+        with self._lock:
+            self._account = None
+
+
+class SequenceManager:
+    """
+    Hands out the local account sequence for each wallet, so that all the transactions that are sent
+    from the same wallet (from any thread) share the same sequence. Transactions that exceed the size
+    or gas limits of the network are rejected before they are broadcast
+    """
+
+    def __init__(self, client: LedgerClient, max_tx_bytes: Optional[int] = None):
+        self._client = client
+        self._max_tx_bytes = max_tx_bytes
+        self._limits = None  # type: Optional[TxLimits]
+        self._sequences = {}  # type: Dict[str, AccountSequence]
+        self._lock = threading.Lock()
+
+    def limits(self) -> TxLimits:
+        # the block gas limit is only queried once it is needed
+        with self._lock:
+            if self._limits is None:
+                self._limits = TxLimits(max_bytes=self._max_tx_bytes, max_gas=query_block_max_gas(self._client))
+            return self._limits
+
+    def for_wallet(self, wallet: Wallet) -> AccountSequence:
+        address = str(wallet.address())
+        with self._lock:
+            sequence = self._sequences.get(address)
+            if sequence is None:
+                sequence = AccountSequence(self._client, wallet, limits=self.limits)
+                self._sequences[address] = sequence
+            return sequence
+
+    def broadcast(self, transaction: Transaction, sender: Wallet, gas_limit: Optional[int] = None,
+                  memo: Optional[str] = None, on_signed: Optional[Callable[[Transaction], None]] = None) -> SubmittedTx:
+        return self.for_wallet(sender).broadcast(transaction, gas_limit=gas_limit, memo=memo, on_signed=on_signed)
+
+
+async def broadcast_and_wait(ledger: AsyncLedger, sequences: SequenceManager, transaction: Transaction,
+                             sender: Wallet, gas_limit: Optional[int] = None) -> TxResponse:
+    """
+    Broadcasts a transaction with the next sequence of the sender and waits for it to be included in a block.
+    Only the signing and broadcasting run on a worker thread, the wait is multiplexed on the event loop
+
+    :param ledger: The async ledger of the network
+    :param sequences: The account sequences
+    :param transaction: The transaction (with all of its messages added)
+    :param sender: The wallet sending the transaction
+    :param gas_limit: Optional gas limit. If None then the gas is estimated by simulating the transaction
+    :return: The successful transaction response
+    """
+    submitted_tx = await ledger.run_blocking(sequences.broadcast, transaction, sender, gas_limit=gas_limit)
+    return await ledger.wait_for_tx(submitted_tx.tx_hash)
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+UploadKey = Tuple[str, str]
+
+
+class CodeUploads:
+    """
+    Tracks the code ids of the contract binaries that have been stored on each chain, so that every
+    unique binary is only stored once no matter how many deployments use it. Deployments that need a
+    binary which is already being stored wait for that upload rather than storing it again
+    """
+
+    def __init__(self):
+        self._uploads = {}  # type: Dict[UploadKey, Future]
+        self._store_locks = {}  # type: Dict[str, asyncio.Lock]
+        self._lock = threading.Lock()
+
+    def add(self, chain_id: str, digest: str, code_id: int):
+        """
+        Records the code id of a binary that is known to be stored on the chain
+
+        :param chain_id: The chain id
+        :param digest: The hex encoded digest of the contract binary
+        :param code_id: The code id
+        :return:
+        """
+        with self._lock:
+            upload = self._uploads.get((chain_id, digest))
+            if upload is None or (upload.done() and upload.exception() is not None):
+                upload = Future()
+                upload.set_result(code_id)
+                self._uploads[(chain_id, digest)] = upload
+
+    def lookup(self, chain_id: str, digest: str) -> Optional[int]:
+        with self._lock:
+            upload = self._uploads.get((chain_id, digest))
+        if upload is None or not upload.done() or upload.exception() is not None:
+            return None
+        return upload.result()
+
+    def code_id(self, chain_id: str, digest: str, store: Callable[[], int]) -> int:
+        """
+        Gets the code id of a binary, storing it if this is the first time that it is needed
+
+        :param chain_id: The chain id
+        :param digest: The hex encoded digest of the contract binary
+        :param store: Callable that stores the binary and returns its code id
+        :return: The code id
+        """
+        (upload, owner) = self._claim(chain_id, digest)
+        if not owner:
+            return upload.result()
+
+        try:
+            upload.set_result(store())
+        except Exception as ex:
+            upload.set_exception(ex)
+            raise
+
+        return upload.result()
+
+    async def async_code_id(self, chain_id: str, digest: str, store: Callable[[], Awaitable[int]]) -> int:
+        """
+        Gets the code id of a binary in the same way as `code_id`, without blocking the event loop while
+        waiting for another deployment to store it
+
+        :param chain_id: The chain id
+        :param digest: The hex encoded digest of the contract binary
+        :param store: Coroutine function that stores the binary and returns its code id
+        :return: The code id
+        """
+        (upload, owner) = self._claim(chain_id, digest)
+        if not owner:
+            return await asyncio.wrap_future(upload)
+
+        try:
+            upload.set_result(await store())
+        except Exception as ex:
+            upload.set_exception(ex)
+            raise
+
+        return upload.result()
+
+    async def async_code_ids(self, chain_id: str, digests: List[str],
+                             store: Callable[[List[str]], Awaitable[List[int]]]) -> Dict[str, int]:
+        """
+        Gets the code ids of several binaries, storing the ones that are needed for the first time together.
+        Only the binaries that are not already stored or being stored by another deployment are passed to
+        `store`, the others are waited for
+
+        :param chain_id: The chain id
+        :param digests: The hex encoded digests of the contract binaries
+        :param store: Coroutine function that stores the given binaries and returns their code ids in order
+        :return: The code id of each digest
+        """
+        claims = {digest: self._claim(chain_id, digest) for digest in dict.fromkeys(digests)}
+        owned = [digest for (digest, (_, owner)) in claims.items() if owner]
+
+        if len(owned) > 0:
+            try:
+                code_ids = await store(owned)
+            except Exception as ex:
+                for digest in owned:
+                    claims[digest][0].set_exception(ex)
+                raise
+
+            for (digest, code_id) in zip(owned, code_ids):
+                claims[digest][0].set_result(code_id)
+
+        return {digest: await asyncio.wrap_future(upload) for (digest, (upload, _)) in claims.items()}
+
+    def store_lock(self, chain_id: str) -> asyncio.Lock:
+        """
+        Gets the lock that is held while binaries are stored on a chain along with the contracts that use them,
+        so that the code ids they are predicted to get do not collide with the stores of other deployments
+
+        :param chain_id: The chain id
+        :return: The lock
+        """
+        with self._lock:
+            return self._store_locks.setdefault(chain_id, asyncio.Lock())
+
+    def _claim(self, chain_id: str, digest: str) -> Tuple[Future, bool]:
+        with self._lock:
+            upload = self._uploads.get((chain_id, digest))
+
+            # a failed upload is attempted again by the next deployment that needs it
+            owner = upload is None or (upload.done() and upload.exception() is not None)
+            if owner:
+                upload = Future()
+                self._uploads[(chain_id, digest)] = upload
+
+        return upload, owner
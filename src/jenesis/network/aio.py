@@ -0,0 +1,130 @@
+import asyncio
+import time
+from typing import Callable, Dict, Optional, TypeVar
+
+import certifi
+import grpc
+from cosmpy.aerial.client import LedgerClient
+from cosmpy.aerial.exceptions import NotFoundError, QueryTimeoutError
+from cosmpy.aerial.tx_helpers import TxResponse
+from cosmpy.aerial.urls import Protocol, parse_url
+from cosmpy.protos.cosmos.tx.v1beta1.service_pb2 import GetTxRequest
+from cosmpy.protos.cosmos.tx.v1beta1.service_pb2_grpc import ServiceStub as TxServiceStub
+from jenesis.tasks.aio import AsyncRuntime
+
+DEFAULT_TX_TIMEOUT_SECS = 60
+DEFAULT_TX_POLL_PERIOD_SECS = 1.0
+
+T = TypeVar("T")
+
+
+def _create_channel(url: str) -> Optional[grpc.aio.Channel]:
+    parsed_url = parse_url(url)
+    if parsed_url.protocol != Protocol.GRPC:
+        return None
+
+    if parsed_url.secure:
+        with open(certifi.where(), "rb") as certs_file:
+            credentials = grpc.ssl_channel_credentials(root_certificates=certs_file.read())
+        return grpc.aio.secure_channel(parsed_url.host_and_port, credentials)
+    return grpc.aio.insecure_channel(parsed_url.host_and_port)
+
+
+class AsyncLedger:
+    """
+    Waits for transactions to be included in a block without holding a thread. Networks that are reached
+    over gRPC are queried through an async channel, other networks are queried with the synchronous client
+    on the worker threads of the runtime
+    """
+
+    def __init__(self, runtime: AsyncRuntime, client: LedgerClient, channel: Optional[grpc.aio.Channel]):
+        self._runtime = runtime
+        self._client = client
+        self._txs = TxServiceStub(channel) if channel is not None else None
+
+    @property
+    def runtime(self) -> AsyncRuntime:
+        return self._runtime
+
+    @property
+    def client(self) -> LedgerClient:
+        return self._client
+
+    async def run_blocking(self, func: Callable[..., T], *args, **kwargs) -> T:
+        return await self._runtime.run_blocking(func, *args, **kwargs)
+
+    async def query_tx(self, tx_hash: str) -> TxResponse:
+        if self._txs is None:
+            return await self.run_blocking(self._client.query_tx, tx_hash)
+
+        try:
+            resp = await self._txs.GetTx(GetTxRequest(hash=tx_hash))
+        except grpc.aio.AioRpcError as ex:
+            if "not found" in (ex.details() or ""):
+                raise NotFoundError() from ex
+            raise
+
+        return LedgerClient._parse_tx_response(resp.tx_response)  # pylint: disable=protected-access
+
+    async def wait_for_tx(self, tx_hash: str, timeout: float = DEFAULT_TX_TIMEOUT_SECS,
+                          poll_period: float = DEFAULT_TX_POLL_PERIOD_SECS) -> TxResponse:
+        """
+        Waits for a transaction to be included in a block
+
+        :param tx_hash: The transaction hash
+        :param timeout: The max number of seconds to wait
+        :param poll_period: The number of seconds between queries
+        :return: The successful transaction response
+        """
+        start = time.monotonic()
+        while True:
+            try:
+                response = await self.query_tx(tx_hash)
+                response.ensure_successful()
+                return response
+            except NotFoundError:
+                pass
+
+            if time.monotonic() - start >= timeout:
+                raise QueryTimeoutError()
+
+            await asyncio.sleep(poll_period)
+
+
+class AsyncLedgerPool:
+    """
+    Holds a single async channel per network, shared by all the tasks of a runtime
+    """
+
+    def __init__(self, runtime: AsyncRuntime):
+        self._runtime = runtime
+        self._channels = {}  # type: Dict[str, Optional[grpc.aio.Channel]]
+        self._ledgers = {}  # type: Dict[str, AsyncLedger]
+        runtime.add_close_callback(self.close)
+
+    def get(self, client: LedgerClient) -> AsyncLedger:
+        """
+        Gets the async ledger of the network of a client
+
+        :param client: The ledger client
+        :return: The async ledger
+        """
+        url = client.network_config.url
+        ledger = self._ledgers.get(url)
+        if ledger is None:
+            # async channels are bound to the event loop, so they are created on it
+            self._channels[url] = self._runtime.call(self._create_channel(url))
+            ledger = AsyncLedger(self._runtime, client, self._channels[url])
+            self._ledgers[url] = ledger
+        return ledger
+
+    @staticmethod
+    async def _create_channel(url: str) -> Optional[grpc.aio.Channel]:
+        return _create_channel(url)
+
+    async def close(self):
+        for channel in self._channels.values():
+            if channel is not None:
+                await channel.close()
+        self._channels = {}
+        self._ledgers = {}
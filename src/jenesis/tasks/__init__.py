@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from enum import Enum
-from typing import Any, List, Optional
+from typing import Any, Callable, List, Optional
 
 class TaskStatus(Enum):
     IDLE = 0
@@ -10,6 +10,8 @@ class TaskStatus(Enum):
 
 
 class Task(ABC):
+    _notifier = None  # type: Optional[Callable[[Task], None]]
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -30,6 +32,21 @@ class Task(ABC):
     def status_text(self) -> str:
         pass
 
+    @property
+    def group(self) -> Optional[str]:
+        # tasks in the same group (e.g. deploying to the same network) are displayed together
+        return None
+
+    @property
+    def last_log_line(self) -> str:
+        lines = self.logs_text.splitlines()
+        return lines[-1] if lines else ''
+
+    @property
+    def logs_path(self) -> Optional[str]:
+        # the location of the complete logs if they are not all held in memory
+        return None
+
     @property
     def is_idle(self) -> bool:
         return self.status == TaskStatus.IDLE
@@ -50,6 +67,14 @@ class Task(ABC):
     def is_done(self) -> bool:
         return self.is_complete or self.is_failed
 
+    def set_notifier(self, notifier: Optional[Callable[["Task"], None]]):
+        self._notifier = notifier
+
+    def _notify(self):
+        # signal to the monitor that this task has progressed and should be polled
+        if self._notifier is not None:
+            self._notifier(self)
+
     @abstractmethod
     def poll(self):
         pass
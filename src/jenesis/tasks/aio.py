@@ -0,0 +1,143 @@
+import asyncio
+import functools
+import threading
+from abc import abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Optional, TypeVar
+
+from jenesis.tasks import Task, TaskStatus
+
+DEFAULT_BLOCKING_WORKERS = 8
+
+T = TypeVar("T")
+
+
+class AsyncRuntime:
+    """
+    Runs the coroutines of many tasks on a single event loop in a background thread. Calls that can only be
+    made synchronously are run on a small shared pool of worker threads, rather than on a thread per task
+    """
+
+    def __init__(self, max_blocking_workers: int = DEFAULT_BLOCKING_WORKERS):
+        self._loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers=max_blocking_workers)
+        self._loop.set_default_executor(self._executor)
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._on_close = []  # type: List[Callable[[], Awaitable[None]]]
+
+    def __enter__(self) -> "AsyncRuntime":
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        if not self._thread.is_alive():
+            return
+
+        # release the resources (e.g. channels) that are bound to the event loop before stopping it
+        for on_close in reversed(self._on_close):
+            self.call(on_close())
+        self._on_close = []
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._executor.shutdown(wait=True)
+
+    def submit(self, coro: Awaitable[T]) -> "Future[T]":
+        """
+        Schedules a coroutine on the event loop
+
+        :param coro: The coroutine
+        :return: The future of its result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def call(self, coro: Awaitable[T]) -> T:
+        return self.submit(coro).result()
+
+    async def run_blocking(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Runs a synchronous call on the shared worker threads without blocking the event loop
+
+        :param func: The callable
+        :return: Its result
+        """
+        return await self._loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    def add_close_callback(self, on_close: Callable[[], Awaitable[None]]):
+        self._on_close.append(on_close)
+
+
+class AsyncTask(Task):
+    """
+    Task whose work is a coroutine run on a shared runtime. The coroutine updates the status text as it
+    progresses, and the monitor is notified of every update rather than the task being polled
+    """
+
+    def __init__(self, runtime: AsyncRuntime):
+        self._runtime = runtime
+        self._status = TaskStatus.IDLE
+        self._status_text = ''
+        self._logs = ''
+        self._future = None  # type: Optional[Future]
+
+    @property
+    def status(self) -> TaskStatus:
+        return self._status
+
+    @property
+    def status_text(self) -> str:
+        return self._status_text
+
+    @property
+    def logs_text(self) -> str:
+        return self._logs
+
+    @abstractmethod
+    async def run(self):
+        pass
+
+    def on_complete(self):
+        # called from the monitor thread once the coroutine has completed successfully
+        pass
+
+    def set_status_text(self, status_text: str):
+        self._status_text = status_text
+        self._notify()
+
+    def poll(self):
+        if self.is_done:
+            return
+
+        if self._future is None:
+            self._status = TaskStatus.IN_PROGRESS
+            self._future = self._runtime.submit(self.run())
+            self._future.add_done_callback(lambda _: self._notify())
+            return
+
+        if not self._future.done():
+            return
+
+        try:
+            self._future.result()
+            self.on_complete()
+        except Exception as ex:  # pylint: disable=broad-except
+            self._logs = f'{type(ex).__name__}: {ex}'
+            self._finished(False)
+            return
+
+        self._finished(True)
+
+    def _finished(self, success: bool):
+        self._status = TaskStatus.COMPLETE if success else TaskStatus.FAILED
+        self._status_text = ''
+
+    def teardown(self):
+        if self._future is not None:
+            self._future.cancel()
@@ -0,0 +1,263 @@
+import hashlib
+import os
+import queue
+import shlex
+import tempfile
+import threading
+from typing import Dict, Iterator, List, Optional, Union
+from uuid import uuid4
+
+from docker import from_env
+from docker.errors import APIError, NotFound
+from docker.models.containers import Container
+from docker.types import Mount
+from jenesis.tasks.logs import LogBuffer
+
+BUILDER_LABEL = "jenesis.builder"
+DEFAULT_BUILDER_IDLE_TIMEOUT = 600
+HEARTBEAT_PATH = "/tmp/jenesis-builder-heartbeat"
+HEARTBEAT_INTERVAL = 5
+MAX_PENDING_CHUNKS = 256
+
+
+def _watchdog_script(idle_timeout: int) -> str:
+    # keeps the builder alive until no command has touched the heartbeat file for the idle timeout
+    return (
+        f"touch {HEARTBEAT_PATH}; "
+        f"while [ $(( $(date +%s) - $(stat -c %Y {HEARTBEAT_PATH}) )) -lt {int(idle_timeout)} ]; "
+        f"do sleep {HEARTBEAT_INTERVAL}; done"
+    )
+
+
+def _exec_script(command: List[str], pid_path: str) -> str:
+    # refresh the heartbeat for the whole duration of the command so long builds are not reaped. The pid of
+    # the command is recorded so that it can be stopped without stopping the builder
+    return (
+        f"(while true; do touch {HEARTBEAT_PATH}; sleep {HEARTBEAT_INTERVAL}; done) & heartbeat=$!; "
+        f"{' '.join(shlex.quote(arg) for arg in command)} & pid=$!; echo $pid > {pid_path}; "
+        f"wait $pid; status=$?; "
+        f"kill $heartbeat; rm -f {pid_path}; touch {HEARTBEAT_PATH}; exit $status"
+    )
+
+
+def _kill_script(pid_path: str) -> str:
+    # stops the command along with all of its descendants, the descendants first so that none are orphaned
+    return (
+        "kill_tree() { for child in $(cat /proc/$1/task/*/children 2>/dev/null); do kill_tree $child; done; "
+        "kill -TERM $1 2>/dev/null; }; "
+        f"if [ -f {pid_path} ]; then kill_tree $(cat {pid_path}); fi"
+    )
+
+
+class BuilderExec:
+    """
+    A single command running inside a warm builder container. This presents the subset of
+    the docker Container interface that is used by the ContainerTask (wait, logs, remove and kill)
+    so that the build tasks can treat it in the same way as a dedicated build container.
+    The output is handed to the consumer that follows it as it arrives, rather than being kept
+    in memory, and the complete output is spilled to a temporary file until the exec is removed.
+    """
+
+    def __init__(self, builder: Container, command: List[str], working_dir: str,
+                 environment: Optional[Dict[str, str]] = None):
+        self._builder = builder
+        self._api = builder.client.api
+        self._pid_path = f"/tmp/jenesis-exec-{uuid4().hex}.pid"
+        self._exec_id = self._api.exec_create(
+            builder.id, ["/bin/sh", "-c", _exec_script(command, self._pid_path)], workdir=working_dir,
+            environment=environment,
+        )["Id"]
+
+        (spill_fd, self._spill_path) = tempfile.mkstemp(prefix="jenesis-exec-", suffix=".log")
+        os.close(spill_fd)
+        self._output = LogBuffer(spill_path=self._spill_path)
+        self._chunks = queue.Queue(maxsize=MAX_PENDING_CHUNKS)  # type: queue.Queue
+        self._followed = threading.Event()
+        self._reader = threading.Thread(
+            target=self._read_output,
+            args=(self._api.exec_start(self._exec_id, stream=True),),
+            name=f"BuilderExec-{self._exec_id[:12]}",
+            daemon=True,
+        )
+        self._reader.start()
+
+    def _read_output(self, stream):
+        try:
+            for chunk in stream:
+                self._output.write(chunk)
+                self._hand_over(chunk)
+        finally:
+            self._output.close()
+            self._hand_over(None)
+
+    def _hand_over(self, chunk: Optional[bytes]):
+        # until the output is followed only the latest chunks are kept, after that the consumer sets the pace
+        while not self._followed.is_set():
+            try:
+                self._chunks.put_nowait(chunk)
+                return
+            except queue.Full:
+                try:
+                    self._chunks.get_nowait()
+                except queue.Empty:
+                    pass
+        self._chunks.put(chunk)
+
+    def _follow_output(self) -> Iterator[bytes]:
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    def _read_spilled_output(self) -> bytes:
+        spill_path = self._output.spill_path
+        if spill_path is None:
+            # the output could not be spilled to disk, so only its most recent lines are available
+            return self._output.text.encode()
+
+        try:
+            with open(spill_path, "rb") as spill_file:
+                return spill_file.read()
+        except OSError:
+            return b""
+
+    def wait(self) -> dict:
+        # the output stream is closed by docker once the command has finished
+        self._reader.join()
+        info = self._api.exec_inspect(self._exec_id)
+        return {"StatusCode": info["ExitCode"]}
+
+    def logs(self, stream: bool = False, follow: bool = False) -> Union[bytes, Iterator[bytes]]:
+        # the output can only be followed by a single consumer
+        if stream and follow:
+            self._followed.set()
+            return self._follow_output()
+
+        output = self._read_spilled_output()
+        return iter([output]) if stream else output
+
+    def remove(self):
+        # the builder container is kept alive so that it can be reused by later builds
+        try:
+            os.remove(self._spill_path)
+        except OSError:
+            pass
+
+    def kill(self):
+        # docker can not signal an individual exec, so the command is stopped from a second exec
+        try:
+            kill_id = self._api.exec_create(self._builder.id, ["/bin/sh", "-c", _kill_script(self._pid_path)])["Id"]
+            self._api.exec_start(kill_id)
+        except NotFound:
+            # the builder has already gone away, and the command along with it
+            pass
+        except APIError as ex:
+            # the builder is no longer running
+            if ex.status_code != 409:
+                raise
+
+
+class BuilderPool:
+    """
+    Keeps one long-lived builder container per build image and cargo root. The builders are
+    shared between the compile and schema steps (and subsequent jenesis invocations) and reap
+    themselves once they have been idle for the configured timeout.
+    """
+
+    def __init__(self, idle_timeout: int = DEFAULT_BUILDER_IDLE_TIMEOUT):
+        self._idle_timeout = idle_timeout
+        self._client = None
+        self._builders = {}  # type: Dict[str, Container]
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = from_env()
+        return self._client
+
+    @staticmethod
+    def builder_name(image: str, mounts: List[Mount]) -> str:
+        hasher = hashlib.sha256()
+        hasher.update(image.encode())
+        for mount in sorted(mounts, key=lambda m: m["Target"]):
+            hasher.update(f'{mount["Target"]}={mount["Source"]}'.encode())
+        return f"jenesis-builder-{hasher.hexdigest()[:16]}"
+
+    def _get_running_builder(self, name: str) -> Optional[Container]:
+        try:
+            builder = self.client.containers.get(name)
+        except NotFound:
+            return None
+
+        if builder.status == "running":
+            return builder
+
+        # remove any builder that has been stopped but not yet cleaned up
+        try:
+            builder.remove(force=True)
+        except APIError:
+            pass
+        return None
+
+    def _start_builder(self, name: str, image: str, mounts: List[Mount]) -> Container:
+        try:
+            return self.client.containers.run(
+                image,
+                ["-c", _watchdog_script(self._idle_timeout)],
+                name=name,
+                mounts=mounts,
+                working_dir="/code",
+                entrypoint="/bin/sh",
+                labels={BUILDER_LABEL: "1"},
+                auto_remove=True,
+                detach=True,
+            )
+        except APIError as ex:
+            # another jenesis process might have created the builder in the meantime
+            if ex.status_code != 409:
+                raise
+            return self.client.containers.get(name)
+
+    def acquire(self, image: str, mounts: List[Mount]) -> Container:
+        name = self.builder_name(image, mounts)
+
+        builder = self._builders.get(name)
+        if builder is not None:
+            builder.reload()
+            if builder.status != "running":
+                builder = None
+
+        if builder is None:
+            builder = self._get_running_builder(name) or self._start_builder(name, image, mounts)
+
+        # refresh the heartbeat immediately so the builder is not reaped before the command starts
+        try:
+            builder.exec_run(["touch", HEARTBEAT_PATH])
+        except APIError:
+            # the builder reached its idle timeout in the meantime
+            builder = self._start_builder(name, image, mounts)
+
+        self._builders[name] = builder
+        return builder
+
+    def default_command(self, image: str) -> List[str]:
+        config = self.client.images.get(image).attrs["Config"]
+        return list(config.get("Entrypoint") or []) + list(config.get("Cmd") or [])
+
+    def run(self, image: str, command: Optional[List[str]], mounts: List[Mount], working_dir: str,
+            environment: Optional[Dict[str, str]] = None) -> BuilderExec:
+        """
+        Runs a command inside the warm builder for the specified image and mounts
+
+        :param image: The build image
+        :param command: The command to run. If None then the default entrypoint of the image is used
+        :param mounts: The mounts that the builder requires
+        :param working_dir: The working directory for the command
+        :param environment: Optional environment variables for the command
+        :return: The running command
+        """
+        builder = self.acquire(image, mounts)
+        if command is None:
+            command = self.default_command(image)
+        return BuilderExec(builder, command, working_dir, environment)
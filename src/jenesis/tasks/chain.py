@@ -0,0 +1,74 @@
+from typing import Callable, List, Optional
+
+from jenesis.tasks import Task, TaskStatus
+
+
+class TaskChain(Task):
+    """
+    Runs a sequence of tasks one after the other, presenting them to the monitor as a single
+    task. The next task in the chain is started as soon as the previous one completes and the
+    chain fails as soon as any of its tasks fail.
+    """
+
+    def __init__(self, tasks: List[Task], name: Optional[str] = None):
+        assert len(tasks) > 0
+        self._tasks = tasks
+        self._name = name or tasks[0].name
+        self._index = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def tasks(self) -> List[Task]:
+        return self._tasks
+
+    @property
+    def current(self) -> Task:
+        return self._tasks[self._index]
+
+    @property
+    def status(self) -> TaskStatus:
+        status = self.current.status
+        if status == TaskStatus.IDLE and self._index > 0:
+            return TaskStatus.IN_PROGRESS
+        if status == TaskStatus.COMPLETE and self._index < len(self._tasks) - 1:
+            return TaskStatus.IN_PROGRESS
+        return status
+
+    @property
+    def logs_text(self) -> str:
+        return '\n'.join(filter(None, (task.logs_text for task in self._tasks[:self._index + 1])))
+
+    @property
+    def last_log_line(self) -> str:
+        return self.current.last_log_line
+
+    @property
+    def logs_path(self) -> Optional[str]:
+        return self.current.logs_path
+
+    @property
+    def status_text(self) -> str:
+        return self.current.status_text
+
+    def set_notifier(self, notifier: Optional[Callable[[Task], None]]):
+        super().set_notifier(notifier)
+
+        # progress of any of the chained tasks is reported as progress of the chain
+        for task in self._tasks:
+            task.set_notifier(None if notifier is None else lambda _: self._notify())
+
+    def poll(self):
+        while True:
+            task = self.current
+            task.poll()
+
+            # move straight on to the next task once the current one has completed
+            if not task.is_complete or self._index == len(self._tasks) - 1:
+                return
+            self._index += 1
+
+    def teardown(self):
+        self.current.teardown()
@@ -1,22 +1,47 @@
+import threading
 from abc import abstractmethod
+from typing import Optional
 
 from docker.models.containers import Container
 from docker.errors import DockerException
+from jenesis.cache import state_path
 from jenesis.tasks import Task, TaskStatus
+from jenesis.tasks.logs import LogBuffer
+
+LOG_READER_JOIN_TIMEOUT = 5.0
 
 class ContainerTask(Task):
 
-    def __init__(self):
+    def __init__(self, project_path: Optional[str] = None):
+        self._project_path = project_path
         self._build_image = None
         self._container = None
         self._status = TaskStatus.IDLE
         self._status_text = ''
         self._in_progress_text = 'Building...'
-        self._logs = ''
+        self._log_suffix = ''
+        self._log_buffer = None  # type: Optional[LogBuffer]
+        self._log_reader = None  # type: Optional[threading.Thread]
+        self._exit_code = None  # type: Optional[int]
+        self._waiter = None  # type: Optional[threading.Thread]
 
     @property
     def logs_text(self) -> str:
-        return self._logs
+        if self._log_buffer is None or not (self._show_logs() or self.is_failed):
+            return ''
+        return self._log_buffer.text
+
+    @property
+    def last_log_line(self) -> str:
+        if self._log_buffer is None or not self._show_logs():
+            return ''
+        return self._log_buffer.last_line
+
+    @property
+    def logs_path(self) -> Optional[str]:
+        if self._log_buffer is None or not self._log_buffer.is_truncated:
+            return None
+        return self._log_buffer.spill_path
 
     @property
     def status_text(self) -> str:
@@ -43,6 +68,8 @@ class ContainerTask(Task):
                 self._container = self._schedule_container()
                 self._status = TaskStatus.IN_PROGRESS
                 self._status_text = self._in_progress_text
+                self._start_log_reader()
+                self._start_waiter()
             except DockerException:
                 print("Error: looks like your docker setup isn't right, please visit https://jenesis.fetch.ai/ for more information")
                 self._container = None
@@ -55,31 +82,96 @@ class ContainerTask(Task):
 
         assert self._container is not None
 
-        # check on the progress of the container
-        self._container.reload()
-
-        if self._show_logs():
-            log_text = self._container.logs().decode("utf-8")
-            self._logs = log_text
-
-        if self._container.status == 'exited':
-            exit_code = int(self._container.attrs['State']['ExitCode'])
+        # the waiter thread records the exit code once docker reports that the container has finished
+        exit_code = self._exit_code
+        if exit_code is not None:
+            self._finish_logs()
             if exit_code == 0:
+                self._on_success()
                 self._status = TaskStatus.COMPLETE
                 self._status_text = ''
             else:
+                self._read_failure_logs()
                 self._status = TaskStatus.FAILED
                 self._status_text = ''
-                log_text = self._container.logs().decode("utf-8")
-                self._logs = log_text
             self._container.remove()
 
+    def _start_log_reader(self):
+        # when the logs are not shown they are only fetched if the container fails
+        if not self._show_logs():
+            return
+
+        log_path = None
+        if self._project_path is not None:
+            log_path = state_path(self._project_path, 'logs', f'{self.name}{self._log_suffix}.log')
+        self._log_buffer = LogBuffer(spill_path=log_path)
+        self._log_reader = threading.Thread(
+            target=self._read_logs,
+            args=(self._container, self._log_buffer),
+            name=f'ContainerLogs-{self.name}',
+            daemon=True,
+        )
+        self._log_reader.start()
+
+    @staticmethod
+    def _read_logs(container: Container, log_buffer: LogBuffer):
+        try:
+            for chunk in container.logs(stream=True, follow=True):
+                log_buffer.write(chunk)
+        except Exception:
+            # the container has gone away, whatever was captured so far is kept
+            pass
+
+    def _read_failure_logs(self):
+        if self._log_buffer is not None:
+            return
+
+        self._log_buffer = LogBuffer()
+        try:
+            self._log_buffer.write(self._container.logs())
+        except Exception:
+            # the container has gone away, so there are no logs to show
+            pass
+        self._log_buffer.close()
+
+    def _finish_logs(self):
+        # the log stream ends with the container, so this only waits for the final chunks
+        if self._log_reader is not None:
+            self._log_reader.join(timeout=LOG_READER_JOIN_TIMEOUT)
+        if self._log_buffer is not None:
+            self._log_buffer.close()
+
+    def _start_waiter(self):
+        self._waiter = threading.Thread(
+            target=self._wait_for_exit,
+            args=(self._container,),
+            name=f'ContainerWait-{self.name}',
+            daemon=True,
+        )
+        self._waiter.start()
+
+    def _wait_for_exit(self, container: Container):
+        try:
+            result = container.wait()
+            exit_code = int(result.get('StatusCode', -1))
+        except Exception:
+            # the container could not be waited on (e.g. it was killed or removed during teardown)
+            exit_code = -1
+
+        self._exit_code = exit_code
+        self._notify()
+
     def teardown(self):
         if self._container and self._status == TaskStatus.IN_PROGRESS:
             print(f'Stopping build container for {self.name}...')
             self._container.kill()
             print(f'Removing build container for {self.name}...')
             self._container.remove()
+            if self._log_buffer is not None:
+                self._log_buffer.close()
+
+    def _on_success(self):
+        pass
 
     @abstractmethod
     def _is_out_of_date(self) -> bool:
@@ -0,0 +1,92 @@
+import codecs
+import os
+import threading
+from collections import deque
+from typing import Optional
+
+DEFAULT_MAX_LOG_LINES = 200
+
+
+class LogBuffer:
+    """
+    Bounded, incrementally updated view of a task's log output. Only the most recent lines are
+    kept in memory while the complete log is (optionally) spilled to a file on disk.
+    """
+
+    def __init__(self, max_lines: int = DEFAULT_MAX_LOG_LINES, spill_path: Optional[str] = None):
+        self._lines = deque(maxlen=max_lines)
+        self._partial = ''
+        self._last_line = ''
+        self._line_count = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._lock = threading.Lock()
+        self._spill_path = spill_path
+        self._spill_file = None
+
+    @property
+    def spill_path(self) -> Optional[str]:
+        return self._spill_path
+
+    @property
+    def last_line(self) -> str:
+        return self._last_line
+
+    @property
+    def is_truncated(self) -> bool:
+        return self._line_count > len(self._lines)
+
+    @property
+    def text(self) -> str:
+        with self._lock:
+            lines = list(self._lines)
+            if self._partial:
+                lines.append(self._partial)
+        lines = lines[-self._lines.maxlen:]
+        return '\n'.join(lines)
+
+    def write(self, data: bytes):
+        self._spill(data)
+
+        text = self._decoder.decode(data)
+        if not text:
+            return
+
+        with self._lock:
+            lines = (self._partial + text).split('\n')
+            self._partial = lines.pop()
+            for line in lines:
+                self._append(line.rstrip('\r'))
+            if self._partial.strip():
+                self._last_line = self._partial.rstrip('\r')
+
+    def close(self):
+        with self._lock:
+            if self._partial:
+                self._append(self._partial.rstrip('\r'))
+                self._partial = ''
+
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def _append(self, line: str):
+        self._lines.append(line)
+        self._line_count += 1
+        if line.strip():
+            self._last_line = line
+
+    def _spill(self, data: bytes):
+        if self._spill_path is None:
+            return
+
+        if self._spill_file is None:
+            try:
+                os.makedirs(os.path.dirname(self._spill_path), exist_ok=True)
+                self._spill_file = open(self._spill_path, 'wb')  # pylint: disable=consider-using-with
+            except OSError:
+                # the log is still available in memory, so simply stop spilling to disk
+                self._spill_path = None
+                return
+
+        self._spill_file.write(data)
+        self._spill_file.flush()
@@ -1,11 +1,16 @@
+import queue
 import sys
-import time
-from typing import List, Optional, Tuple, Dict
+from collections import deque
+from typing import Any, Callable, Deque, Iterable, List, Optional, Tuple, Dict
 
 from blessings import Terminal
 
 from jenesis.tasks import Task
 
+DEFAULT_REFRESH_INTERVAL = 0.2
+
+TaskKey = Tuple[Optional[str], str]  # the group and name of a task
+
 
 class TaskStatusDisplay:
     COMPLETE = -1
@@ -22,105 +27,225 @@ class TaskStatusDisplay:
         '⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏',
     )
 
+    QUEUED_TEXT = 'Queued...'
+
     def __init__(self):
         self._term = Terminal()
         self._first_render = True
+        self._rendered_rows = 0
         self._name_length = 0
-        self._task_progress = {}  # type: Dict[str, int]
-        self._task_status_text = {}  # type: Dict[str, Optional[str]]
-        self._log = {}
+        self._task_progress = {}  # type: Dict[TaskKey, int]
+        self._task_status_text = {}  # type: Dict[TaskKey, Optional[str]]
+        self._log = {}  # type: Dict[TaskKey, str]
 
-    def update(self, task: Task):
+    def update(self, task: Task, queued: bool = False):
         self._name_length = max(self._name_length, len(task.name))
+        key = (task.group, task.name)
 
         # update the progress for this task
-        progress = self._task_progress.get(task.name, 0)
+        progress = self._task_progress.get(key, 0)
         status_text = None
         if task.is_complete:
             progress = self.COMPLETE
         elif task.is_failed:
             progress = self.FAILED
+        elif queued:
+            status_text = self.QUEUED_TEXT
         else:
             progress = (progress + 1) % len(self.IN_PROGRESS_GLYPHS)
             status_text = task.status_text
 
         # update the status dictionaries
-        self._task_progress[task.name] = progress
-        self._task_status_text[task.name] = status_text
-        self._log[task.name] = task.logs_text
+        self._task_progress[key] = progress
+        self._task_status_text[key] = status_text
+        self._log[key] = task.last_log_line
+
+    def update_queued(self, tasks: Iterable[Task]):
+        for task in tasks:
+            self.update(task, queued=True)
 
     def render(self):
+        rows = self._render_rows()
 
-        # add the terminal blanking on the first render
+        # add the terminal blanking on the first render (and for any rows added since)
         if self._first_render:
-            for _ in range(len(self._task_progress) + 1):
-                print()
+            print()
+        for _ in range(len(rows) - self._rendered_rows):
+            print()
+        self._rendered_rows = len(rows)
 
         # move the cursor up
-        for _ in range(len(self._task_progress)):
+        for _ in range(len(rows)):
             sys.stdout.write(self._term.move_up)
 
-        for name, progress in self._task_progress.items():
+        width = self._term.width if self._term.is_a_tty else 80
+        for row in rows:
+            print(row.ljust(width))
 
-            # select the progress text
-            if progress == self.COMPLETE:
-                glyph = self._term.green(self.COMPLETE_GLYPH)
-                progress_text = self._term.green('complete')
-            elif progress == self.FAILED:
-                glyph = self._term.red(self.FAILED_GLYPH)
-                progress_text = self._term.red('FAILED')
-            else:
-                glyph = self._term.magenta(self.IN_PROGRESS_GLYPHS[progress])
-                if self._log[name]:
-                    progress_text = self._log[name].splitlines()[-1]
-                else:
-                    progress_text = self._task_status_text[name]
+        self._first_render = False
 
-            # render the status
-            width = self._term.width if self._term.is_a_tty else 80
-            print(f'  {glyph} {self._term.blue(name)}: {progress_text}'.ljust(width))
+    def _render_rows(self) -> List[str]:
+        groups = {}  # type: Dict[Optional[str], List[TaskKey]]
+        for key in self._task_progress:
+            groups.setdefault(key[0], []).append(key)
+
+        # the tasks are only shown under their groups when there is more than one
+        show_groups = len(groups) > 1
+
+        rows = []
+        for (group, keys) in groups.items():
+            indent = '  '
+            if show_groups:
+                rows.append(f'  {self._term.bold(group or "other")}:')
+                indent = '    '
+            rows.extend(indent + self._render_task(key) for key in keys)
+        return rows
+
+    def _render_task(self, key: TaskKey) -> str:
+        progress = self._task_progress[key]
+
+        # select the progress text
+        if progress == self.COMPLETE:
+            glyph = self._term.green(self.COMPLETE_GLYPH)
+            progress_text = self._term.green('complete')
+        elif progress == self.FAILED:
+            glyph = self._term.red(self.FAILED_GLYPH)
+            progress_text = self._term.red('FAILED')
+        else:
+            glyph = self._term.magenta(self.IN_PROGRESS_GLYPHS[progress])
+            if self._log[key]:
+                progress_text = self._log[key]
+            else:
+                progress_text = self._task_status_text[key]
 
-        self._first_render = False
+        return f'{glyph} {self._term.blue(key[1])}: {progress_text}'
 
     def show_logs(self, task: Task):
-        if self._log[task.name]:
-            print(f'\n{self._term.green("Logs for")} {self._term.blue(task.name)}:')
-            print(self._term.yellow(self._log[task.name]))
+        logs_text = task.logs_text
+        if logs_text:
+            name = task.name if task.group is None else f'{task.name} ({task.group})'
+            print(f'\n{self._term.green("Logs for")} {self._term.blue(name)}:')
+            if task.logs_path is not None:
+                print(self._term.green(f'(showing the most recent output, full logs in {task.logs_path})'))
+            print(self._term.yellow(logs_text))
+
+
+def _has_free_slot(tasks: List[Task], max_parallel: Optional[int]) -> bool:
+    return max_parallel is None or len(tasks) < max_parallel
+
 
+def _poll_tasks(
+    tasks: List[Task],
+    display: TaskStatusDisplay,
+    completed_tasks: List[Task],
+    failed_tasks: List[Task],
+) -> List[Task]:
+    in_progress_tasks = []
+    for task in tasks:
 
-def run_tasks(tasks: List[Task], poll_interval: Optional[float] = None) -> Tuple[List[Task], List[Task]]:
+        # query / process the task
+        task.poll()
+
+        # update the task
+        display.update(task)
+
+        # check the status of the task
+        if task.is_complete:
+            completed_tasks.append(task)
+        elif task.is_failed:
+            failed_tasks.append(task)
+        else:
+            in_progress_tasks.append(task)
+
+    return in_progress_tasks
+
+
+def _report_wave(completed_tasks: List[Task], on_wave_complete: Optional[Callable[[List[Task]], None]]):
+    if on_wave_complete is not None and len(completed_tasks) > 0:
+        on_wave_complete(completed_tasks)
+
+
+def _queue_follow_up_tasks(
+    completed_tasks: List[Task],
+    on_complete: Optional[Callable[[Task], Iterable[Task]]],
+    queued_tasks: Deque[Task],
+    notifier: Callable[[Task], None],
+    priority: Optional[Callable[[Task], Any]],
+) -> Deque[Task]:
+    if on_complete is None:
+        return queued_tasks
+
+    for task in completed_tasks:
+        for follow_up_task in on_complete(task):
+            follow_up_task.set_notifier(notifier)
+            queued_tasks.append(follow_up_task)
+
+    if priority is not None:
+        queued_tasks = deque(sorted(queued_tasks, key=priority))
+    return queued_tasks
+
+
+def run_tasks(
+    tasks: List[Task],
+    poll_interval: Optional[float] = None,
+    max_parallel: Optional[int] = None,
+    priority: Optional[Callable[[Task], Any]] = None,
+    on_complete: Optional[Callable[[Task], Iterable[Task]]] = None,
+    on_wave_complete: Optional[Callable[[List[Task]], None]] = None,
+) -> Tuple[List[Task], List[Task]]:
+    """
+    Runs the specified tasks to completion, displaying their progress
+
+    :param tasks: The tasks to run
+    :param poll_interval: The max interval between display refreshes
+    :param max_parallel: The max number of tasks in flight. Queued tasks are started as soon as a slot frees up. If
+                         None then all the tasks are run in parallel
+    :param priority: Optional sort key for the tasks, tasks with the lowest key are started first
+    :param on_complete: Optional callback invoked as each task completes. Any tasks that it returns are
+                        queued and run alongside the remaining tasks
+    :param on_wave_complete: Optional callback invoked with the tasks that completed since the last refresh,
+                             before any of the tasks that follow them are queued
+    :return: The list of completed tasks and the list of failed tasks
+    """
 
     if len(tasks) == 0:
         return [], []
 
     assert len(tasks) > 0
+    assert max_parallel is None or max_parallel > 0
 
-    poll_interval = poll_interval or 0.1
+    # the poll interval bounds how long the monitor blocks between display refreshes. Tasks notify
+    # the monitor (via the wakeup queue) as soon as they progress, so they are not repeatedly polled
+    poll_interval = poll_interval or DEFAULT_REFRESH_INTERVAL
 
     display = TaskStatusDisplay()
 
+    wakeups = queue.Queue()  # type: queue.Queue
+    for task in tasks:
+        task.set_notifier(wakeups.put)
+
+    queued_tasks = deque(sorted(tasks, key=priority) if priority is not None else tasks)
+    tasks = []
+
     completed_tasks = []
     failed_tasks = []
 
     try:
         while True:
 
-            in_progress_tasks = []
-            for task in tasks:
+            # start as many queued tasks as there are free slots
+            while len(queued_tasks) > 0 and _has_free_slot(tasks, max_parallel):
+                tasks.append(queued_tasks.popleft())
 
-                # query / process the task
-                task.poll()
+            completed_count = len(completed_tasks)
+            in_progress_tasks = _poll_tasks(tasks, display, completed_tasks, failed_tasks)
 
-                # update the task
-                display.update(task)
+            just_completed = completed_tasks[completed_count:]
+            _report_wave(just_completed, on_wave_complete)
 
-                # check the status of the task
-                if task.is_complete:
-                    completed_tasks.append(task)
-                elif task.is_failed:
-                    failed_tasks.append(task)
-                else:
-                    in_progress_tasks.append(task)
+            # queue any tasks that were waiting for the tasks that have just completed
+            queued_tasks = _queue_follow_up_tasks(just_completed, on_complete, queued_tasks, wakeups.put, priority)
+            display.update_queued(queued_tasks)
 
             # update the display
             display.render()
@@ -129,19 +254,42 @@ def run_tasks(tasks: List[Task], poll_interval: Optional[float] = None) -> Tuple
             tasks = in_progress_tasks
 
             # exit if all the tasks are now complete
-            if len(tasks) == 0:
+            if len(tasks) == 0 and len(queued_tasks) == 0:
                 break
 
-            time.sleep(poll_interval)
+            # start the next queued tasks straight away if any slots have been freed
+            if len(queued_tasks) > 0 and _has_free_slot(tasks, max_parallel):
+                continue
+
+            _wait_for_wakeup(wakeups, poll_interval)
 
         for task in failed_tasks + completed_tasks:
             display.show_logs(task)
 
     except KeyboardInterrupt:
+        tasks = tasks + list(queued_tasks)
         print('\nKeyboardInterrupt: shutting down all tasks...')
         for task in tasks:
             task.teardown()
         print('KeyboardInterrupt: shutting down all tasks...complete')
         sys.exit(1)
 
+    finally:
+        for task in completed_tasks + failed_tasks + tasks + list(queued_tasks):
+            task.set_notifier(None)
+
     return completed_tasks, failed_tasks
+
+
+def _wait_for_wakeup(wakeups: queue.Queue, timeout: float):
+    try:
+        wakeups.get(timeout=timeout)
+    except queue.Empty:
+        return
+
+    # collapse any other notifications that have arrived since they all trigger the same poll
+    while True:
+        try:
+            wakeups.get_nowait()
+        except queue.Empty:
+            return
@@ -1,15 +1,7 @@
 import fnmatch
 import os
 
-from typing import Any, List, Optional
-
-
-def chunks(values: List[Any], batch_size: Optional[int]):
-    if batch_size is None:
-        yield values
-    else:
-        for i in range(0, len(values), batch_size):
-            yield values[i:i + batch_size]
+from typing import List
 
 
 def get_files(paths: List[str], suffix: str):
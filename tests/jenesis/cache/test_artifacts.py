@@ -0,0 +1,77 @@
+import os
+from tempfile import mkdtemp
+
+from jenesis.cache.artifacts import ArtifactStore
+from jenesis.cache.build import BuildManifest, compute_file_digest
+
+
+def _write(path: str, contents: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as output_file:
+        output_file.write(contents)
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as input_file:
+        return input_file.read()
+
+
+def test_manifest_restores_artifacts_of_previous_builds():
+    root = mkdtemp(prefix="jenesis-", suffix="-artifacts")
+    binary_path = os.path.join(root, "contracts", "counter", "artifacts", "counter.wasm")
+    manifest = BuildManifest.load(root, ArtifactStore.for_project(root))
+
+    # build the contract on two different branches
+    _write(binary_path, b"release-1")
+    manifest.record_artifacts("key-1", [binary_path])
+    _write(binary_path, b"release-2")
+    manifest.record_artifacts("key-2", [binary_path])
+    manifest.save()
+
+    # switching back to the first branch restores its binary
+    manifest = BuildManifest.load(root, ArtifactStore.for_project(root))
+    assert not manifest.is_up_to_date("key-1", [binary_path])
+    assert manifest.restore("key-1", [binary_path])
+    assert _read(binary_path) == b"release-1"
+    assert manifest.is_up_to_date("key-1", [binary_path])
+
+    # unknown builds can not be restored
+    assert not manifest.restore("key-3", [binary_path])
+
+
+def test_manifest_does_not_restore_damaged_artifacts():
+    root = mkdtemp(prefix="jenesis-", suffix="-artifacts")
+    binary_path = os.path.join(root, "artifacts", "counter.wasm")
+    store = ArtifactStore.for_project(root)
+    manifest = BuildManifest.load(root, store)
+
+    _write(binary_path, b"release-1")
+    manifest.record_artifacts("key-1", [binary_path])
+
+    digest = compute_file_digest(binary_path)
+    _write(os.path.join(store.path, f"{digest}.wasm"), b"damaged")
+    os.remove(binary_path)
+
+    assert not manifest.restore("key-1", [binary_path])
+
+
+def test_store_evicts_least_recently_used_artifacts():
+    root = mkdtemp(prefix="jenesis-", suffix="-artifacts")
+    store = ArtifactStore(os.path.join(root, "store"), max_size=20)
+
+    for name in ["a", "b", "c"]:
+        _write(os.path.join(root, f"{name}.wasm"), name.encode() * 8)
+
+    for index, name in enumerate(["a", "b"]):
+        store.add(os.path.join(root, f"{name}.wasm"), name)
+
+        # make the ordering of the entries explicit rather than relying on the timer resolution
+        os.utime(os.path.join(store.path, f"{name}.wasm"), (index, index))
+
+    # using an entry makes it the most recently used
+    assert store.restore("a", os.path.join(root, "restored.wasm"))
+
+    store.add(os.path.join(root, "c.wasm"), "c")
+    assert store.contains("a")
+    assert not store.contains("b")
+    assert store.contains("c")
@@ -0,0 +1,83 @@
+import os
+from tempfile import mkdtemp
+
+from jenesis.cache.build import BuildManifest, compute_artifact_digests, compute_build_key
+from jenesis.contracts.build import get_build_inputs
+
+
+def _write(path: str, contents: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as output_file:
+        output_file.write(contents)
+
+
+def _make_crate(root: str) -> str:
+    crate_path = os.path.join(root, "contracts", "counter")
+    _write(os.path.join(crate_path, "Cargo.toml"), '[package]\nname = "counter"\n\n[dependencies]\nshared = { path = "../../packages/shared" }\n')
+    _write(os.path.join(crate_path, "Cargo.lock"), "# lock\n")
+    _write(os.path.join(crate_path, "src", "lib.rs"), "pub mod contract;\n")
+    _write(os.path.join(crate_path, "src", "contract.rs"), "// contract\n")
+    _write(os.path.join(root, "packages", "shared", "Cargo.toml"), '[package]\nname = "shared"\n')
+    _write(os.path.join(root, "packages", "shared", "src", "lib.rs"), "// shared\n")
+    return crate_path
+
+
+def _build_key(crate_path: str, optimize: bool = False) -> str:
+    return compute_build_key(crate_path, get_build_inputs([crate_path], crate_path), "image:1", optimize)
+
+
+def test_build_inputs_include_manifests_and_path_dependencies():
+    root = mkdtemp(prefix="jenesis-", suffix="-build")
+    crate_path = _make_crate(root)
+
+    inputs = {os.path.relpath(path, root) for path in get_build_inputs([crate_path], crate_path)}
+
+    assert inputs == {
+        os.path.join("contracts", "counter", "Cargo.toml"),
+        os.path.join("contracts", "counter", "Cargo.lock"),
+        os.path.join("contracts", "counter", "src", "lib.rs"),
+        os.path.join("contracts", "counter", "src", "contract.rs"),
+        os.path.join("packages", "shared", "Cargo.toml"),
+        os.path.join("packages", "shared", "src", "lib.rs"),
+    }
+
+
+def test_build_key_tracks_content_not_timestamps():
+    root = mkdtemp(prefix="jenesis-", suffix="-build")
+    crate_path = _make_crate(root)
+    source_path = os.path.join(crate_path, "src", "contract.rs")
+
+    original_key = _build_key(crate_path)
+
+    # touching a file does not change the key
+    os.utime(source_path, (0, 0))
+    assert _build_key(crate_path) == original_key
+
+    # the build flags and every kind of input do
+    assert _build_key(crate_path, optimize=True) != original_key
+
+    _write(os.path.join(crate_path, "Cargo.lock"), "# updated lock\n")
+    lock_key = _build_key(crate_path)
+    assert lock_key != original_key
+
+    _write(os.path.join(root, "packages", "shared", "src", "lib.rs"), "// updated shared\n")
+    assert _build_key(crate_path) not in (original_key, lock_key)
+
+
+def test_manifest_round_trip():
+    root = mkdtemp(prefix="jenesis-", suffix="-build")
+    artifact_path = os.path.join(root, "artifacts", "counter.wasm")
+    _write(artifact_path, "wasm")
+
+    manifest = BuildManifest.load(root)
+    assert not manifest.is_up_to_date("key", [artifact_path])
+
+    manifest.record("key", compute_artifact_digests([artifact_path]))
+    manifest.save()
+
+    manifest = BuildManifest.load(root)
+    assert manifest.is_up_to_date("key", [artifact_path])
+
+    # a modified artifact no longer matches the recorded build
+    _write(artifact_path, "modified wasm")
+    assert not manifest.is_up_to_date("key", [artifact_path])
@@ -0,0 +1,154 @@
+import hashlib
+from tempfile import mkdtemp
+from unittest import mock
+
+import grpc
+import pytest
+import cosmpy.aerial.client  # pylint: disable=unused-import  (loads the cosmpy protos in the right order)
+from cosmpy.protos.cosmwasm.wasm.v1.query_pb2 import CodeInfoResponse, QueryCodeResponse, QueryCodesResponse
+
+from jenesis.cache.code_ids import CodeIdIndex, DatabaseCodeIdIndex
+
+
+def _digest(code_id: int) -> bytes:
+    return hashlib.sha256(f"code-{code_id}".encode()).digest()
+
+
+class FakeWasmQuery:
+    PAGE_SIZE = 2
+
+    def __init__(self, num_codes: int):
+        self.codes = {code_id: _digest(code_id) for code_id in range(1, num_codes + 1)}
+        self.requested_keys = []
+        self.error = None
+
+    def Codes(self, req):  # pylint: disable=invalid-name
+        start = int.from_bytes(req.pagination.key, "big") if req.pagination.key else 1
+        self.requested_keys.append(start)
+        code_ids = sorted(code_id for code_id in self.codes if code_id >= start)
+        page, rest = code_ids[:self.PAGE_SIZE], code_ids[self.PAGE_SIZE:]
+
+        resp = QueryCodesResponse()
+        for code_id in page:
+            resp.code_infos.append(CodeInfoResponse(code_id=code_id, data_hash=self.codes[code_id]))
+        if rest:
+            resp.pagination.next_key = rest[0].to_bytes(8, "big")
+        return resp
+
+    def Code(self, req):  # pylint: disable=invalid-name
+        if self.error is not None:
+            raise self.error
+        if req.code_id not in self.codes:
+            raise RuntimeError(f"not found: code {req.code_id}")
+
+        resp = QueryCodeResponse()
+        resp.code_info.code_id = req.code_id
+        resp.code_info.data_hash = self.codes[req.code_id]
+        return resp
+
+
+def test_index_is_built_once_and_synced_incrementally():
+    root = mkdtemp(prefix="jenesis-", suffix="-code-ids")
+    client = mock.Mock()
+    client.wasm = FakeWasmQuery(5)
+
+    index = CodeIdIndex.load(root, "test-1")
+    assert index.find(client, _digest(4)) == 4
+    assert index.last_code_id == 5
+    assert client.wasm.requested_keys == [1, 3, 5]
+
+    # a new code is stored and the index is reloaded by another invocation
+    client.wasm.codes[6] = _digest(6)
+    client.wasm.requested_keys = []
+    index = CodeIdIndex.load(root, "test-1")
+    assert index.find(client, _digest(6)) == 6
+    assert client.wasm.requested_keys == [6]
+
+    # known codes do not require walking the codes on chain
+    client.wasm.requested_keys = []
+    assert index.find(client, _digest(2)) == 2
+    assert client.wasm.requested_keys == []
+
+    # unknown codes only fetch the new codes
+    assert index.find(client, _digest(100)) is None
+    assert client.wasm.requested_keys == [7]
+
+
+def test_index_is_rebuilt_when_the_chain_has_been_reset():
+    client = mock.Mock()
+    client.wasm = FakeWasmQuery(3)
+
+    index = CodeIdIndex("test-1")
+    index.add(_digest(2).hex(), 1)
+
+    assert index.find(client, _digest(2)) == 2
+
+
+class FakeRpcError(grpc.RpcError):
+    def __init__(self, code: grpc.StatusCode, details: str):
+        super().__init__()
+        self._code = code
+        self._details = details
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return self._details
+
+
+def test_index_is_only_rebuilt_when_the_code_is_missing():
+    client = mock.Mock()
+    client.wasm = FakeWasmQuery(3)
+
+    index = CodeIdIndex("test-1")
+    index.add(_digest(2).hex(), 2)
+    index.add(_digest(9).hex(), 9)
+    client.wasm.requested_keys = []
+
+    # a node that is temporarily unavailable does not throw the index away
+    client.wasm.error = FakeRpcError(grpc.StatusCode.UNAVAILABLE, "connection reset")
+    with pytest.raises(grpc.RpcError):
+        index.find(client, _digest(2))
+    assert index.lookup(_digest(2).hex()) == 2
+    assert client.wasm.requested_keys == []
+
+    # a code that no longer exists does
+    client.wasm.error = None
+    assert index.find(client, _digest(9)) is None
+    assert index.lookup(_digest(2).hex()) == 2
+    assert client.wasm.requested_keys == [1, 3]
+
+    client.wasm.error = FakeRpcError(grpc.StatusCode.NOT_FOUND, "no such code")
+    index.add(_digest(9).hex(), 9)
+    assert index.find(client, _digest(9)) is None
+
+
+def test_database_index_keeps_the_sync_position(tmp_path):
+    client = mock.Mock()
+    client.wasm = FakeWasmQuery(3)
+
+    index = DatabaseCodeIdIndex.load(str(tmp_path), "test-1")
+    assert index.find(client, _digest(3)) == 3
+
+    client.wasm.codes[4] = _digest(4)
+    client.wasm.requested_keys = []
+    index = DatabaseCodeIdIndex.load(str(tmp_path), "test-1")
+    assert index.lookup(_digest(2).hex()) == 2
+    assert index.find(client, _digest(4)) == 4
+    assert client.wasm.requested_keys == [4]
+
+    # the indexes of other chains are kept apart
+    assert DatabaseCodeIdIndex.load(str(tmp_path), "test-2").lookup(_digest(2).hex()) is None
+
+
+@pytest.mark.parametrize("backend,index_type", [("json", CodeIdIndex), ("sqlite", DatabaseCodeIdIndex)])
+def test_project_index_uses_the_state_backend_of_the_project(tmp_path, backend, index_type):
+    (tmp_path / "jenesis.toml").write_text(f'[project]\nname = "project"\nstate_backend = "{backend}"\n')
+    client = mock.Mock()
+    client.wasm = FakeWasmQuery(3)
+
+    index = CodeIdIndex.for_project(str(tmp_path), "test-1")
+    assert type(index) is index_type  # pylint: disable=unidiomatic-typecheck
+    assert index.find(client, _digest(3)) == 3
+    assert CodeIdIndex.for_project(str(tmp_path), "test-1").lookup(_digest(2).hex()) == 2
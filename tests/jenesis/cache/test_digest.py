@@ -0,0 +1,73 @@
+import hashlib
+import os
+from tempfile import mkdtemp
+from unittest import mock
+
+from jenesis.cache import digest as digest_module
+from jenesis.cache.digest import DigestCache, MMAP_THRESHOLD, hash_file
+from jenesis.contracts import Contract
+
+
+def _write(path: str, contents: bytes):
+    with open(path, "wb") as output_file:
+        output_file.write(contents)
+
+
+def test_hash_file_matches_sha256_for_small_and_large_files():
+    root = mkdtemp(prefix="jenesis-", suffix="-digest")
+    for size in [0, 10, MMAP_THRESHOLD, MMAP_THRESHOLD * 3 + 7]:
+        path = os.path.join(root, f"{size}.wasm")
+        contents = os.urandom(size)
+        _write(path, contents)
+        assert hash_file(path) == hashlib.sha256(contents).digest()
+
+
+def test_digest_cache_only_hashes_changed_files():
+    root = mkdtemp(prefix="jenesis-", suffix="-digest")
+    path = os.path.join(root, "contract.wasm")
+    _write(path, b"release-1")
+
+    cache = DigestCache.load(root)
+    with mock.patch.object(digest_module, "hash_file", wraps=hash_file) as hasher:
+        assert cache.digest(path) == hashlib.sha256(b"release-1").digest()
+        assert cache.digest(path) == hashlib.sha256(b"release-1").digest()
+        assert hasher.call_count == 1
+
+    # the digests are only written once the cache is saved
+    cache_path = os.path.join(root, ".jenesis", digest_module.DIGEST_CACHE_FILENAME)
+    assert not os.path.exists(cache_path)
+    cache.save()
+    saved_at = os.stat(cache_path).st_mtime_ns
+
+    # the cache is persisted between invocations
+    cache = DigestCache.load(root)
+    with mock.patch.object(digest_module, "hash_file", wraps=hash_file) as hasher:
+        assert cache.digest(path) == hashlib.sha256(b"release-1").digest()
+        assert hasher.call_count == 0
+
+        # a modified file is hashed again
+        _write(path, b"release-2")
+        os.utime(path, ns=(0, 12345))
+        assert cache.digest(path) == hashlib.sha256(b"release-2").digest()
+        assert hasher.call_count == 1
+
+        # an unchanged cache is not written again
+        os.utime(cache_path, ns=(0, saved_at - 1000))
+        DigestCache.load(root).save()
+        assert os.stat(cache_path).st_mtime_ns == saved_at - 1000
+
+
+def test_contracts_use_the_digest_cache_of_their_project():
+    root = mkdtemp(prefix="jenesis-", suffix="-digest")
+    path = os.path.join(root, "contract.wasm")
+    _write(path, b"release-1")
+
+    cache = DigestCache.load(root)
+    contract = Contract("contract", root, path, root, {}, digests=cache)
+    with mock.patch.object(digest_module, "hash_file", wraps=hash_file) as hasher:
+        assert contract.digest() == hashlib.sha256(b"release-1").hexdigest()
+        assert contract.digest() == hashlib.sha256(b"release-1").hexdigest()
+        assert hasher.call_count == 1
+
+    # without a cache the binary is simply hashed
+    assert Contract("contract", root, path, root, {}).digest() == hashlib.sha256(b"release-1").hexdigest()
@@ -11,6 +11,11 @@ class Arguments:
     optimize = ""
     rebuild = ""
     log = ""
+    warm = False
+    warm_timeout = 600
+    order = "default"
+    pipeline = False
+    shared_cache = False
 
 
 def test_attach():
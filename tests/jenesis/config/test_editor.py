@@ -0,0 +1,80 @@
+from unittest import mock
+
+import pytest
+import toml
+
+from jenesis.config import Config
+from jenesis.config.editor import edit_project
+from jenesis.config.lockfile import write_atomically
+
+PROJECT_FILE = """# project settings
+[project]
+name = "project"
+authors = []  # filled in by hand
+
+[profile.testing]
+default = true
+
+[profile.testing.network]
+name = "fetchai-localnode"
+
+[profile.testing.contracts]
+"""
+
+
+class FakeContract:
+    name = "counter"
+
+    @staticmethod
+    def init_args():
+        return ["count"]
+
+
+def _make_project(tmp_path):
+    (tmp_path / "jenesis.toml").write_text(PROJECT_FILE, encoding="utf-8")
+
+
+def test_changes_are_written_once(tmp_path):
+    _make_project(tmp_path)
+
+    with mock.patch("jenesis.config.editor.write_atomically", wraps=write_atomically) as write:
+        with edit_project(str(tmp_path)) as editor:
+            for deployment_name in ("counter_1", "counter_2", "counter_3"):
+                editor.set_deployment("testing", "fetchai-localnode", FakeContract(), deployment_name)
+                editor.set_deployer_key("testing", deployment_name, "alice")
+    assert write.call_count == 1
+
+    text = (tmp_path / "jenesis.toml").read_text(encoding="utf-8")
+    assert "# project settings" in text
+    assert "# filled in by hand" in text
+
+    contracts = toml.loads(text)["profile"]["testing"]["contracts"]
+    assert sorted(contracts) == ["counter_1", "counter_2", "counter_3"]
+    assert contracts["counter_2"] == {
+        "name": "counter_2",
+        "contract": "counter",
+        "network": "fetchai-localnode",
+        "deployer_key": "alice",
+        "init": {"count": ""},
+        "init_funds": "",
+    }
+
+
+def test_unchanged_project_is_not_written(tmp_path):
+    _make_project(tmp_path)
+    Config.update_project(str(tmp_path), "testing", "fetchai-localnode", FakeContract(), "counter")
+
+    with mock.patch("jenesis.config.editor.write_atomically") as write:
+        Config.update_key(str(tmp_path), "testing", "counter", "")
+    assert write.call_count == 0
+
+
+def test_changes_are_discarded_on_error(tmp_path):
+    _make_project(tmp_path)
+
+    with pytest.raises(RuntimeError):
+        with edit_project(str(tmp_path)) as editor:
+            editor.set_deployment("testing", "fetchai-localnode", FakeContract(), "counter")
+            raise RuntimeError()
+
+    assert (tmp_path / "jenesis.toml").read_text(encoding="utf-8") == PROJECT_FILE
@@ -0,0 +1,51 @@
+import toml
+from cosmpy.crypto.address import Address
+
+from jenesis.config import Config, Deployment, Profile
+from jenesis.config.lockfile import LockFileWriter, read_lock_file
+from jenesis.network import fetchai_localnode_config
+
+CONTRACT_ADDRESS = "fetch1qqqsyqcyq5rqwzqfpg9scrgwpugpzysnstc7nw"
+
+
+def _make_config() -> Config:
+    profiles = {}
+    for profile_name in ("testing", "staging"):
+        deployments = {
+            "counter": Deployment("counter", "counter", "localnode", "alice", {}, None, None, None, None, None),
+        }
+        profiles[profile_name] = Profile(profile_name, fetchai_localnode_config(), deployments)
+    return Config("project", [], profiles)
+
+
+def test_updates_are_written_when_flushed(tmp_path):
+    writer = LockFileWriter(_make_config(), str(tmp_path))
+
+    writer.update_deployment("testing", "counter", "ab" * 32, 4, None)
+    writer.update_deployment("testing", "counter", None, None, Address(CONTRACT_ADDRESS))
+    assert not (tmp_path / "jenesis.lock").exists()
+
+    writer.flush()
+    deployment = read_lock_file(str(tmp_path))["profile"]["testing"]["counter"]
+    assert deployment["code_id"] == 4
+    assert deployment["address"] == CONTRACT_ADDRESS
+
+    # no temporary files are left behind
+    assert [path.name for path in tmp_path.iterdir() if path.is_file()] == ["jenesis.lock"]
+
+
+def test_only_updated_profiles_are_written(tmp_path):
+    writer = LockFileWriter(_make_config(), str(tmp_path))
+
+    # another process deploys a different profile in the meantime
+    other = _make_config()
+    other.update_deployment("staging", "counter", "cd" * 32, 7, CONTRACT_ADDRESS)
+    other.save(str(tmp_path), profile_names=["staging"])
+
+    with writer:
+        writer.update_deployment("testing", "counter", "ab" * 32, 4, CONTRACT_ADDRESS)
+
+    with open(tmp_path / "jenesis.lock", "r", encoding="utf-8") as lock_file:
+        profiles = toml.load(lock_file)["profile"]
+    assert profiles["testing"]["counter"]["code_id"] == 4
+    assert profiles["staging"]["counter"]["code_id"] == 7
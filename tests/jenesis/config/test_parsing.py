@@ -27,3 +27,30 @@ def test_prefix_computation(config_contents, lock_contents, err_msg):
     with pytest.raises(ConfigurationError, match=err_msg):
         Config._loads(config_contents, lock_contents)
 
+
+
+def _project_contents(contract_cfg: dict) -> dict:
+    network = vars(fetchai_testnet_config())
+    network["name"] = "fetchai-testnet"
+    return {
+        "project": {"name": "project", "authors": []},
+        "profile": {
+            "testing": {
+                "network": network,
+                "contracts": {"token": dict(contract="token", deployer_key="alice", **contract_cfg)},
+            },
+        },
+    }
+
+
+def test_upgrade_mode_parsing():
+    cfg = Config._loads(_project_contents({}), {})
+    assert not cfg.profiles["testing"].deployments["token"].migrates
+
+    cfg = Config._loads(_project_contents({"upgrade": "migrate", "migrate": {"version": 2}}), {})
+    deployment = cfg.profiles["testing"].deployments["token"]
+    assert deployment.migrates
+    assert deployment.migrate == {"version": 2}
+
+    with pytest.raises(ConfigurationError, match="invalid upgrade mode"):
+        Config._loads(_project_contents({"upgrade": "replace"}), {})
@@ -0,0 +1,84 @@
+import pytest
+import toml
+from cosmpy.crypto.address import Address
+
+from jenesis.cache.state_db import connect_state_db
+from jenesis.config import Config, ConfigurationError, Deployment, Profile
+from jenesis.config.lockfile import LockFileWriter, read_lock_file
+from jenesis.config.state import DeployRecord, SqliteStateStore, create_state_store
+from jenesis.network import fetchai_localnode_config
+
+CONTRACT_ADDRESS = "fetch1qqqsyqcyq5rqwzqfpg9scrgwpugpzysnstc7nw"
+
+
+def _make_config() -> Config:
+    profiles = {}
+    for profile_name in ("testing", "staging"):
+        deployments = {
+            name: Deployment(name, name, "localnode", "alice", {}, None, None, None, None, None)
+            for name in ("counter", "token")
+        }
+        profiles[profile_name] = Profile(profile_name, fetchai_localnode_config(), deployments)
+    return Config("project", [], profiles, state_backend="sqlite")
+
+
+def test_state_is_imported_from_the_lock_file(tmp_path):
+    lock = {"profile": {"testing": {"counter": {"checksum": "aa", "address": CONTRACT_ADDRESS, "code_id": 3}}}}
+    with open(tmp_path / "jenesis.lock", "w", encoding="utf-8") as lock_file:
+        toml.dump(lock, lock_file)
+
+    assert SqliteStateStore(str(tmp_path)).load() == lock
+
+    # the lock file is only imported once
+    with open(tmp_path / "jenesis.lock", "w", encoding="utf-8") as lock_file:
+        toml.dump({"profile": {}}, lock_file)
+    assert SqliteStateStore(str(tmp_path)).load() == lock
+
+
+def test_lock_file_is_imported_into_a_database_created_by_the_code_id_index(tmp_path):
+    lock = {"profile": {"testing": {"counter": {"checksum": "aa", "address": CONTRACT_ADDRESS, "code_id": 3}}}}
+    with open(tmp_path / "jenesis.lock", "w", encoding="utf-8") as lock_file:
+        toml.dump(lock, lock_file)
+
+    connect_state_db(str(tmp_path)).close()
+    assert SqliteStateStore(str(tmp_path)).load() == lock
+
+
+def test_only_updated_deployments_are_written(tmp_path):
+    cfg = _make_config()
+    store = SqliteStateStore(str(tmp_path))
+
+    # another process deploys a different profile in the meantime
+    other = _make_config()
+    other.update_deployment("staging", "token", "cd" * 32, 7, CONTRACT_ADDRESS)
+    other.save(str(tmp_path), profile_names=["staging"])
+
+    with LockFileWriter(cfg, str(tmp_path)) as writer:
+        writer.update_deployment("testing", "counter", "ab" * 32, 4, Address(CONTRACT_ADDRESS))
+        writer.record_history([
+            DeployRecord("testing", "counter", "localnode", "instantiate", "AB12", 200000, 150000,
+                         "2026-01-01T00:00:00+00:00"),
+        ])
+
+    profiles = store.load()["profile"]
+    assert profiles["testing"]["counter"]["code_id"] == 4
+    assert profiles["testing"]["counter"]["address"] == CONTRACT_ADDRESS
+    assert "code_id" not in profiles["testing"]["token"]
+    assert profiles["staging"]["token"]["code_id"] == 7
+
+    assert [record.tx_hash for record in store.history("testing", "counter")] == ["AB12"]
+    assert store.history("staging") == []
+
+    # the state can be exported to the lock file for review
+    store.export()
+    assert read_lock_file(str(tmp_path))["profile"] == profiles
+
+    # deployments that are removed from a profile are removed from the state
+    del cfg.profiles["testing"].deployments["token"]
+    cfg.save(str(tmp_path), profile_names=["testing"])
+    assert set(store.load()["profile"]["testing"]) == {"counter"}
+
+
+def test_invalid_state_backend():
+    with pytest.raises(ConfigurationError, match="invalid state backend"):
+        create_state_store(".", "postgres")
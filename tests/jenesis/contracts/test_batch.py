@@ -0,0 +1,379 @@
+import asyncio
+import gzip
+import hashlib
+import os
+from unittest import mock
+from uuid import uuid4
+
+import pytest
+from cosmpy.aerial.client import Account
+from cosmpy.aerial.exceptions import NotFoundError
+from cosmpy.aerial.tx_helpers import MessageLog, SubmittedTx, TxResponse
+from cosmpy.aerial.wallet import LocalWallet
+from cosmpy.crypto.address import Address
+from cosmpy.crypto.keypairs import PrivateKey
+from cosmpy.protos.cosmwasm.wasm.v1.query_pb2 import CodeInfoResponse, QueryCodeResponse, QueryCodesResponse
+from cosmpy.protos.cosmwasm.wasm.v1.tx_pb2 import MsgStoreCode
+
+from jenesis.cache.code_ids import CodeIdIndex
+from jenesis.config import Deployment, Profile
+from jenesis.contracts import Contract
+from jenesis.contracts.batch import (BatchDeployment, DeployBatchTask, TxUnit, extract_code_ids,
+                                     extract_contract_addresses, pack_units)
+from jenesis.contracts.instantiate2 import predict_address
+from jenesis.contracts.journal import DeployJournal, compute_tx_hash
+from jenesis.contracts.sequence import SequenceManager
+from jenesis.contracts.uploads import CodeUploads
+from jenesis.network import fetchai_localnode_config
+from jenesis.network.aio import AsyncLedger
+from jenesis.tasks.aio import AsyncRuntime
+
+CONTRACT_ADDRESSES = [
+    "fetch1qyqszqgpqyqszqgpqyqszqgpqyqszqgpqyqszqgpqyqszqgpqyqsanhv0t",
+    "fetch1qgpqyqszqgpqyqszqgpqyqszqgpqyqszqgpqyqszqgpqyqszqgpqs9st6r",
+]
+
+
+def _response(logs):
+    return TxResponse(
+        hash="ABC", height=10, code=0, gas_wanted=1, gas_used=1, raw_log="",
+        logs=logs, events={}, timestamp=None,
+    )
+
+
+def test_results_are_extracted_per_message():
+    response = _response([
+        MessageLog(index=1, log="", events={"store_code": {"code_id": "8"}}),
+        MessageLog(index=0, log="", events={"store_code": {"code_id": "7"}}),
+    ])
+    assert extract_code_ids(response) == [7, 8]
+
+    response = _response([
+        MessageLog(index=index, log="", events={"instantiate": {"_contract_address": address, "code_id": "7"}})
+        for (index, address) in enumerate(CONTRACT_ADDRESSES)
+    ])
+    assert [str(address) for address in extract_contract_addresses(response)] == CONTRACT_ADDRESSES
+
+
+def test_missing_message_results_are_errors():
+    with pytest.raises(RuntimeError):
+        extract_code_ids(_response([]))
+
+    with pytest.raises(RuntimeError):
+        extract_code_ids(_response([MessageLog(index=0, log="", events={"message": {}})]))
+
+
+def _store_unit(key, size):
+    msg = MsgStoreCode(sender="fetch1sender", wasm_byte_code=b"\0" * size)
+    return TxUnit(key, [msg], [(key, key)], ["store"])
+
+
+def test_units_are_packed_within_the_byte_limit():
+    units = [_store_unit(str(index), 1000) for index in range(5)]
+    unit_size = units[0].size
+
+    bundles = pack_units(units, 2 * unit_size)
+    assert [[unit.key for unit in bundle] for bundle in bundles] == [["0", "1"], ["2", "3"], ["4"]]
+
+    # a unit over the limit is still sent, by itself
+    bundles = pack_units(units, unit_size // 2)
+    assert [len(bundle) for bundle in bundles] == [1] * 5
+
+    assert len(pack_units(units, None)) == 1
+    assert not pack_units([], unit_size)
+
+
+GAS_PER_MESSAGE = 100000
+
+
+class FakeChain:
+    """
+    Ledger client of an in-memory chain, that executes the wasm messages of each transaction as soon as it is
+    broadcast. A transaction with a message that fails has no effect
+    """
+
+    def __init__(self, max_gas=None):
+        self.network_config = fetchai_localnode_config()
+        self.network_config.chain_id = f"batch-{uuid4().hex}"
+        self.wasm = self
+        self.max_gas = max_gas
+        self.codes = {}  # code id -> checksum
+        self.contracts = {}  # address -> code id
+        self.transactions = []  # the message types of each transaction, in the order they were executed
+        self.interleaved = []  # binaries stored by someone else just before the next transactions
+        self._responses = {}
+        self._sequences = {}
+
+    def store(self, binary: bytes) -> int:
+        code_id = max(self.codes, default=0) + 1
+        self.codes[code_id] = hashlib.sha256(binary).digest()
+        return code_id
+
+    def reset(self):
+        self.codes, self.contracts = {}, {}
+
+    def query_account(self, address):
+        return Account(address, 1, self._sequences.get(str(address), 0))
+
+    @staticmethod
+    def estimate_gas_and_fee_for_tx(transaction):
+        gas = GAS_PER_MESSAGE * len(transaction.msgs)
+        return gas, f"{gas}atestfet"
+
+    @staticmethod
+    def estimate_fee_from_gas(gas):
+        return f"{gas}atestfet"
+
+    def query_params(self, _subspace, _key):
+        return {"max_gas": str(self.max_gas if self.max_gas is not None else -1)}
+
+    def broadcast_tx(self, transaction):
+        sender = str(transaction.msgs[0].sender)
+        sequence = transaction.tx.auth_info.signer_infos[0].sequence
+        assert sequence == self._sequences.get(sender, 0)
+        self._sequences[sender] = sequence + 1
+        if len(self.interleaved) > 0:
+            self.store(self.interleaved.pop(0))
+
+        codes, contracts = dict(self.codes), dict(self.contracts)
+        try:
+            logs = [MessageLog(index, "", self._execute(msg, codes, contracts))
+                    for (index, msg) in enumerate(transaction.msgs)]
+            code, raw_log = 0, ""
+            self.codes, self.contracts = codes, contracts
+        except RuntimeError as ex:
+            logs, code, raw_log = [], 1, str(ex)
+
+        tx_hash = compute_tx_hash(transaction)
+        self._responses[tx_hash] = TxResponse(tx_hash, 10, code, 0, 0, raw_log, logs, {}, None)
+        self.transactions.append([type(msg).__name__ for msg in transaction.msgs])
+        return SubmittedTx(self, tx_hash)
+
+    def query_tx(self, tx_hash):
+        if tx_hash not in self._responses:
+            raise NotFoundError()
+        return self._responses[tx_hash]
+
+    def Codes(self, request):  # pylint: disable=invalid-name
+        start = int.from_bytes(request.pagination.key, "big") if request.pagination.key else 0
+        return QueryCodesResponse(code_infos=[
+            CodeInfoResponse(code_id=code_id, data_hash=checksum)
+            for (code_id, checksum) in sorted(self.codes.items()) if code_id >= start
+        ])
+
+    def Code(self, request):  # pylint: disable=invalid-name
+        if request.code_id not in self.codes:
+            raise RuntimeError("code: not found")
+        return QueryCodeResponse(code_info=CodeInfoResponse(code_id=request.code_id,
+                                                            data_hash=self.codes[request.code_id]))
+
+    def ContractInfo(self, request):  # pylint: disable=invalid-name
+        if request.address not in self.contracts:
+            raise RuntimeError("contract: not found")
+        return mock.Mock()
+
+    @staticmethod
+    def _execute(msg, codes, contracts):
+        msg_type = type(msg).__name__
+        if msg_type == "MsgStoreCode":
+            code_id = max(codes, default=0) + 1
+            codes[code_id] = hashlib.sha256(gzip.decompress(msg.wasm_byte_code)).digest()
+            return {"store_code": {"code_id": str(code_id)}}
+
+        if msg.code_id not in codes:
+            raise RuntimeError(f"code {msg.code_id} not found")
+
+        if msg_type == "MsgMigrateContract":
+            contracts[msg.contract] = msg.code_id
+            return {"migrate": {"_contract_address": msg.contract, "code_id": str(msg.code_id)}}
+
+        if msg_type == "MsgInstantiateContract2":
+            address = str(predict_address(codes[msg.code_id], Address(msg.sender), msg.salt))
+            if address in contracts:
+                raise RuntimeError(f"contract {address} already exists")
+        else:
+            address = str(Address(hashlib.sha256(f"contract-{len(contracts)}".encode()).digest()[:20]))
+        contracts[address] = msg.code_id
+        return {"instantiate": {"_contract_address": address, "code_id": str(msg.code_id)}}
+
+
+WALLET = LocalWallet(PrivateKey())
+
+
+def _contract(tmp_path, name, binary=None):
+    binary_path = tmp_path / f"{name}.wasm"
+    binary_path.write_bytes(binary or name.encode())
+    return Contract(name, str(tmp_path / name), str(binary_path), str(tmp_path), {})
+
+
+def _batch(contracts, address=None, code_id=None, salt=None):
+    return [
+        BatchDeployment(Deployment(name, contract.name, "localnode", "alice", {"name": name}, None, None, None,
+                                   address, code_id, migrate={}), contract, salt=salt)
+        for (name, contract) in contracts.items()
+    ]
+
+
+def _deploy(chain, batches, max_tx_bytes=None, predictable_addresses=False, journal=None, code_ids=None):
+    """
+    Runs a batch task for each group of deployments side by side, returning the lock file they updated
+    """
+    lock_file = mock.Mock()
+    profile = Profile("testing", chain.network_config, {}, predictable_addresses=predictable_addresses)
+    sequences = SequenceManager(chain, max_tx_bytes=max_tx_bytes)
+    uploads = CodeUploads()
+
+    with AsyncRuntime() as runtime:
+        ledger = AsyncLedger(runtime, chain, None)
+        tasks = [DeployBatchTask(lock_file, profile, deployments, ledger, WALLET, sequences, uploads, journal,
+                                 code_ids)
+                 for deployments in batches]
+
+        async def run():
+            await asyncio.gather(*[task.run() for task in tasks])
+
+        runtime.call(run())
+        for task in tasks:
+            task.on_complete()
+
+    return lock_file
+
+
+def _updates(lock_file):
+    return {
+        name: (digest, code_id, str(address))
+        for ((_, name, digest, code_id, address), _) in lock_file.update_deployment.call_args_list
+    }
+
+
+def _history(lock_file):
+    return sorted((record.deployment, record.action) for (records,), _ in lock_file.record_history.call_args_list
+                  for record in records)
+
+
+def test_binaries_are_stored_once_with_the_contracts_that_use_them(tmp_path):
+    chain = FakeChain()
+    token = _contract(tmp_path, "token")
+    contracts = {"token_a": token, "token_b": token, "counter": _contract(tmp_path, "counter")}
+
+    lock_file = _deploy(chain, [_batch(contracts)])
+
+    # both binaries are stored in the same transaction as the contracts that use them
+    assert chain.transactions == [["MsgStoreCode", "MsgInstantiateContract", "MsgInstantiateContract",
+                                   "MsgStoreCode", "MsgInstantiateContract"]]
+    assert len(chain.codes) == 2
+
+    updates = _updates(lock_file)
+    assert updates["token_a"][1] == updates["token_b"][1] == 1
+    assert updates["counter"][1] == 2
+    assert updates["token_a"][0] == hashlib.sha256(b"token").hexdigest()
+    assert {chain.contracts[address] for (_, _, address) in updates.values()} == {1, 2}
+    assert len({address for (_, _, address) in updates.values()}) == 3
+
+    assert _history(lock_file) == [("counter", "instantiate"), ("counter", "store"), ("token_a", "instantiate"),
+                                   ("token_a", "store"), ("token_b", "instantiate")]
+
+
+def test_binaries_are_stored_once_across_batches(tmp_path):
+    chain = FakeChain()
+    token = _contract(tmp_path, "token")
+
+    lock_file = _deploy(chain, [_batch({"token_a": token}), _batch({"token_b": token})])
+
+    # the second batch waits for the binary stored by the first and then instantiates it
+    assert len(chain.codes) == 1
+    assert sorted(chain.transactions) == [["MsgInstantiateContract"], ["MsgStoreCode", "MsgInstantiateContract"]]
+    assert {code_id for (_, code_id, _) in _updates(lock_file).values()} == {1}
+
+
+def test_existing_contracts_are_migrated_and_others_instantiated(tmp_path):
+    chain = FakeChain()
+    old_code_id = chain.store(b"old")
+    address = str(Address(hashlib.sha256(b"existing").digest()[:20]))
+    chain.contracts[address] = old_code_id
+    stored_code_id = chain.store(b"stored")
+
+    new = _batch({"token": _contract(tmp_path, "token")}, address=Address(address), code_id=old_code_id)
+    stored = _batch({"counter": _contract(tmp_path, "counter", b"stored")}, code_id=stored_code_id)
+
+    lock_file = _deploy(chain, [new + stored])
+
+    # the new binary is stored along with the migration, the stored one is only instantiated
+    assert chain.transactions == [["MsgStoreCode", "MsgMigrateContract"], ["MsgInstantiateContract"]]
+    updates = _updates(lock_file)
+    assert updates["token"] == (hashlib.sha256(b"token").hexdigest(), 3, address)
+    assert chain.contracts[address] == 3
+    assert updates["counter"][1] == stored_code_id
+    assert chain.contracts[updates["counter"][2]] == stored_code_id
+    assert ("token", "migrate") in _history(lock_file)
+
+
+def test_contracts_at_their_predicted_address_are_not_instantiated_again(tmp_path):
+    chain = FakeChain()
+    code_id = chain.store(b"token")
+    address = str(predict_address(hashlib.sha256(b"token").digest(), WALLET.address(), b"salt"))
+    chain.contracts[address] = code_id
+
+    contracts = {"counter": _contract(tmp_path, "counter"), "token": _contract(tmp_path, "token")}
+    lock_file = _deploy(chain, [_batch(contracts, salt=b"salt")], predictable_addresses=True)
+
+    assert chain.transactions == [["MsgStoreCode", "MsgInstantiateContract2"]]
+    updates = _updates(lock_file)
+    assert updates["token"] == (hashlib.sha256(b"token").hexdigest(), code_id, address)
+    assert updates["counter"][2] == str(predict_address(hashlib.sha256(b"counter").digest(), WALLET.address(),
+                                                        b"salt"))
+
+
+def test_transactions_are_split_to_stay_within_the_limits(tmp_path):
+    contracts = {name: _contract(tmp_path, name, os.urandom(3000)) for name in ("a", "b", "c")}
+
+    # each binary only fits in a transaction by itself
+    chain = FakeChain()
+    lock_file = _deploy(chain, [_batch(contracts)], max_tx_bytes=9000)
+    assert chain.transactions == [["MsgStoreCode", "MsgInstantiateContract"]] * 3
+    assert len(_updates(lock_file)) == 3
+
+    # a store along with its contract is over the gas limit of a block, so the binaries are stored by themselves
+    chain = FakeChain(max_gas=GAS_PER_MESSAGE * 3 // 2)
+    lock_file = _deploy(chain, [_batch(contracts)])
+    assert chain.transactions == [["MsgStoreCode"]] * 3 + [["MsgInstantiateContract"]] * 3
+    assert {code_id for (_, code_id, _) in _updates(lock_file).values()} == {1, 2, 3}
+
+
+def test_mispredicted_code_ids_fall_back_to_storing_the_binary_by_itself(tmp_path):
+    chain = FakeChain()
+    for index in range(3):
+        chain.store(f"other-{index}".encode())
+    code_ids = CodeIdIndex(chain.network_config.chain_id)
+    _deploy(chain, [_batch({"other": _contract(tmp_path, "other", b"other-0")})], code_ids=code_ids)
+
+    # the chain is reset, so the next code id is lower than the index of the chain expects
+    chain.reset()
+    chain.transactions = []
+    journal = DeployJournal()
+    lock_file = _deploy(chain, [_batch({"token": _contract(tmp_path, "token")})], journal=journal,
+                        code_ids=code_ids)
+
+    assert chain.transactions == [["MsgStoreCode", "MsgInstantiateContract"], ["MsgStoreCode"],
+                                  ["MsgInstantiateContract"]]
+    (_, code_id, address) = _updates(lock_file)["token"]
+    assert code_id == 1
+    assert chain.contracts[address] == 1
+
+    # the failed transaction is forgotten straight away, the others once the lock file has been written
+    assert len(journal.pending("testing")) == 2
+    journal.prune()
+    assert journal.pending("testing") == []
+
+
+def test_contracts_deployed_with_a_mispredicted_code_id_are_deployed_again(tmp_path):
+    chain = FakeChain()
+    chain.interleaved = [b"foreign"]
+
+    lock_file = _deploy(chain, [_batch({"token": _contract(tmp_path, "token")})])
+
+    # the contract was instantiated from the binary that was stored in the meantime, so it is instantiated again
+    assert chain.transactions == [["MsgStoreCode", "MsgInstantiateContract"], ["MsgInstantiateContract"]]
+    (_, code_id, address) = _updates(lock_file)["token"]
+    assert code_id == 2
+    assert chain.contracts[address] == 2
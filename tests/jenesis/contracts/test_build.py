@@ -0,0 +1,70 @@
+import os
+import subprocess
+from unittest import mock
+
+import pytest
+
+from jenesis.contracts import Contract
+from jenesis.contracts.build import (
+    ContractBuildTask, DEFAULT_BUILD_STEPS, SHARED_CACHE_DIR, _shared_cache_build_steps, get_shared_cache_volume,
+)
+
+
+def _contract(tmp_path, name="counter"):
+    return Contract(name, str(tmp_path / name), str(tmp_path / name / "artifacts" / f"{name}.wasm"),
+                    str(tmp_path / name), {})
+
+
+def _scheduled_run(contract, optimize=False, shared_cache="project_cache"):
+    builders = mock.Mock()
+    task = ContractBuildTask(contract, optimize, False, False, builders=builders, shared_cache=shared_cache)
+    task._schedule_container()  # pylint: disable=protected-access
+    (_, command, mounts, _, environment) = builders.run.call_args[0]
+    return command, {mount["Target"]: mount["Source"] for mount in mounts}, environment
+
+
+def test_shared_cache_volume_is_specific_to_the_project(tmp_path):
+    volume = get_shared_cache_volume(str(tmp_path / "project"))
+
+    assert volume.startswith("project_project_")
+    assert get_shared_cache_volume(os.path.join(str(tmp_path), "other", "..", "project")) == volume
+    assert get_shared_cache_volume(str(tmp_path / "other" / "project")) != volume
+
+
+@pytest.mark.parametrize("installed", [True, False])
+def test_shared_cache_build_steps_use_sccache_when_available(tmp_path, installed):
+    bin_path = tmp_path / "bin"
+    bin_path.mkdir()
+    if installed:
+        sccache = bin_path / "sccache"
+        sccache.write_text("#!/bin/sh\n")
+        sccache.chmod(0o755)
+
+    steps = _shared_cache_build_steps(["echo wrapper=$RUSTC_WRAPPER"])
+    result = subprocess.run(
+        ["/bin/sh", "-c", " && ".join(steps)], capture_output=True, check=True, text=True,
+        env={"PATH": f"{bin_path}:/usr/bin:/bin"},
+    )
+
+    assert result.stdout == ("wrapper=sccache\n" if installed else "wrapper=\n")
+    assert _shared_cache_build_steps(DEFAULT_BUILD_STEPS)[1:] == DEFAULT_BUILD_STEPS
+
+
+def test_shared_cache_builds_keep_their_own_target_directory(tmp_path):
+    (command, mounts, environment) = _scheduled_run(_contract(tmp_path))
+
+    # the builds of different contracts do not share any cargo lock, only the compiler cache
+    assert mounts["/code/target"] == "contract_counter_cache"
+    assert mounts[SHARED_CACHE_DIR] == "project_cache"
+    assert environment == {"SCCACHE_DIR": SHARED_CACHE_DIR}
+    assert "RUSTC_WRAPPER=sccache" in command[2]
+
+
+@pytest.mark.parametrize("optimize,shared_cache", [(False, None), (True, "project_cache")])
+def test_builds_without_the_shared_cache(tmp_path, optimize, shared_cache):
+    (command, mounts, environment) = _scheduled_run(_contract(tmp_path), optimize, shared_cache)
+
+    assert mounts["/code/target"] == "contract_counter_cache"
+    assert SHARED_CACHE_DIR not in mounts
+    assert environment == {}
+    assert command is None if optimize else "sccache" not in command[2]
@@ -0,0 +1,74 @@
+from cosmpy.aerial.client import Account
+from cosmpy.aerial.wallet import LocalWallet
+from cosmpy.crypto.keypairs import PrivateKey
+
+from jenesis.config import Deployment
+from jenesis.contracts import Contract
+from jenesis.contracts.dry_run import _DeploymentSimulator
+from jenesis.contracts.plan import PLAN_INSTANTIATE, DeploymentPlan, PlannedDeployment
+from jenesis.network import fetchai_localnode_config
+
+STORE_GAS = 1000
+INSTANTIATE_GAS = 100
+
+
+class FakeLedgerClient:
+    def __init__(self):
+        self.network_config = fetchai_localnode_config()
+
+    @staticmethod
+    def query_account(address):
+        return Account(address=address, number=1, sequence=5)
+
+    @staticmethod
+    def estimate_gas_for_tx(transaction):
+        gas = 0
+        for msg in transaction.msgs:
+            gas += STORE_GAS if type(msg).__name__ == "MsgStoreCode" else INSTANTIATE_GAS
+        return gas
+
+
+def _simulate(tmp_path, init, code_ids):
+    binary_path = tmp_path / "token.wasm"
+    binary_path.write_bytes(b"token")
+    contract = Contract("token", str(tmp_path / "token"), str(binary_path), str(tmp_path), {
+        "instantiate_msg": {
+            "type": "object",
+            "required": ["count"],
+            "properties": {"count": {"type": "integer"}},
+        },
+    })
+
+    deployment = Deployment("token", "token", "localnode", "alice", init, None, None, None, None, None)
+    plan = DeploymentPlan("testing", {"token": set()}, order=["token"], planned={
+        "token": PlannedDeployment("token", PLAN_INSTANTIATE, "not deployed", "ab" * 32, True),
+    })
+
+    simulator = _DeploymentSimulator(
+        FakeLedgerClient(), plan, {"token": contract}, {"alice": LocalWallet(PrivateKey())}, code_ids, 7,
+    )
+    return simulator.simulate(deployment, None)
+
+
+def test_store_and_instantiate_are_simulated(tmp_path):
+    result = _simulate(tmp_path, {"count": 1}, {})
+
+    assert result.error is None
+    assert result.store_gas == STORE_GAS
+    assert result.deploy_gas == INSTANTIATE_GAS
+
+
+def test_stored_binaries_are_only_instantiated(tmp_path):
+    result = _simulate(tmp_path, {"count": 1}, {"ab" * 32: 3})
+
+    assert result.error is None
+    assert result.store_gas == 0
+    assert result.deploy_gas == INSTANTIATE_GAS
+
+
+def test_invalid_init_messages_are_reported(tmp_path):
+    result = _simulate(tmp_path, {"count": "one"}, {})
+
+    assert result.error is not None
+    assert result.error.startswith("invalid message")
+    assert result.gas == 0
@@ -0,0 +1,90 @@
+import bech32
+from cosmpy.aerial.tx import _wrap_in_proto_any
+from cosmpy.crypto.address import Address
+from cosmpy.crypto.keypairs import PrivateKey
+
+from jenesis.config import Config, Deployment, Profile
+from jenesis.contracts import Contract
+from jenesis.contracts.deploy import predict_deployment_addresses
+from jenesis.contracts.instantiate2 import compute_salt, create_instantiate2_msg, predict_address
+from jenesis.contracts.plan import compute_init_addresses
+from jenesis.network import fetchai_localnode_config
+
+CREATOR = Address(bech32.bech32_encode(
+    "purple", bech32.convertbits(bytes.fromhex("9999999999aaaaaaaaaabbbbbbbbbbcccccccccc"), 8, 5, True)
+))
+CHECKSUM = bytes.fromhex("13a1fc994cc6d1c81b746ee0c0ff6f90043875e0bf1d9be6b7d779fc978dc2a5")
+
+
+def test_predicted_address_matches_the_wasm_module():
+    # reference vector from the wasm module
+    address = predict_address(CHECKSUM, CREATOR, b"a")
+    assert str(address) == "purple1t6r960j945lfv8mhl4mage2rg97w63xeynwrupum2s2l7em4lprs9ce5hk"
+
+
+def test_salt_depends_on_the_deployment_configuration():
+    salt = compute_salt("project", "testing", "token", {"name": "$other"}, None)
+
+    assert salt == compute_salt("project", "testing", "token", {"name": "$other"}, None)
+    assert salt != compute_salt("project", "testing", "other", {"name": "$other"}, None)
+    assert salt != compute_salt("project", "testing", "token", {"name": "$another"}, None)
+    assert salt != compute_salt("project", "testing", "token", {"name": "$other"}, "10atestfet")
+
+
+def test_instantiate2_msg_is_encoded():
+    msg = create_instantiate2_msg(7, {"count": 1}, "label", CREATOR, b"salt", funds="10atestfet",
+                                  admin_address=CREATOR)
+
+    assert msg.code_id == 7
+    assert msg.salt == b"salt"
+    assert not msg.fix_msg
+    assert msg.admin == str(CREATOR)
+    assert [(coin.denom, coin.amount) for coin in msg.funds] == [("atestfet", "10")]
+
+    packed = _wrap_in_proto_any([msg])[0]
+    assert packed.type_url == "/cosmwasm.wasm.v1.MsgInstantiateContract2"
+
+
+def _predict(tmp_path, inits, binaries):
+    deployments, prepared = {}, []
+    for (name, init) in inits.items():
+        binary_path = tmp_path / f"{name}.wasm"
+        binary_path.write_bytes(binaries[name])
+        contract = Contract(name, str(tmp_path / name), str(binary_path), str(tmp_path), {})
+
+        deployments[name] = Deployment(name, name, "localnode", "alice", init, None, None, None, None, None)
+        prepared.append((deployments[name], contract))
+
+    profile = Profile("testing", fetchai_localnode_config(), deployments, predictable_addresses=True)
+    cfg = Config("project", [], {"testing": profile})
+    (_, addresses) = predict_deployment_addresses(cfg, profile, prepared, {"alice": KEY},
+                                                  compute_init_addresses(deployments))
+    return addresses
+
+
+KEY = PrivateKey()
+
+
+def test_redeployed_dependencies_move_their_dependents(tmp_path):
+    # c <- b <- a, with d on its own
+    inits = {"a": {"b": "$b"}, "b": {"c": "$c"}, "c": {"count": 1}, "d": {"count": 2}}
+    binaries = {name: name.encode() for name in inits}
+
+    before = _predict(tmp_path, inits, binaries)
+    assert before == _predict(tmp_path, inits, binaries)
+
+    binaries["c"] = b"new c"
+    after = _predict(tmp_path, inits, binaries)
+    assert all(after[name] != before[name] for name in ("a", "b", "c"))
+    assert after["d"] == before["d"]
+
+
+def test_deployments_that_reference_each_other_move_together(tmp_path):
+    inits = {"x": {"y": "$y"}, "y": {"x": "$x"}, "z": {"x": "$x"}}
+    binaries = {name: name.encode() for name in inits}
+
+    before = _predict(tmp_path, inits, binaries)
+
+    binaries["y"] = b"new y"
+    after = _predict(tmp_path, inits, binaries)
+    assert all(after[name] != before[name] for name in ("x", "y", "z"))
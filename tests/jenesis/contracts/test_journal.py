@@ -0,0 +1,278 @@
+from unittest import mock
+
+import pytest
+from cosmpy.aerial.client import Account
+from cosmpy.aerial.contract.cosmwasm import create_cosmwasm_instantiate_msg, create_cosmwasm_migrate_msg
+from cosmpy.aerial.exceptions import BroadcastError, NotFoundError
+from cosmpy.aerial.tx import SigningCfg, Transaction
+from cosmpy.aerial.tx_helpers import MessageLog, TxResponse
+from cosmpy.aerial.wallet import LocalWallet
+from cosmpy.crypto.address import Address
+from cosmpy.crypto.keypairs import PrivateKey
+from cosmpy.protos.cosmwasm.wasm.v1.query_pb2 import QueryCodesResponse
+from cosmpy.protos.cosmwasm.wasm.v1.tx_pb2 import MsgStoreCode
+
+from jenesis.cache import state_path
+from jenesis.config import Config, Deployment, Profile
+from jenesis.contracts.journal import DEPLOY_JOURNAL_FILENAME, DeployJournal, compute_tx_hash, reconcile_journal
+from jenesis.network import fetchai_localnode_config
+
+CONTRACT_ADDRESS = "fetch1qqqsyqcyq5rqwzqfpg9scrgwpugpzysnstc7nw"
+EXISTING_ADDRESS = "fetch1qypqxpq9qcrsszg2pvxq6rs0zqg3yyc5vl96yt"
+
+
+class FakeLedgerClient:
+    def __init__(self, responses, sequence=0, height=10):
+        self.network_config = fetchai_localnode_config()
+        self._responses = responses
+        self.sequence = sequence
+        self.height = height
+        self.queries = 0
+
+    def query_tx(self, tx_hash):
+        self.queries += 1
+        if tx_hash not in self._responses:
+            raise NotFoundError()
+        return self._responses[tx_hash]
+
+    def query_account(self, address):
+        return Account(address, 1, self.sequence)
+
+    def query_height(self):
+        return self.height
+
+
+WALLET = LocalWallet(PrivateKey())
+
+
+def _sign(msg, wallet=WALLET, timeout_height=None) -> Transaction:
+    transaction = Transaction()
+    transaction.add_message(msg)
+    transaction.seal(SigningCfg.direct(wallet.public_key(), 0), fee="", gas_limit=0)
+    if timeout_height is not None:
+        transaction._tx.body.timeout_height = timeout_height  # pylint: disable=protected-access
+    transaction.sign(wallet.signer(), "localnode", 0)
+    transaction.complete()
+    return transaction
+
+
+def _response(tx_hash, events) -> TxResponse:
+    return TxResponse(tx_hash, 10, 0, 0, 0, "", [MessageLog(0, "", events)], {}, None)
+
+
+def _make_project():
+    deployments = {
+        name: Deployment(name, name, "localnode", "alice", {"count": 1}, None, None, None, None, None)
+        for name in ("counter", "token")
+    }
+    deployments["token"].address = Address(EXISTING_ADDRESS)
+    deployments["token"].code_id = 1
+    profile = Profile("testing", fetchai_localnode_config(), deployments)
+    return Config("project", [], {"testing": profile}), profile
+
+
+def test_entries_are_persisted_before_broadcast(tmp_path):
+    journal_path = state_path(str(tmp_path), DEPLOY_JOURNAL_FILENAME)
+    transaction = _sign(create_cosmwasm_instantiate_msg(1, {}, "label", Address(CONTRACT_ADDRESS)))
+
+    journal = DeployJournal(journal_path)
+    journal.record("testing", "localnode", transaction, [("counter", "ab" * 32)])
+    journal.record("other", "localnode", transaction, [("counter", "ab" * 32)])
+
+    # the last entry may only have been partially written when the deployment was interrupted
+    with open(journal_path, "a", encoding="utf-8") as journal_file:
+        journal_file.write('{"profile": "tes')
+
+    loaded = DeployJournal.load(str(tmp_path))
+    pending = loaded.pending("testing")
+    assert len(pending) == 1
+    assert pending[0]["tx_hash"] == compute_tx_hash(transaction)
+    assert pending[0]["messages"] == [{"kind": "instantiate", "deployment": "counter", "digest": "ab" * 32}]
+
+    loaded.clear("testing")
+    assert DeployJournal.load(str(tmp_path)).pending("testing") == []
+    assert len(DeployJournal.load(str(tmp_path)).pending("other")) == 1
+
+
+def test_executed_transactions_are_recovered(tmp_path):
+    cfg, profile = _make_project()
+    journal = DeployJournal()
+
+    instantiate_tx = _sign(create_cosmwasm_instantiate_msg(3, {"count": 1}, "label", Address(CONTRACT_ADDRESS)))
+    migrate_tx = _sign(create_cosmwasm_migrate_msg(4, {}, Address(EXISTING_ADDRESS), Address(CONTRACT_ADDRESS)))
+    lost_tx = _sign(create_cosmwasm_instantiate_msg(5, {"count": 2}, "label", Address(CONTRACT_ADDRESS)))
+    journal.record("testing", "localnode", instantiate_tx, [("counter", "aa" * 32)])
+    journal.record("testing", "localnode", migrate_tx, [("token", "bb" * 32)])
+    journal.record("testing", "localnode", lost_tx, [("counter", "cc" * 32)])
+
+    client = FakeLedgerClient({
+        compute_tx_hash(instantiate_tx): _response(compute_tx_hash(instantiate_tx), {
+            "instantiate": {"_contract_address": CONTRACT_ADDRESS, "code_id": "3"},
+        }),
+        compute_tx_hash(migrate_tx): _response(compute_tx_hash(migrate_tx), {
+            "migrate": {"_contract_address": EXISTING_ADDRESS, "code_id": "4"},
+        }),
+    })
+
+    assert reconcile_journal(journal, cfg, profile, client, str(tmp_path)) == 2
+
+    counter = profile.deployments["counter"]
+    assert str(counter.address) == CONTRACT_ADDRESS
+    assert counter.code_id == 3
+    assert counter.digest == "aa" * 32
+
+    token = profile.deployments["token"]
+    assert str(token.address) == EXISTING_ADDRESS
+    assert token.code_id == 4
+    assert token.digest == "bb" * 32
+
+    assert (tmp_path / "jenesis.lock").is_file()
+    assert journal.pending("testing") == []
+
+
+def test_pending_transactions_are_kept_until_they_can_no_longer_be_included(tmp_path):
+    cfg, profile = _make_project()
+    journal = DeployJournal()
+    sender = str(WALLET.address())
+
+    mempool_tx = _sign(create_cosmwasm_instantiate_msg(3, {"count": 1}, "label", Address(CONTRACT_ADDRESS)))
+    expiring_tx = _sign(create_cosmwasm_instantiate_msg(3, {"count": 2}, "label", Address(CONTRACT_ADDRESS)),
+                        timeout_height=20)
+    journal.record("testing", "localnode", mempool_tx, [("counter", "aa" * 32)], sender=sender)
+    journal.record("testing", "localnode", expiring_tx, [("counter", "aa" * 32)], sender=sender)
+
+    # neither transaction is on chain yet, but both could still be included
+    client = FakeLedgerClient({})
+    assert reconcile_journal(journal, cfg, profile, client, str(tmp_path), timeout=0) == 0
+    assert [entry["tx_hash"] for entry in journal.pending("testing")] == [
+        compute_tx_hash(mempool_tx), compute_tx_hash(expiring_tx),
+    ]
+    assert profile.deployments["counter"].address is None
+
+    # the chain moves past the timeout height of one of them
+    client.height = 21
+    assert reconcile_journal(journal, cfg, profile, client, str(tmp_path), timeout=0) == 0
+    assert [entry["tx_hash"] for entry in journal.pending("testing")] == [compute_tx_hash(mempool_tx)]
+
+    # the other one is included while it is being waited for
+    client = FakeLedgerClient({})
+    original_query_tx = client.query_tx
+
+    def query_tx(tx_hash):
+        if client.queries == 2:
+            client.sequence = 1
+            client._responses[tx_hash] = _response(tx_hash, {  # pylint: disable=protected-access
+                "instantiate": {"_contract_address": CONTRACT_ADDRESS, "code_id": "3"},
+            })
+        return original_query_tx(tx_hash)
+
+    client.query_tx = query_tx
+    assert reconcile_journal(journal, cfg, profile, client, str(tmp_path), timeout=5, poll_period=0) == 1
+    assert str(profile.deployments["counter"].address) == CONTRACT_ADDRESS
+    assert journal.pending("testing") == []
+
+
+def test_transactions_whose_sequence_was_used_are_sent_again(tmp_path):
+    cfg, profile = _make_project()
+    journal = DeployJournal()
+
+    transaction = _sign(create_cosmwasm_instantiate_msg(3, {"count": 1}, "label", Address(CONTRACT_ADDRESS)))
+    journal.record("testing", "localnode", transaction, [("counter", "aa" * 32)], sender=str(WALLET.address()))
+
+    client = FakeLedgerClient({}, sequence=1)
+    assert reconcile_journal(journal, cfg, profile, client, str(tmp_path), timeout=0) == 0
+    assert journal.pending("testing") == []
+
+
+def test_deployments_with_mispredicted_code_ids_are_not_recovered(tmp_path):
+    cfg, profile = _make_project()
+    journal = DeployJournal()
+
+    # the binary of each transaction is stored along with the contract that uses it
+    transactions = []
+    for (name, code_id) in (("token", 7), ("counter", 8)):
+        transaction = Transaction()
+        transaction.add_message(MsgStoreCode(sender=str(WALLET.address()), wasm_byte_code=bytes([code_id])))
+        transaction.add_message(create_cosmwasm_instantiate_msg(code_id, {"count": 1}, "label",
+                                                                Address(CONTRACT_ADDRESS)))
+        transaction.seal(SigningCfg.direct(WALLET.public_key(), 0), fee="", gas_limit=0)
+        transaction.sign(WALLET.signer(), "localnode", 0)
+        transaction.complete()
+        journal.record("testing", "localnode", transaction, [(name, "aa" * 32), (name, "aa" * 32)])
+        transactions.append(transaction)
+
+    def logs(stored_code_id, instantiated_code_id):
+        return [
+            MessageLog(0, "", {"store_code": {"code_id": str(stored_code_id)}}),
+            MessageLog(1, "", {"instantiate": {"_contract_address": CONTRACT_ADDRESS,
+                                               "code_id": str(instantiated_code_id)}}),
+        ]
+
+    (mispredicted, predicted) = [compute_tx_hash(transaction) for transaction in transactions]
+    client = FakeLedgerClient({
+        mispredicted: TxResponse(mispredicted, 10, 0, 0, 0, "", logs(9, 7), {}, None),
+        predicted: TxResponse(predicted, 10, 0, 0, 0, "", logs(8, 8), {}, None),
+    })
+    client.wasm = mock.Mock()
+    client.wasm.Codes.return_value = QueryCodesResponse()
+
+    assert reconcile_journal(journal, cfg, profile, client, str(tmp_path)) == 1
+    assert profile.deployments["counter"].code_id == 8
+    assert str(profile.deployments["token"].address) == EXISTING_ADDRESS
+    assert profile.deployments["token"].code_id == 1
+    assert journal.pending("testing") == []
+
+
+def test_rejected_transactions_are_removed_from_the_journal():
+    journal = DeployJournal()
+    transactions = [
+        _sign(create_cosmwasm_instantiate_msg(code_id, {}, "label", Address(CONTRACT_ADDRESS)))
+        for code_id in (1, 2, 3)
+    ]
+
+    class FakeSequences:
+        def __init__(self, outcomes):
+            self._outcomes = outcomes
+
+        def broadcast(self, _transaction, _sender, gas_limit=None, memo=None, on_signed=None):
+            # each attempt is signed with another sequence, and the ones before the last are rejected
+            for transaction in transactions[:len(self._outcomes)]:
+                on_signed(transaction)
+            if self._outcomes[-1] is not None:
+                raise self._outcomes[-1]
+            return mock.Mock(tx_hash=compute_tx_hash(transactions[len(self._outcomes) - 1]))
+
+    sequences = journal.sequences(FakeSequences([None, None, None]), "testing", "localnode", [("counter", None)])
+    sequences.broadcast(Transaction(), WALLET)
+    assert [entry["tx_hash"] for entry in journal.pending("testing")] == [compute_tx_hash(transactions[2])]
+
+    # the outcome of a transaction that may have been sent is unknown, so it is kept
+    journal = DeployJournal()
+    sequences = journal.sequences(FakeSequences([None, RuntimeError("connection lost")]), "testing", "localnode",
+                                  [("counter", None)])
+    with pytest.raises(RuntimeError):
+        sequences.broadcast(Transaction(), WALLET)
+    assert [entry["tx_hash"] for entry in journal.pending("testing")] == [compute_tx_hash(transactions[1])]
+
+    journal = DeployJournal()
+    sequences = journal.sequences(FakeSequences([None, BroadcastError("hash", "insufficient funds")]), "testing",
+                                  "localnode", [("counter", None)])
+    with pytest.raises(BroadcastError):
+        sequences.broadcast(Transaction(), WALLET)
+    assert journal.pending("testing") == []
+
+
+def test_resolved_transactions_are_removed_once_pruned():
+    journal = DeployJournal()
+    transactions = [
+        _sign(create_cosmwasm_instantiate_msg(code_id, {}, "label", Address(CONTRACT_ADDRESS)))
+        for code_id in (1, 2)
+    ]
+    for transaction in transactions:
+        journal.record("testing", "localnode", transaction, [("counter", None)])
+
+    journal.resolve([compute_tx_hash(transactions[0])])
+    assert len(journal.pending("testing")) == 2
+
+    journal.prune()
+    assert [entry["tx_hash"] for entry in journal.pending("testing")] == [compute_tx_hash(transactions[1])]
@@ -0,0 +1,158 @@
+import hashlib
+
+from cosmpy.crypto.address import Address
+
+from jenesis.config import Config, Deployment, Profile
+from jenesis.contracts import Contract, deploy
+from jenesis.contracts.plan import (PLAN_INSTANTIATE, PLAN_MIGRATE, assign_deployer_keys, compute_deployment_plan,
+                                    resolve_init)
+from jenesis.network import fetchai_localnode_config
+
+
+def _make_contract(tmp_path, name: str, contents: bytes) -> Contract:
+    binary_path = tmp_path / f"{name}.wasm"
+    binary_path.write_bytes(contents)
+    return Contract(name, str(tmp_path / name), str(binary_path), str(tmp_path), {})
+
+
+def _make_profile(tmp_path):
+    # c <- b <- a, with d on its own
+    contracts = {name: _make_contract(tmp_path, name, name.encode()) for name in ("a", "b", "c", "d")}
+    inits = {"a": {"b": "$b"}, "b": {"c": "$c"}, "c": {"count": 1}, "d": {"count": 2}}
+
+    deployments = {}
+    for (index, name) in enumerate(inits):
+        deployments[name] = Deployment(
+            name, name, "localnode", "alice", inits[name], None, None,
+            hashlib.sha256(name.encode()).hexdigest(), Address(bytes([index + 1] * 20)), index + 1,
+        )
+
+    profile = Profile("testing", fetchai_localnode_config(), deployments)
+
+    # record the lock checksums the same way a deployment does
+    init_addresses = {"a": {"b"}, "b": {"c"}, "c": set(), "d": set()}
+    for deployment in deployments.values():
+        unresolved_init = deployment.init
+        deployment.init = dict(unresolved_init)
+        resolve_init(deployment, profile, init_addresses)
+        deployment.checksum = deployment.compute_checksum()
+        deployment.init = unresolved_init
+
+    return profile, contracts
+
+
+def test_nothing_is_planned_when_up_to_date(tmp_path):
+    profile, contracts = _make_profile(tmp_path)
+
+    plan = compute_deployment_plan(profile, contracts)
+
+    assert plan.order == []
+    assert sorted(plan.up_to_date) == ["a", "b", "c", "d"]
+
+
+def test_replaced_contracts_redeploy_their_dependents(tmp_path):
+    profile, contracts = _make_profile(tmp_path)
+    (tmp_path / "c.wasm").write_bytes(b"new c")
+
+    plan = compute_deployment_plan(profile, contracts)
+
+    assert plan.order == ["c", "b", "a"]
+    assert plan.planned["c"].reason == "binary changed"
+    assert plan.planned["b"].reason == "dependency c redeployed"
+    assert plan.planned["a"].reason == "dependency b redeployed"
+    assert all(planned.action == PLAN_INSTANTIATE for planned in plan.planned.values())
+    assert plan.up_to_date == ["d"]
+
+    assert plan.estimate_transactions(profile) == {"store": 3, PLAN_MIGRATE: 0, PLAN_INSTANTIATE: 3}
+    assert plan.estimate_transactions(profile, batch=True) == {"store": 3, PLAN_MIGRATE: 0, PLAN_INSTANTIATE: 3}
+
+
+def test_migrated_contracts_keep_their_dependents(tmp_path):
+    profile, contracts = _make_profile(tmp_path)
+    profile.deployments["c"].upgrade = "migrate"
+    (tmp_path / "c.wasm").write_bytes(b"new c")
+
+    plan = compute_deployment_plan(profile, contracts, is_stored=lambda digest: True)
+
+    assert plan.order == ["c"]
+    assert plan.planned["c"].action == PLAN_MIGRATE
+    assert not plan.planned["c"].store
+    assert plan.estimate_transactions(profile) == {"store": 0, PLAN_MIGRATE: 1, PLAN_INSTANTIATE: 0}
+
+
+def test_configuration_changes_are_detected(tmp_path):
+    profile, contracts = _make_profile(tmp_path)
+    profile.deployments["d"].init = {"count": 3}
+    profile.deployments["b"].deployer_key = "bob"
+
+    plan = compute_deployment_plan(profile, contracts)
+
+    assert plan.order == ["d", "b", "a"] or plan.order == ["b", "d", "a"]
+    assert plan.planned["d"].reason == "configuration changed"
+    assert plan.planned["b"].reason == "configuration changed"
+    assert plan.planned["a"].reason == "dependency b redeployed"
+
+
+def test_batches_share_transactions(tmp_path):
+    profile, contracts = _make_profile(tmp_path)
+    for deployment in profile.deployments.values():
+        deployment.address = None
+
+    plan = compute_deployment_plan(profile, contracts)
+
+    # c and d are ready together, followed by b and then a
+    assert plan.estimate_transactions(profile, batch=True) == {"store": 3, PLAN_MIGRATE: 0, PLAN_INSTANTIATE: 3}
+    assert plan.estimate_transactions(profile) == {"store": 4, PLAN_MIGRATE: 0, PLAN_INSTANTIATE: 4}
+
+
+def test_missing_binaries_block_dependents(tmp_path):
+    profile, contracts = _make_profile(tmp_path)
+    (tmp_path / "c.wasm").unlink()
+
+    plan = compute_deployment_plan(profile, contracts, available_keys={"alice"})
+
+    assert sorted(plan.blocked) == ["a", "b", "c"]
+    assert plan.blocked["b"] == "depends on c"
+    assert plan.up_to_date == ["d"]
+
+
+def test_key_pool_spreads_independent_deployments(tmp_path):
+    profile, contracts = _make_profile(tmp_path)
+    for deployment in profile.deployments.values():
+        deployment.address = None
+    profile.deployments["e"] = Deployment("e", "d", "localnode", "alice", {"count": 3}, None, None, None, None, None)
+
+    plan = compute_deployment_plan(profile, contracts)
+    assigned = assign_deployer_keys(plan, ["k1", "k2"])
+
+    # c, d and e are deployed together, followed by b and then a
+    assert len(plan.order) == 5
+    assert sorted(assigned[name] for name in ("c", "d", "e")) == ["k1", "k1", "k2"]
+    assert assigned["b"] == "k1"
+    assert assigned["a"] == "k1"
+
+
+def test_key_pool_keeps_the_admin_of_migrated_contracts(tmp_path):
+    profile, contracts = _make_profile(tmp_path)
+    profile.deployments["c"].upgrade = "migrate"
+    (tmp_path / "c.wasm").write_bytes(b"new c")
+    (tmp_path / "d.wasm").write_bytes(b"new d")
+
+    plan = compute_deployment_plan(profile, contracts)
+
+    assert assign_deployer_keys(plan, ["k1", "k2"]) == {"d": "k1"}
+
+
+def test_planning_with_a_key_pool_estimates_the_batches_per_key(tmp_path, monkeypatch, capsys):
+    profile, contracts = _make_profile(tmp_path)
+    for deployment in profile.deployments.values():
+        deployment.address = None
+    cfg = Config("project", [], {"testing": profile})
+
+    monkeypatch.setattr(deploy, "detect_contracts", lambda *_: list(contracts.values()))
+
+    # c and d become ready together, and are sent from different keys
+    plan = deploy.plan_deployment(cfg, str(tmp_path), None, "testing", batch=True, key_pool=["k1", "k2"])
+    assert plan.estimate_transactions(profile, batch=True)["instantiate"] == 4
+    assert sorted(profile.deployments[name].deployer_key for name in ("c", "d")) == ["k1", "k2"]
+    assert "Deployer keys: " in capsys.readouterr().out
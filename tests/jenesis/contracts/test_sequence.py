@@ -0,0 +1,72 @@
+from unittest import mock
+
+import pytest
+from cosmpy.aerial.client import Account
+from cosmpy.aerial.exceptions import BroadcastError
+from cosmpy.aerial.tx import Transaction
+from cosmpy.aerial.wallet import LocalWallet
+from cosmpy.crypto.keypairs import PrivateKey
+from cosmpy.protos.cosmos.bank.v1beta1.tx_pb2 import MsgSend
+from cosmpy.protos.cosmos.base.v1beta1.coin_pb2 import Coin
+
+from jenesis.contracts import sequence as sequence_module
+from jenesis.contracts.sequence import SequenceManager, TxLimitError, TxLimits
+
+
+def test_sequences_are_assigned_locally_and_resynced_on_mismatch():
+    wallet = LocalWallet(PrivateKey())
+    client = mock.Mock()
+    client.query_account.side_effect = [
+        Account(address=wallet.address(), number=7, sequence=3),
+        Account(address=wallet.address(), number=7, sequence=10),
+    ]
+
+    used_sequences = []
+
+    def prepare(_client, _transaction, _sender, account, gas_limit=None, memo=None, limits=None):
+        used_sequences.append(account.sequence)
+
+    def broadcast(_transaction):
+        if len(used_sequences) == 3:
+            raise BroadcastError("hash", "account sequence mismatch, expected 10, got 5: incorrect account sequence")
+        return mock.Mock()
+
+    client.broadcast_tx.side_effect = broadcast
+
+    sequences = SequenceManager(client)
+    with mock.patch.object(sequence_module, "prepare_transaction", side_effect=prepare):
+        for _ in range(4):
+            sequences.broadcast(mock.Mock(), wallet)
+
+    # the account is only queried up front and after the mismatch
+    assert used_sequences == [3, 4, 5, 10, 11]
+    assert client.query_account.call_count == 2
+
+
+def test_transactions_over_the_limits_are_rejected_before_broadcast():
+    wallet = LocalWallet(PrivateKey())
+    client = mock.Mock()
+    client.query_account.return_value = Account(address=wallet.address(), number=7, sequence=3)
+    client.network_config.chain_id = "test-chain"
+    client.estimate_fee_from_gas.return_value = "10atestfet"
+    client.query_params.return_value = {"max_gas": "1000000"}
+
+    def transaction():
+        tx = Transaction()
+        tx.add_message(MsgSend(from_address=str(wallet.address()), to_address=str(wallet.address()),
+                               amount=[Coin(amount="1", denom="atestfet")]))
+        return tx
+
+    sequences = SequenceManager(client, max_tx_bytes=100)
+    with pytest.raises(TxLimitError):
+        sequences.broadcast(transaction(), wallet, gas_limit=1000)
+
+    sequences = SequenceManager(client, max_tx_bytes=10000)
+    with pytest.raises(TxLimitError):
+        sequences.broadcast(transaction(), wallet, gas_limit=2000000)
+
+    # nothing has been broadcast, so the sequence is still free
+    client.broadcast_tx.assert_not_called()
+    sequences.broadcast(transaction(), wallet, gas_limit=1000)
+    assert client.broadcast_tx.call_count == 1
+    assert sequences.limits() == TxLimits(max_bytes=10000, max_gas=1000000)
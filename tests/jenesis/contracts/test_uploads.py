@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from jenesis.contracts.uploads import CodeUploads
+
+
+def test_each_binary_is_only_stored_once_per_chain():
+    uploads = CodeUploads()
+    stores = []
+    lock = threading.Lock()
+
+    def store(code_id: int):
+        def action():
+            with lock:
+                stores.append(code_id)
+            time.sleep(0.05)
+            return code_id
+        return action
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(uploads.code_id, "chain-1", "abc", store(index + 1)) for index in range(8)]
+        code_ids = {future.result() for future in futures}
+
+    assert len(stores) == 1
+    assert code_ids == {stores[0]}
+
+    # other chains and binaries are stored separately
+    assert uploads.code_id("chain-2", "abc", store(20)) == 20
+    assert uploads.code_id("chain-1", "def", store(30)) == 30
+    assert uploads.lookup("chain-1", "abc") == stores[0]
+    assert uploads.lookup("chain-3", "abc") is None
+
+
+def test_failed_uploads_are_retried_and_known_code_ids_are_reused():
+    uploads = CodeUploads()
+
+    def failing_store():
+        raise RuntimeError("out of gas")
+
+    with pytest.raises(RuntimeError):
+        uploads.code_id("chain-1", "abc", failing_store)
+    assert uploads.lookup("chain-1", "abc") is None
+    assert uploads.code_id("chain-1", "abc", lambda: 5) == 5
+
+    uploads.add("chain-1", "def", 9)
+    assert uploads.code_id("chain-1", "def", failing_store) == 9
+
+
+def test_concurrent_coroutines_wait_for_a_single_upload():
+    uploads = CodeUploads()
+    stores = []
+
+    async def store():
+        stores.append(1)
+        await asyncio.sleep(0.05)
+        return 7
+
+    async def deploy_all():
+        return await asyncio.gather(*[uploads.async_code_id("chain-1", "abc", store) for _ in range(8)])
+
+    assert asyncio.run(deploy_all()) == [7] * 8
+    assert len(stores) == 1
+    assert uploads.code_id("chain-1", "abc", lambda: 9) == 7
+
+
+def test_batches_only_store_the_binaries_they_claim():
+    uploads = CodeUploads()
+    uploads.add("chain-1", "known", 1)
+    stored = []
+
+    async def store(digests):
+        stored.append(list(digests))
+        code_ids = [10 + len(stored) * 10 + index for index in range(len(digests))]
+        await asyncio.sleep(0.05)
+        return code_ids
+
+    async def deploy_all():
+        return await asyncio.gather(
+            uploads.async_code_ids("chain-1", ["known", "abc", "def"], store),
+            uploads.async_code_ids("chain-1", ["abc", "ghi"], store),
+        )
+
+    (first, second) = asyncio.run(deploy_all())
+    assert stored == [["abc", "def"], ["ghi"]]
+    assert first == {"known": 1, "abc": 20, "def": 21}
+    assert second == {"abc": 20, "ghi": 30}
+
+
+def test_failed_batches_release_their_claims():
+    uploads = CodeUploads()
+
+    async def failing_store(_):
+        raise RuntimeError("out of gas")
+
+    async def store(digests):
+        return [5] * len(digests)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(uploads.async_code_ids("chain-1", ["abc"], failing_store))
+    assert uploads.lookup("chain-1", "abc") is None
+    assert asyncio.run(uploads.async_code_ids("chain-1", ["abc"], store)) == {"abc": 5}
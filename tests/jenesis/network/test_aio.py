@@ -0,0 +1,44 @@
+import pytest
+from cosmpy.aerial.exceptions import BroadcastError, NotFoundError, QueryTimeoutError
+from cosmpy.aerial.tx_helpers import TxResponse
+
+from jenesis.network import fetchai_localnode_config
+from jenesis.network.aio import AsyncLedger
+from jenesis.tasks.aio import AsyncRuntime
+
+
+class FakeLedgerClient:
+    def __init__(self, pending_queries: int, code: int = 0):
+        self.network_config = fetchai_localnode_config()
+        self.queries = 0
+        self._pending_queries = pending_queries
+        self._code = code
+
+    def query_tx(self, tx_hash):
+        self.queries += 1
+        if self.queries <= self._pending_queries:
+            raise NotFoundError()
+        return TxResponse(tx_hash, 10, self._code, 0, 0, "failed to execute message", [], {}, None)
+
+
+def _wait_for_tx(client, timeout=5.0):
+    with AsyncRuntime() as runtime:
+        ledger = AsyncLedger(runtime, client, None)
+        return runtime.call(ledger.wait_for_tx("ABC", timeout=timeout, poll_period=0.01))
+
+
+def test_transactions_are_awaited_until_included():
+    client = FakeLedgerClient(pending_queries=3)
+
+    response = _wait_for_tx(client)
+
+    assert response.hash == "ABC"
+    assert client.queries == 4
+
+
+def test_failed_and_missing_transactions_are_reported():
+    with pytest.raises(BroadcastError):
+        _wait_for_tx(FakeLedgerClient(pending_queries=0, code=5))
+
+    with pytest.raises(QueryTimeoutError):
+        _wait_for_tx(FakeLedgerClient(pending_queries=1000), timeout=0.05)
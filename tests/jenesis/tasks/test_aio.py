@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+
+from jenesis.tasks.aio import AsyncRuntime, AsyncTask
+from jenesis.tasks.monitor import run_tasks
+
+
+class SleepTask(AsyncTask):
+    def __init__(self, runtime: AsyncRuntime, name: str, duration: float, succeed: bool = True):
+        super().__init__(runtime)
+        self._name = name
+        self._duration = duration
+        self._succeed = succeed
+        self.completed = False
+        self.threads = set()
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def run(self):
+        self.set_status_text('Sleeping...')
+        self.threads.add(threading.get_ident())
+        await asyncio.sleep(self._duration)
+        if not self._succeed:
+            raise RuntimeError("out of gas")
+
+    def on_complete(self):
+        self.completed = True
+
+
+def test_tasks_are_multiplexed_on_one_event_loop():
+    with AsyncRuntime() as runtime:
+        tasks = [SleepTask(runtime, f'task-{index}', 0.2) for index in range(50)]
+        tasks.append(SleepTask(runtime, 'failing', 0.05, succeed=False))
+
+        start = time.monotonic()
+        completed, failed = run_tasks(tasks, poll_interval=30)
+        duration = time.monotonic() - start
+
+    # all the tasks sleep at the same time, on the same thread
+    assert duration < 5
+    assert len(completed) == 50
+    assert all(task.completed for task in completed)
+    assert len(set().union(*[task.threads for task in tasks])) == 1
+
+    assert [task.name for task in failed] == ['failing']
+    assert failed[0].logs_text == 'RuntimeError: out of gas'
+    assert not failed[0].completed
+
+
+def test_blocking_calls_run_on_worker_threads():
+    with AsyncRuntime(max_blocking_workers=2) as runtime:
+        loop_thread = runtime.call(_current_thread())
+        worker_thread = runtime.call(runtime.run_blocking(threading.get_ident))
+
+    assert loop_thread != worker_thread
+    assert worker_thread != threading.get_ident()
+
+
+async def _current_thread() -> int:
+    return threading.get_ident()
@@ -0,0 +1,205 @@
+import os
+import subprocess
+import threading
+import time
+from unittest import mock
+
+import pytest
+from docker.errors import APIError, NotFound
+from docker.types import Mount
+
+from jenesis.tasks import builder as builder_module
+from jenesis.tasks.builder import BuilderExec, BuilderPool
+
+
+class FakeDockerApi:
+    """
+    The subset of the low level docker API used by the builder execs. The output of each exec is released
+    chunk by chunk, so that tests can observe it while the command is still running
+    """
+
+    def __init__(self, output, exit_code=0, error=None):
+        self.output = output
+        self.exit_code = exit_code
+        self.error = error
+        self.released = threading.Semaphore(0)
+        self.execs = []
+        self.started = []
+
+    def exec_create(self, container_id, command, workdir=None, environment=None):
+        if self.execs and self.error is not None:
+            raise self.error
+        self.execs.append((container_id, command, workdir, environment))
+        return {"Id": f"exec-{len(self.execs)}" + "0" * 12}
+
+    def exec_start(self, exec_id, stream=False):
+        self.started.append(exec_id)
+        if not stream:
+            return b""
+
+        def output():
+            for chunk in self.output:
+                self.released.acquire()  # pylint: disable=consider-using-with
+                yield chunk
+
+        return output()
+
+    def release(self, count=None):
+        for _ in range(len(self.output) if count is None else count):
+            self.released.release()
+
+    def exec_inspect(self, _exec_id):
+        return {"ExitCode": self.exit_code}
+
+
+def _builder(api):
+    builder = mock.Mock()
+    builder.id = "builder"
+    builder.client.api = api
+    return builder
+
+
+def test_followed_output_is_handed_over_as_it_arrives():
+    api = FakeDockerApi([b"compiling a\n", b"compiling b\n", b"finished\n"])
+    build = BuilderExec(_builder(api), ["cargo", "build"], "/code", {"CARGO_TERM_COLOR": "never"})
+
+    output = build.logs(stream=True, follow=True)
+    api.release(1)
+    assert next(output) == b"compiling a\n"
+
+    api.release()
+    assert list(output) == [b"compiling b\n", b"finished\n"]
+    assert build.wait() == {"StatusCode": 0}
+
+    # the complete output is still available once it has been consumed
+    assert build.logs() == b"compiling a\ncompiling b\nfinished\n"
+    (container_id, command, workdir, environment) = api.execs[0]
+    assert (container_id, workdir, environment) == ("builder", "/code", {"CARGO_TERM_COLOR": "never"})
+    assert command[:2] == ["/bin/sh", "-c"]
+
+
+def test_unfollowed_output_is_only_kept_on_disk():
+    output = [f"line {index}\n".encode() for index in range(builder_module.MAX_PENDING_CHUNKS * 4)]
+    api = FakeDockerApi(output, exit_code=101)
+    build = BuilderExec(_builder(api), ["cargo", "build"], "/code")
+
+    api.release()
+    assert build.wait() == {"StatusCode": 101}
+
+    # only the most recent chunks wait for a consumer
+    assert build._chunks.qsize() <= builder_module.MAX_PENDING_CHUNKS  # pylint: disable=protected-access
+    assert build.logs() == b"".join(output)
+    assert list(build.logs(stream=True)) == [b"".join(output)]
+
+    spill_path = build._spill_path  # pylint: disable=protected-access
+    build.remove()
+    assert not os.path.exists(spill_path)
+
+
+def test_kill_only_stops_the_command_of_the_exec():
+    api = FakeDockerApi([b"compiling\n"])
+    builder = _builder(api)
+    build = BuilderExec(builder, ["cargo", "build"], "/code")
+    build.kill()
+
+    # the kill is sent through a second exec in the same builder, which is itself left running
+    assert len(api.execs) == 2
+    (container_id, command, _, _) = api.execs[1]
+    assert container_id == "builder"
+    assert build._pid_path in command[2]  # pylint: disable=protected-access
+    assert api.started[-1] == "exec-2" + "0" * 12
+    builder.kill.assert_not_called()
+
+    api.release()
+    build.wait()
+
+
+@pytest.mark.parametrize("error", [
+    NotFound("no such container"),
+    APIError("container is not running", response=mock.Mock(status_code=409)),
+])
+def test_kill_ignores_builders_that_have_gone_away(error):
+    api = FakeDockerApi([], error=error)
+    BuilderExec(_builder(api), ["cargo", "build"], "/code").kill()
+
+
+def test_kill_reports_other_errors():
+    api = FakeDockerApi([], error=APIError("server error", response=mock.Mock(status_code=500)))
+    with pytest.raises(APIError):
+        BuilderExec(_builder(api), ["cargo", "build"], "/code").kill()
+
+
+def test_builder_name_is_stable():
+    mounts = [
+        Mount("/code", "/home/user/project", type="bind"),
+        Mount("/target", "project_cache", type="volume"),
+    ]
+    name = BuilderPool.builder_name("cosmwasm/rust-optimizer:0.12.6", mounts)
+
+    assert name.startswith("jenesis-builder-")
+    assert BuilderPool.builder_name("cosmwasm/rust-optimizer:0.12.6", list(reversed(mounts))) == name
+    assert BuilderPool.builder_name("cosmwasm/rust-optimizer:0.12.7", mounts) != name
+    assert BuilderPool.builder_name(
+        "cosmwasm/rust-optimizer:0.12.6", [mounts[0], Mount("/target", "other_cache", type="volume")]) != name
+
+
+@pytest.fixture(name="heartbeat")
+def fixture_heartbeat(tmp_path, monkeypatch):
+    heartbeat = str(tmp_path / "heartbeat")
+    monkeypatch.setattr(builder_module, "HEARTBEAT_PATH", heartbeat)
+    monkeypatch.setattr(builder_module, "HEARTBEAT_INTERVAL", 0.1)
+    return heartbeat
+
+
+def _wait_for(path, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def _is_running(pid):
+    try:
+        with open(f"/proc/{pid}/stat", encoding="utf8") as stat_file:
+            # processes that have exited but not yet been reaped are reported as zombies
+            return stat_file.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_watchdog_exits_once_the_heartbeat_stops(heartbeat):
+    started = time.monotonic()
+    subprocess.run(["/bin/sh", "-c", builder_module._watchdog_script(1)], check=True, timeout=10)  # pylint: disable=protected-access
+
+    assert os.path.exists(heartbeat)
+    assert time.monotonic() - started < 5
+
+
+def test_exec_script_reports_the_output_and_status_of_the_command(heartbeat, tmp_path):
+    pid_path = str(tmp_path / "exec.pid")
+    script = builder_module._exec_script(["sh", "-c", "echo 'a b'; exit 3"], pid_path)  # pylint: disable=protected-access
+    result = subprocess.run(["/bin/sh", "-c", script], capture_output=True, check=False, timeout=10)
+
+    assert result.returncode == 3
+    assert result.stdout == b"a b\n"
+    assert os.path.exists(heartbeat)
+    assert not os.path.exists(pid_path)
+
+
+def test_kill_script_stops_the_command_and_its_children(heartbeat, tmp_path):  # pylint: disable=unused-argument
+    pid_path = str(tmp_path / "exec.pid")
+    script = builder_module._exec_script(["sh", "-c", "sleep 60; sleep 60"], pid_path)  # pylint: disable=protected-access
+    with subprocess.Popen(["/bin/sh", "-c", script]) as process:
+        _wait_for(pid_path)
+        with open(pid_path, encoding="utf8") as pid_file:
+            pid = int(pid_file.read())
+        _wait_for(f"/proc/{pid}/task/{pid}/children")
+        time.sleep(0.2)
+        with open(f"/proc/{pid}/task/{pid}/children", encoding="utf8") as children_file:
+            children = [int(child) for child in children_file.read().split()]
+
+        subprocess.run(["/bin/sh", "-c", builder_module._kill_script(pid_path)], check=True, timeout=10)  # pylint: disable=protected-access
+        assert process.wait(timeout=10) != 0
+
+    assert children
+    assert not any(_is_running(child) for child in children)
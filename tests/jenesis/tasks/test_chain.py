@@ -0,0 +1,75 @@
+from jenesis.tasks import Task, TaskStatus
+from jenesis.tasks.chain import TaskChain
+
+
+class StepTask(Task):
+    def __init__(self, name: str, steps: int, succeed: bool = True):
+        self._name = name
+        self._steps = steps
+        self._succeed = succeed
+        self._status = TaskStatus.IDLE
+        self.poll_count = 0
+        self.torn_down = False
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def status(self) -> TaskStatus:
+        return self._status
+
+    @property
+    def logs_text(self) -> str:
+        return f'{self._name} logs'
+
+    @property
+    def status_text(self) -> str:
+        return self._name
+
+    def poll(self):
+        self.poll_count += 1
+        if self.poll_count < self._steps:
+            self._status = TaskStatus.IN_PROGRESS
+        else:
+            self._status = TaskStatus.COMPLETE if self._succeed else TaskStatus.FAILED
+
+    def teardown(self):
+        self.torn_down = True
+
+
+def test_chain_runs_tasks_in_sequence():
+    build, schema = StepTask('build', 2), StepTask('schema', 2)
+    chain = TaskChain([build, schema])
+    assert chain.name == 'build'
+    assert chain.is_idle
+
+    chain.poll()
+    assert chain.is_in_progress
+    assert chain.status_text == 'build'
+    assert schema.poll_count == 0
+
+    # the next task is started in the same poll as the previous one completes
+    chain.poll()
+    assert chain.is_in_progress
+    assert chain.status_text == 'schema'
+    assert schema.poll_count == 1
+
+    chain.poll()
+    assert chain.is_complete
+    assert chain.logs_text == 'build logs\nschema logs'
+
+
+def test_chain_skips_completed_tasks_and_stops_on_failure():
+    build, schema = StepTask('build', 1), StepTask('schema', 1, succeed=False)
+    chain = TaskChain([build, schema], name='contract')
+    assert chain.name == 'contract'
+
+    chain.poll()
+    assert chain.is_failed
+    assert build.poll_count == 1
+    assert schema.poll_count == 1
+
+    chain.teardown()
+    assert schema.torn_down
+    assert not build.torn_down
@@ -0,0 +1,105 @@
+import os
+import time
+from tempfile import mkdtemp
+
+from jenesis.tasks.container import ContainerTask
+from jenesis.tasks.logs import LogBuffer
+
+
+class FakeContainer:
+    def __init__(self, output: bytes, exit_code: int):
+        self.output = output
+        self.exit_code = exit_code
+        self.streamed = False
+
+    def logs(self, stream=False, follow=False):  # pylint: disable=unused-argument
+        if stream:
+            self.streamed = True
+            return iter([self.output])
+        return self.output
+
+    def wait(self):
+        return {"StatusCode": self.exit_code}
+
+    def remove(self):
+        pass
+
+
+class FakeContainerTask(ContainerTask):
+    def __init__(self, container: FakeContainer, log: bool, project_path=None):
+        super().__init__(project_path)
+        self._fake_container = container
+        self._log = log
+
+    @property
+    def name(self) -> str:
+        return "counter"
+
+    def _is_out_of_date(self) -> bool:
+        return True
+
+    def _schedule_container(self):
+        return self._fake_container
+
+    def _show_logs(self):
+        return self._log
+
+
+def _run(task: ContainerTask):
+    deadline = time.monotonic() + 5
+    while not task.is_done and time.monotonic() < deadline:
+        task.poll()
+        time.sleep(0.01)
+
+
+def test_log_buffer_keeps_recent_lines_and_spills_everything():
+    spill_path = os.path.join(mkdtemp(prefix="jenesis-", suffix="-logs"), "logs", "task.log")
+    log_buffer = LogBuffer(max_lines=3, spill_path=spill_path)
+
+    # lines and multi-byte characters split across chunks are reassembled
+    for chunk in (b"line 1\nline", b" 2\nline 3\n\xe2\x9c", b"\x94 line 4\nline 5"):
+        log_buffer.write(chunk)
+
+    assert log_buffer.last_line == "line 5"
+    assert log_buffer.text == "line 3\n✔ line 4\nline 5"
+    assert log_buffer.is_truncated
+
+    log_buffer.close()
+
+    assert log_buffer.text == "line 3\n✔ line 4\nline 5"
+    with open(spill_path, "rb") as log_file:
+        assert log_file.read() == b"line 1\nline 2\nline 3\n\xe2\x9c\x94 line 4\nline 5"
+
+
+def test_log_buffer_ignores_blank_lines_for_status():
+    log_buffer = LogBuffer()
+    log_buffer.write(b"Compiling counter\n\n")
+
+    assert log_buffer.last_line == "Compiling counter"
+    assert not log_buffer.is_truncated
+
+
+def test_container_logs_are_only_streamed_when_shown(tmp_path):
+    container = FakeContainer(b"Compiling counter\n", 0)
+    task = FakeContainerTask(container, log=False, project_path=str(tmp_path))
+    _run(task)
+    assert task.is_complete
+    assert not container.streamed
+    assert task.logs_text == ""
+    assert not (tmp_path / ".jenesis" / "logs").exists()
+
+    # the logs of a failed container are still shown
+    container = FakeContainer(b"error: could not compile\n", 1)
+    task = FakeContainerTask(container, log=False, project_path=str(tmp_path))
+    _run(task)
+    assert task.is_failed
+    assert not container.streamed
+    assert task.logs_text == "error: could not compile"
+
+    # shown logs are kept in the state folder of the project that is passed in
+    container = FakeContainer(b"Compiling counter\n", 0)
+    task = FakeContainerTask(container, log=True, project_path=str(tmp_path))
+    _run(task)
+    assert container.streamed
+    assert task.logs_text == "Compiling counter"
+    assert (tmp_path / ".jenesis" / "logs" / "counter.log").read_bytes() == b"Compiling counter\n"
@@ -0,0 +1,156 @@
+import threading
+import time
+
+from jenesis.tasks import Task, TaskStatus
+from jenesis.tasks.monitor import TaskStatusDisplay, run_tasks
+
+
+class BackgroundTask(Task):
+    def __init__(self, name: str, duration: float, succeed: bool = True):
+        self._name = name
+        self._duration = duration
+        self._succeed = succeed
+        self._status = TaskStatus.IDLE
+        self._finished = threading.Event()
+        self.poll_count = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def status(self) -> TaskStatus:
+        return self._status
+
+    @property
+    def logs_text(self) -> str:
+        return ''
+
+    @property
+    def status_text(self) -> str:
+        return ''
+
+    def _run(self):
+        time.sleep(self._duration)
+        self._finished.set()
+        self._notify()
+
+    def poll(self):
+        self.poll_count += 1
+        if self._status == TaskStatus.IDLE:
+            self._status = TaskStatus.IN_PROGRESS
+            threading.Thread(target=self._run, daemon=True).start()
+        elif self._finished.is_set():
+            self._status = TaskStatus.COMPLETE if self._succeed else TaskStatus.FAILED
+
+    def teardown(self):
+        pass
+
+
+def test_monitor_wakes_up_on_task_notification():
+    tasks = [BackgroundTask('a', 0.05), BackgroundTask('b', 0.1, succeed=False)]
+
+    start = time.monotonic()
+    completed, failed = run_tasks(tasks, poll_interval=30)
+    duration = time.monotonic() - start
+
+    # the monitor does not wait for the (very long) poll interval when the tasks report completion
+    assert duration < 5
+    assert [task.name for task in completed] == ['a']
+    assert [task.name for task in failed] == ['b']
+    assert all(task.poll_count <= 4 for task in tasks)
+
+
+def test_monitor_limits_tasks_in_flight_and_follows_priority():
+    tasks = [BackgroundTask(name, 0.05) for name in ['c', 'a', 'd', 'b']]
+
+    started = []
+    in_flight = []
+    for task in tasks:
+        original_run = task._run  # pylint: disable=protected-access
+
+        def _run(task=task, original_run=original_run):
+            started.append(task.name)
+            in_flight.append(sum(1 for t in tasks if t.status == TaskStatus.IN_PROGRESS))
+            original_run()
+
+        task._run = _run  # pylint: disable=protected-access
+
+    completed, failed = run_tasks(tasks, poll_interval=30, max_parallel=2, priority=lambda task: task.name)
+
+    assert len(completed) == 4
+    assert len(failed) == 0
+    assert sorted(started[:2]) == ['a', 'b']
+    assert sorted(started[2:]) == ['c', 'd']
+    assert max(in_flight) <= 2
+
+
+def test_monitor_runs_tasks_queued_on_completion():
+    follow_ups = {'a': [BackgroundTask('c', 0.01)], 'b': [], 'c': [BackgroundTask('d', 0.01)], 'd': []}
+
+    completed, failed = run_tasks(
+        [BackgroundTask('a', 0.01), BackgroundTask('b', 0.05)],
+        poll_interval=30,
+        on_complete=lambda task: follow_ups[task.name],
+    )
+
+    assert sorted(task.name for task in completed) == ['a', 'b', 'c', 'd']
+    assert len(failed) == 0
+
+
+def test_monitor_reports_each_wave_before_its_follow_ups_are_queued():
+    events = []
+    follow_ups = {'a': [BackgroundTask('c', 0.01)], 'b': [], 'c': []}
+
+    def on_complete(task):
+        events.append(f'queue {task.name}')
+        return follow_ups[task.name]
+
+    def on_wave_complete(tasks):
+        events.append(f'wave {",".join(sorted(task.name for task in tasks))}')
+
+    run_tasks(
+        [BackgroundTask('a', 0.01), BackgroundTask('b', 0.01)],
+        poll_interval=30,
+        on_complete=on_complete,
+        on_wave_complete=on_wave_complete,
+    )
+
+    waves = {
+        name: index for (index, event) in enumerate(events) if event.startswith('wave ')
+        for name in event[len('wave '):].split(',')
+    }
+    assert sorted(waves) == ['a', 'b', 'c']
+    assert all(waves[name] < events.index(f'queue {name}') for name in waves)
+
+
+class GroupedTask(BackgroundTask):
+    def __init__(self, group: str, name: str, duration: float, succeed: bool = True):
+        super().__init__(name, duration, succeed)
+        self._group = group
+
+    @property
+    def group(self):
+        return self._group
+
+
+def test_display_keeps_tasks_with_the_same_name_in_separate_groups():
+    display = TaskStatusDisplay()
+    staging = GroupedTask('staging', 'token', 0.01)
+    testnet = GroupedTask('testnet', 'token', 0.01, succeed=False)
+    staging._status = TaskStatus.COMPLETE  # pylint: disable=protected-access
+    testnet._status = TaskStatus.FAILED  # pylint: disable=protected-access
+
+    display.update(staging)
+    display.update(testnet)
+    rows = display._render_rows()  # pylint: disable=protected-access
+
+    # each group is shown with its own header followed by its tasks
+    assert len(rows) == 4
+    assert 'staging' in rows[0] and 'complete' in rows[1]
+    assert 'testnet' in rows[2] and 'FAILED' in rows[3]
+
+    completed, failed = run_tasks([GroupedTask('staging', 'token', 0.01), GroupedTask('testnet', 'token', 0.01)],
+                                  poll_interval=30)
+    assert len(completed) == 2
+    assert len(failed) == 0